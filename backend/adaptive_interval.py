@@ -0,0 +1,101 @@
+import logging
+import threading
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Incident types that checking more often neither confirms nor clears any sooner
+UNHURRIED_INCIDENTS = ('ssl_expiry', 'defacement', 'page_defacement')
+
+class AdaptiveIntervalPolicy:
+    """Pick each site's next check interval from its recent health
+
+    Stable sites back off from their configured interval by ``growth`` every
+    ``stable_checks`` consecutive healthy checks, up to ``max_interval``.
+    An unhealthy check holds the current rate; only ``confirm_failures``
+    consecutive ones drop the site to ``fast_interval``, so a single blip
+    does not swing it. A confirmed failure keeps the fast rate through
+    ``recovery_checks`` healthy checks and then restarts from the
+    configured interval.
+    """
+
+    def __init__(self, fast_interval=None, max_interval=None, growth=None, stable_checks=None, recovery_checks=None,
+                 confirm_failures=None):
+        self.fast_interval = fast_interval or Config.ADAPTIVE_FAST_INTERVAL
+        self.max_interval = max_interval or Config.ADAPTIVE_MAX_INTERVAL
+        self.growth = growth or Config.ADAPTIVE_GROWTH
+        self.stable_checks = stable_checks or Config.ADAPTIVE_STABLE_CHECKS
+        self.recovery_checks = recovery_checks or Config.ADAPTIVE_RECOVERY_CHECKS
+        self.confirm_failures = confirm_failures or Config.ADAPTIVE_CONFIRM_FAILURES
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def next_interval(self, website_id, base_interval, healthy):
+        """Record one check outcome and return the interval (seconds) until the next check"""
+        with self._lock:
+            state = self._states.get(website_id)
+            if state is None:
+                state = {'level': 0, 'streak': 0, 'failures': 0, 'recovering': 0, 'phase': 'stable'}
+                self._states[website_id] = state
+
+            if not healthy:
+                state['failures'] += 1
+                state['streak'] = 0
+                if state['phase'] == 'stable' and state['failures'] < self.confirm_failures:
+                    # Not confirmed yet: hold the current rate
+                    return self._interval(base_interval, state['level'])
+                state['phase'] = 'failing'
+                return self.fast_interval
+
+            if state['phase'] == 'failing':
+                state['phase'] = 'recovering'
+                state['recovering'] = 0
+                state['level'] = 0
+            state['failures'] = 0
+
+            if state['phase'] == 'recovering':
+                state['recovering'] += 1
+                if state['recovering'] < self.recovery_checks:
+                    return self.fast_interval
+                state['phase'] = 'stable'
+                state['streak'] = 0
+                return base_interval
+
+            state['streak'] += 1
+            interval = self._interval(base_interval, state['level'])
+            if state['streak'] >= self.stable_checks and interval < self.max_interval:
+                state['level'] += 1
+                state['streak'] = 0
+                interval = self._interval(base_interval, state['level'])
+            return interval
+
+    def get_state(self, website_id):
+        state = self._states.get(website_id)
+        return dict(state) if state else None
+
+    def restore(self, website_id, state):
+        """Reinstate a state previously returned by get_state()"""
+        with self._lock:
+            self._states[website_id] = dict(state)
+
+    def forget(self, website_id):
+        with self._lock:
+            self._states.pop(website_id, None)
+
+    def _interval(self, base_interval, level):
+        if base_interval >= self.max_interval:
+            return base_interval
+        return min(int(base_interval * self.growth ** level), self.max_interval)
+
+def is_healthy(results):
+    """Whether a check_website() result counts as healthy for scheduling"""
+    uptime = results.get('uptime') or {}
+    if uptime.get('status') == 'failure' or uptime.get('latency_anomaly') or uptime.get('slow'):
+        return False
+    # Probing faster does nothing for a certificate that is about to expire or a page
+    # that stays defaced until someone restores it
+    return not any(
+        event['transition'] != 'resolved' and event['incident_type'] not in UNHURRIED_INCIDENTS
+        for event in results.get('incidents', [])
+    )
@@ -0,0 +1,76 @@
+import logging
+import threading
+from urllib.parse import urlparse
+from config import Config
+from dns_cache import dns_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AlertCoalescer:
+    """Group alerts that fire within a short window into a single digest"""
+
+    def __init__(self, deliver_single, deliver_digest, window=None, group_by=None):
+        self.deliver_single = deliver_single
+        self.deliver_digest = deliver_digest
+        self.window = window if window is not None else Config.ALERT_COALESCE_WINDOW
+        self.group_by = group_by or Config.ALERT_COALESCE_GROUP_BY
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def submit(self, alert):
+        """Deliver the first alert of a group immediately, buffer the rest until the window closes"""
+        key = self.group_key(alert)
+
+        with self._lock:
+            group = self._groups.get(key)
+            if group is not None:
+                # Keep only the latest alert per website so the digest has no duplicates
+                group['pending'][alert['website_id']] = alert
+                logger.info(f"Coalesced {alert['incident_type']} alert for website {alert['website_id']} into group {key}")
+                return True
+
+            timer = threading.Timer(self.window, self._flush, args=[key])
+            timer.daemon = True
+            self._groups[key] = {'pending': {}, 'timer': timer}
+
+        timer.start()
+        return self.deliver_single(alert)
+
+    def group_key(self, alert):
+        """Build the grouping key (incident type plus host or resolved IP)"""
+        host = urlparse(alert.get('website_url') or '').hostname or f"website_{alert['website_id']}"
+        target = host
+        if self.group_by == 'ip':
+            try:
+                target = dns_cache.resolve(host)[0]
+            except Exception:
+                target = host
+        return f"{alert['incident_type']}:{target}"
+
+    def flush_all(self):
+        """Flush every open group immediately"""
+        with self._lock:
+            keys = list(self._groups.keys())
+        for key in keys:
+            self._flush(key)
+
+    def _flush(self, key):
+        """Send buffered alerts for a group once its window has closed"""
+        with self._lock:
+            group = self._groups.pop(key, None)
+        if not group:
+            return
+
+        group['timer'].cancel()
+        pending = list(group['pending'].values())
+        if not pending:
+            return
+
+        try:
+            if len(pending) == 1:
+                self.deliver_single(pending[0])
+            else:
+                self.deliver_digest(key, pending)
+        except Exception as e:
+            logger.error(f"Error flushing alert group {key}: {str(e)}", exc_info=True)
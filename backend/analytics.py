@@ -0,0 +1,312 @@
+import bisect
+import logging
+from datetime import datetime, timedelta, timezone
+from database import Database, span_latency
+from archive import CheckArchive
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Log-scale latency bins (upper bounds in ms, ~20% wide) used by the rollups
+LATENCY_BINS_MS = []
+_bound = 1.0
+while _bound < 120000:
+    LATENCY_BINS_MS.append(int(round(_bound)))
+    _bound *= 1.2
+LATENCY_BINS_MS = sorted(set(LATENCY_BINS_MS))
+
+PERCENTILES = (50, 90, 95, 99)
+LIVE_SITES = ' AND website_id IN (SELECT website_id FROM websites)'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def latency_bin(response_time):
+    """Return the rollup bin index for a response time in ms"""
+    return bisect.bisect_left(LATENCY_BINS_MS, response_time)
+
+def hour_floor(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def parse_utc(value):
+    """Parse an ISO timestamp to a naive UTC datetime; values without an offset are taken to be UTC"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_window(start=None, end=None, days=30):
+    """Resolve a [start, end) window to hour boundaries (UTC, matching checked_at)"""
+    end_at = parse_utc(end) if end else datetime.utcnow()
+    start_at = parse_utc(start) if start else end_at - timedelta(days=days)
+    # Rollups are hourly, so round outwards to whole hours
+    end_hour = hour_floor(end_at)
+    if end_hour < end_at:
+        end_hour += timedelta(hours=1)
+    return hour_floor(start_at), end_hour
+
+class AnalyticsService:
+    """Uptime/latency analytics backed by hourly rollups maintained on every uptime check"""
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self._ensure_backfilled()
+
+    def record_check(self, cursor, website_id, status, response_time, checked_at=None):
+        """Fold one uptime check into its hour's rollups (caller commits)"""
+        bucket_start = (checked_at or clock.timestamp())[:13] + ':00:00'
+        cursor.execute('''
+            INSERT INTO check_rollups
+            (website_id, total, success, warning, failure, rt_count, rt_sum, rt_min, rt_max, bucket_start)
+            VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(website_id, bucket_start) DO UPDATE SET
+                total = total + 1,
+                success = success + excluded.success,
+                warning = warning + excluded.warning,
+                failure = failure + excluded.failure,
+                rt_count = rt_count + excluded.rt_count,
+                rt_sum = rt_sum + excluded.rt_sum,
+                rt_min = MIN(COALESCE(rt_min, excluded.rt_min), COALESCE(excluded.rt_min, rt_min)),
+                rt_max = MAX(COALESCE(rt_max, excluded.rt_max), COALESCE(excluded.rt_max, rt_max))
+        ''', self._rollup_values(website_id, status, response_time) + (bucket_start,))
+
+        if response_time is not None:
+            cursor.execute('''
+                INSERT INTO latency_rollups (website_id, bucket_start, bin, count)
+                VALUES (?, ?, ?, 1)
+                ON CONFLICT(website_id, bucket_start, bin) DO UPDATE SET count = count + 1
+            ''', (website_id, bucket_start, latency_bin(response_time)))
+
+    def site_summary(self, website_id, start_at, end_at):
+        """Return uptime, latency percentiles, incident counts and MTTR for one site"""
+        summaries = self._summaries(start_at, end_at, website_id)
+        return summaries.get(website_id) or self._empty_summary(website_id, start_at, end_at)
+
+    def fleet_summary(self, start_at, end_at):
+        """Return per-site summaries plus a fleet-wide aggregate"""
+        summaries = self._summaries(start_at, end_at)
+
+        with self.db.get_connection('AnalyticsService.fleet_summary') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT bin, SUM(count) as count FROM latency_rollups
+                WHERE bucket_start >= ? AND bucket_start < ?{LIVE_SITES}
+                GROUP BY bin
+            ''', self._window_params(start_at, end_at))
+            fleet_bins = {row['bin']: row['count'] for row in cursor.fetchall()}
+
+        total = sum(s['checks'] for s in summaries.values())
+        down = sum(s['failures'] for s in summaries.values())
+        fleet = {
+            'sites': len(summaries),
+            'checks': total,
+            'uptime_percent': round((total - down) / total * 100, 3) if total else None,
+            'incidents': sum(s['incidents']['total'] for s in summaries.values()),
+            'latency_ms': self._percentiles(fleet_bins)
+        }
+        return {
+            'window': self._window_dict(start_at, end_at),
+            'fleet': fleet,
+            'sites': sorted(summaries.values(), key=lambda s: s['website_id'])
+        }
+
+    def backfill(self):
+        """Rebuild rollups from raw uptime checks, including archived ones"""
+        with self.db.get_connection('AnalyticsService.backfill') as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM check_rollups')
+            cursor.execute('DELETE FROM latency_rollups')
+
+            read_cursor = conn.cursor()
+            read_cursor.execute('''
+                SELECT website_id, strftime('%Y-%m-%d %H:00:00', checked_at) as bucket_start,
+                       status, response_time, run_count, rt_sum, rt_min, rt_max
+                FROM monitoring_checks
+                WHERE check_type = 'uptime'
+                ORDER BY website_id, checked_at
+            ''')
+            rollups = {}
+            bins = {}
+            for row in self._backfill_rows(read_cursor):
+                key = (row['website_id'], row['bucket_start'])
+                rollup = rollups.setdefault(key, [0, 0, 0, 0, 0, 0, None, None])
+                # A row may be a span of identical checks (change-only storage)
+                count, rt_sum, rt_min, rt_max = span_latency(row)
+                values = self._rollup_values(*key[:1], row['status'], row['response_time'])[1:4]
+                rollup[0] += count
+                for i in range(1, 4):
+                    rollup[i] += values[i - 1] * count
+                if rt_sum is not None:
+                    rollup[4] += count
+                    rollup[5] += rt_sum
+                    rollup[6] = rt_min if rollup[6] is None else min(rollup[6], rt_min)
+                    rollup[7] = rt_max if rollup[7] is None else max(rollup[7], rt_max)
+                    # Spans only keep a summary, so their checks land in the bin of their mean
+                    bin_key = key + (latency_bin(rt_sum / count),)
+                    bins[bin_key] = bins.get(bin_key, 0) + count
+
+            cursor.executemany('''
+                INSERT INTO check_rollups
+                (website_id, bucket_start, total, success, warning, failure, rt_count, rt_sum, rt_min, rt_max)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [key + tuple(values) for key, values in rollups.items()])
+            cursor.executemany('''
+                INSERT INTO latency_rollups (website_id, bucket_start, bin, count)
+                VALUES (?, ?, ?, ?)
+            ''', [key + (count,) for key, count in bins.items()])
+            conn.commit()
+        logger.info(f"Backfilled {len(rollups)} hourly rollups from raw checks")
+
+    def _backfill_rows(self, read_cursor):
+        """Raw uptime rows from the database followed by the archive tier"""
+        yield from read_cursor
+        archive = CheckArchive(db=self.db)
+        for website_id in archive.website_ids():
+            for row in archive.iter_rows(website_id, descending=False):
+                if row['check_type'] == 'uptime':
+                    row['bucket_start'] = row['checked_at'][:13] + ':00:00'
+                    yield row
+
+    def _ensure_backfilled(self):
+        """Build rollups once for databases created before rollups existed"""
+        try:
+            with self.db.get_connection('AnalyticsService._ensure_backfilled') as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1 FROM check_rollups LIMIT 1')
+                if cursor.fetchone():
+                    return
+                cursor.execute("SELECT 1 FROM monitoring_checks WHERE check_type = 'uptime' LIMIT 1")
+                if not cursor.fetchone():
+                    return
+            self.backfill()
+        except Exception as e:
+            logger.error(f"Error backfilling analytics rollups: {str(e)}")
+
+    def _rollup_values(self, website_id, status, response_time):
+        return (
+            website_id,
+            1 if status == 'success' else 0,
+            1 if status == 'warning' else 0,
+            1 if status not in ('success', 'warning') else 0,
+            1 if response_time is not None else 0,
+            response_time or 0,
+            response_time,
+            response_time
+        )
+
+    def _summaries(self, start_at, end_at, website_id=None):
+        """Aggregate rollups and incidents per site over a window"""
+        # Rollups and incidents outlive their website, so deleted sites are filtered out here
+        site_filter = LIVE_SITES + (' AND website_id = ?' if website_id is not None else '')
+        params = self._window_params(start_at, end_at) + ((website_id,) if website_id is not None else ())
+
+        with self.db.get_connection('AnalyticsService._summaries') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT website_id, SUM(total) as total, SUM(success) as success,
+                       SUM(warning) as warning, SUM(failure) as failure,
+                       SUM(rt_count) as rt_count, SUM(rt_sum) as rt_sum,
+                       MIN(rt_min) as rt_min, MAX(rt_max) as rt_max
+                FROM check_rollups
+                WHERE bucket_start >= ? AND bucket_start < ?{site_filter}
+                GROUP BY website_id
+            ''', params)
+            rollups = {row['website_id']: dict(row) for row in cursor.fetchall()}
+
+            cursor.execute(f'''
+                SELECT website_id, bin, SUM(count) as count
+                FROM latency_rollups
+                WHERE bucket_start >= ? AND bucket_start < ?{site_filter}
+                GROUP BY website_id, bin
+            ''', params)
+            bins = {}
+            for row in cursor.fetchall():
+                bins.setdefault(row['website_id'], {})[row['bin']] = row['count']
+
+            cursor.execute(f'''
+                SELECT website_id, incident_type, COUNT(*) as count,
+                       SUM(CASE WHEN resolved_at IS NOT NULL THEN 1 ELSE 0 END) as resolved,
+                       AVG(CASE WHEN resolved_at IS NOT NULL
+                           THEN (julianday(resolved_at) - julianday(detected_at)) * 86400 END) as mttr
+                FROM incidents
+                WHERE detected_at >= ? AND detected_at < ?{site_filter}
+                GROUP BY website_id, incident_type
+            ''', params)
+            incidents = {}
+            for row in cursor.fetchall():
+                incidents.setdefault(row['website_id'], []).append(dict(row))
+
+        summaries = {}
+        for site_id in set(rollups) | set(incidents):
+            summary = self._empty_summary(site_id, start_at, end_at)
+            rollup = rollups.get(site_id)
+            if rollup:
+                total = rollup['total']
+                summary.update({
+                    'checks': total,
+                    'failures': rollup['failure'],
+                    'warnings': rollup['warning'],
+                    'uptime_percent': round((total - rollup['failure']) / total * 100, 3) if total else None
+                })
+                latency = self._percentiles(bins.get(site_id, {}))
+                if rollup['rt_count']:
+                    latency.update({
+                        'mean': round(rollup['rt_sum'] / rollup['rt_count'], 1),
+                        'min': rollup['rt_min'],
+                        'max': rollup['rt_max']
+                    })
+                summary['latency_ms'] = latency
+
+            by_type = {}
+            total_incidents = 0
+            for row in incidents.get(site_id, []):
+                by_type[row['incident_type']] = {
+                    'count': row['count'],
+                    'resolved': row['resolved'],
+                    'mttr_seconds': round(row['mttr'], 1) if row['mttr'] is not None else None
+                }
+                total_incidents += row['count']
+            summary['incidents'] = {'total': total_incidents, 'by_type': by_type}
+            downtime = by_type.get('downtime')
+            summary['mttr_seconds'] = downtime['mttr_seconds'] if downtime else None
+            summaries[site_id] = summary
+        return summaries
+
+    def _percentiles(self, bins):
+        """Estimate latency percentiles from binned counts (linear within a bin)"""
+        total = sum(bins.values())
+        if not total:
+            return {f'p{p}': None for p in PERCENTILES}
+
+        result = {}
+        ordered = sorted(bins.items())
+        for p in PERCENTILES:
+            target = total * p / 100
+            cumulative = 0
+            for index, count in ordered:
+                if cumulative + count >= target:
+                    lower = LATENCY_BINS_MS[index - 1] if index > 0 else 0
+                    upper = LATENCY_BINS_MS[index] if index < len(LATENCY_BINS_MS) else lower * 1.2
+                    fraction = (target - cumulative) / count
+                    result[f'p{p}'] = round(lower + (upper - lower) * fraction, 1)
+                    break
+                cumulative += count
+        return result
+
+    def _empty_summary(self, website_id, start_at, end_at):
+        return {
+            'website_id': website_id,
+            'window': self._window_dict(start_at, end_at),
+            'checks': 0,
+            'failures': 0,
+            'warnings': 0,
+            'uptime_percent': None,
+            'latency_ms': {f'p{p}': None for p in PERCENTILES},
+            'incidents': {'total': 0, 'by_type': {}},
+            'mttr_seconds': None
+        }
+
+    def _window_params(self, start_at, end_at):
+        return (start_at.strftime(TIMESTAMP_FORMAT), end_at.strftime(TIMESTAMP_FORMAT))
+
+    def _window_dict(self, start_at, end_at):
+        return {'from': start_at.isoformat(), 'to': end_at.isoformat()}
@@ -0,0 +1,192 @@
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from database import Database
+from config import Config
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LatencyBaseline:
+    """Exponentially weighted mean/variance of one site's response times"""
+
+    __slots__ = ('mean', 'variance', 'count', 'anomalous')
+
+    def __init__(self, mean=0.0, variance=0.0, count=0):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+        self.anomalous = 0  # consecutive samples held out of the baseline
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def update(self, value, alpha):
+        """Fold one sample into the baseline in O(1)"""
+        if self.count == 0:
+            self.mean = float(value)
+            self.variance = 0.0
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            'mean_ms': round(self.mean, 1),
+            'std_ms': round(self.std, 1),
+            'samples': self.count
+        }
+
+class LatencyAnomalyDetector:
+    """Flags response times far above each site's rolling baseline
+
+    Baselines are kept in memory and updated in O(1) per check. A sample is
+    anomalous when it exceeds the baseline mean by ``z_threshold`` standard
+    deviations, by ``min_ratio`` times, and by at least ``min_delta_ms``.
+    Anomalous samples are held out of the baseline so a sustained slowdown
+    keeps being reported, until ``Config.ANOMALY_RELEARN_AFTER`` checks in a
+    row make it the new normal.
+    """
+
+    def __init__(self, alpha=None, z_threshold=None, min_ratio=None, min_delta_ms=None, warmup=None):
+        self.alpha = alpha if alpha is not None else Config.ANOMALY_ALPHA
+        self.z_threshold = z_threshold if z_threshold is not None else Config.ANOMALY_Z_THRESHOLD
+        self.min_ratio = min_ratio if min_ratio is not None else Config.ANOMALY_MIN_RATIO
+        self.min_delta_ms = min_delta_ms if min_delta_ms is not None else Config.ANOMALY_MIN_DELTA_MS
+        self.warmup = warmup if warmup is not None else Config.ANOMALY_WARMUP_CHECKS
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    def observe(self, website_id, response_time):
+        """Score one response time; returns (is_anomalous, site baseline)"""
+        with self._lock:
+            baseline = self._baselines.get(website_id)
+            if baseline is None:
+                baseline = self._baselines[website_id] = LatencyBaseline()
+
+            anomalous = baseline.count >= self.warmup and self._is_anomalous(baseline, response_time)
+            if anomalous:
+                baseline.anomalous += 1
+                # Re-learn if the site has been "anomalous" for long enough to be its new normal
+                if baseline.anomalous > Config.ANOMALY_RELEARN_AFTER:
+                    baseline.anomalous = 0
+                    baseline.update(response_time, self.alpha)
+            else:
+                baseline.anomalous = 0
+                baseline.update(response_time, self.alpha)
+            return anomalous, baseline
+
+    def threshold(self, website_id):
+        """Response time (ms) above which a check counts as degraded, or None while warming up"""
+        baseline = self._baselines.get(website_id)
+        if baseline is None or baseline.count < self.warmup:
+            return None
+        return self._threshold(baseline)
+
+    def get_baseline(self, website_id):
+        baseline = self._baselines.get(website_id)
+        return baseline.to_dict() if baseline else None
+
+    def forget(self, website_id):
+        with self._lock:
+            self._baselines.pop(website_id, None)
+
+    def __len__(self):
+        return len(self._baselines)
+
+    def backfill(self, db=None, days=None):
+        """Seed baselines from recent successful uptime checks in one pass
+
+        Every stored sample is weighted in, including ones the online path
+        would have held out as anomalous. A span of identical checks counts
+        as one sample at its mean latency.
+        """
+        db = db or Database()
+        days = days if days is not None else Config.ANOMALY_BACKFILL_DAYS
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            with db.get_connection('LatencyAnomalyDetector.backfill') as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # plain tuples; this can be millions of rows
+                cursor.execute('''
+                    SELECT website_id, COALESCE(rt_sum * 1.0 / run_count, response_time) FROM monitoring_checks
+                    WHERE check_type = 'uptime' AND status = 'success' AND response_time IS NOT NULL
+                    AND checked_at >= ?
+                    ORDER BY website_id, checked_at, check_id
+                ''', (since,))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error loading latency history: {str(e)}")
+            return 0
+
+        if not rows:
+            return 0
+        website_ids, response_times = zip(*rows)
+        baselines = batch_baselines(website_ids, response_times, self.alpha)
+        with self._lock:
+            self._baselines.update(baselines)
+        logger.info(f"Seeded latency baselines for {len(baselines)} websites from {len(rows)} checks")
+        return len(rows)
+
+    def _threshold(self, baseline):
+        return max(
+            baseline.mean + self.z_threshold * baseline.std,
+            baseline.mean * self.min_ratio,
+            baseline.mean + self.min_delta_ms
+        )
+
+    def _is_anomalous(self, baseline, response_time):
+        return response_time > self._threshold(baseline)
+
+def batch_baselines(website_ids, response_times, alpha):
+    """Compute the baseline each site would reach by feeding its samples in order
+
+    ``website_ids`` must be grouped (all samples of a site contiguous, oldest
+    first). Uses NumPy when available so millions of rows are handled with a
+    few vectorized passes; otherwise falls back to the O(1) online update.
+    """
+    if not HAS_NUMPY:
+        baselines = {}
+        for website_id, value in zip(website_ids, response_times):
+            baseline = baselines.get(website_id)
+            if baseline is None:
+                baseline = baselines[website_id] = LatencyBaseline()
+            baseline.update(value, alpha)
+        return baselines
+
+    sites = np.asarray(website_ids)
+    values = np.asarray(response_times, dtype=np.float64)
+    # Start/end index of each site's contiguous run
+    starts = np.flatnonzero(np.r_[True, sites[1:] != sites[:-1]])
+    ends = np.r_[starts[1:], len(sites)]
+    lengths = ends - starts
+    group = np.repeat(np.arange(len(starts)), lengths)
+    # Age of each sample within its site: 0 for the newest
+    age = np.repeat(ends - 1, lengths) - np.arange(len(sites))
+
+    # EWMA closed form: newest sample weighs alpha, each older one (1 - alpha) times less,
+    # and the first sample carries the remaining weight it was seeded with
+    decay = 1.0 - alpha
+    weights = alpha * decay ** age
+    weights[starts] = decay ** age[starts]
+    means = np.bincount(group, weights=weights * values, minlength=len(starts))
+
+    # The online variance equals the same weighting applied around the final mean
+    deviations = values - means[group]
+    variances = np.bincount(group, weights=weights * deviations * deviations, minlength=len(starts))
+
+    return {
+        int(sites[start]): LatencyBaseline(float(mean), float(max(variance, 0.0)), int(length))
+        for start, mean, variance, length in zip(starts, means, variances, lengths)
+    }
@@ -1,8 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from database import Database
-from monitoring import MonitoringEngine
 from scheduler import MonitoringScheduler
+from check_runner import ManualCheckRunner
+from dns_cache import dns_cache
+from metrics import REGISTRY, gauge
+from analytics import parse_window
+from history import CheckHistory, normalize_timestamp
+import csv
+import io
+import json
+import threading
+from urllib.parse import urlparse
 from config import Config
 import logging
 
@@ -13,8 +22,9 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
 db = Database()
-monitoring_engine = MonitoringEngine()
 scheduler = MonitoringScheduler()
+# Share the scheduler's engine so incident state is tracked in one place
+monitoring_engine = scheduler.monitoring_engine
 
 # Start monitoring all enabled websites on startup
 scheduler.start_all_monitoring()
@@ -34,7 +44,8 @@ def test_notification():
             severity='low',
             message='Test notification from WebGuard',
             website_url='test.local',
-            website_name='WebGuard Test'
+            website_name='WebGuard Test',
+            coalesce=False
         )
         if sent:
             return jsonify({'status': 'success', 'message': 'Test notification sent'}), 200
@@ -47,7 +58,7 @@ def test_notification():
 def get_websites():
     """Get all monitored websites"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_websites') as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM websites ORDER BY created_at DESC')
             websites = [dict(row) for row in cursor.fetchall()]
@@ -80,7 +91,7 @@ def add_website():
             return jsonify({'status': 'error', 'message': 'URL must start with http:// or https://'}), 400
         
         # Check if URL already exists
-        with db.get_connection() as conn:
+        with db.get_connection('add_website') as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT website_id FROM websites WHERE url = ?', (url,))
             if cursor.fetchone():
@@ -94,7 +105,7 @@ def add_website():
             logger.warning(f"Adding website {url} that is currently down: {initial_check.get('error_message')}")
         
         # Insert website
-        with db.get_connection() as conn:
+        with db.get_connection('add_website') as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO websites (url, display_name, check_interval, 
@@ -109,6 +120,7 @@ def add_website():
             ))
             website_id = cursor.lastrowid
             conn.commit()
+        scheduler.sites.refresh(website_id)
         
         # Capture baseline for defacement detection (only if site is accessible)
         if initial_check['status'] == 'success':
@@ -146,7 +158,7 @@ def add_website():
 def get_website(website_id):
     """Get specific website details"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_website') as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM websites WHERE website_id = ?', (website_id,))
             row = cursor.fetchone()
@@ -169,57 +181,107 @@ def delete_website(website_id):
     try:
         # Stop monitoring
         scheduler.stop_monitoring(website_id)
+        monitoring_engine.incidents.forget(website_id)
+        monitoring_engine.latency.forget(website_id)
+        monitoring_engine.probes.forget(website_id)
+        monitoring_engine.circuits.forget(website_id)
+        monitoring_engine.timeouts.forget(website_id)
+        monitoring_engine.ssl_expiry.forget(website_id)
+        check_runner.invalidate(website_id)
+        check_history.archive.delete_site(website_id)
+        monitoring_engine.snapshots.delete_site(website_id)
+        monitoring_engine.baselines.invalidate(website_id)
         
         # Delete from database (cascade will handle related records)
-        with db.get_connection() as conn:
+        with db.get_connection('delete_website') as conn:
             cursor = conn.cursor()
+            cursor.execute('DELETE FROM website_paths WHERE website_id = ?', (website_id,))
             cursor.execute('DELETE FROM websites WHERE website_id = ?', (website_id,))
             conn.commit()
             
             if cursor.rowcount == 0:
                 return jsonify({'status': 'error', 'message': 'Website not found'}), 404
+        scheduler.sites.remove(website_id)
         
         return jsonify({'status': 'success', 'message': 'Website deleted successfully'})
     except Exception as e:
         logger.error(f"Error deleting website: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def run_manual_check(website_id, website):
+    """Run a full check for a website and process its notifications"""
+    site = scheduler.sites.get(website_id)
+    results = monitoring_engine.check_website(
+        website_id,
+        website['url'],
+        check_defacement=website['defacement_detection_enabled'],
+        check_ssl=website['ssl_monitoring_enabled'],
+        paths=site['paths'] if site else ()
+    )
+
+    # Process results to trigger notifications
+    try:
+        scheduler._process_results(website_id, website, results)
+    except Exception as e:
+        logger.error(f"Error processing results for manual check: {str(e)}", exc_info=True)
+
+    return results
+
+check_runner = ManualCheckRunner(run_manual_check)
+check_history = CheckHistory(db)
+
+# Pool usage is sampled at scrape time so it costs nothing between scrapes
+gauge('webguard_threads', 'Live Python threads', callback=threading.active_count)
+gauge('webguard_manual_check_queue', 'Manual checks waiting for a worker',
+      callback=lambda: check_runner.executor._work_queue.qsize())
+gauge('webguard_dns_cache_entries', 'Hosts held in the DNS cache',
+      callback=lambda: dns_cache.get_stats()['entries'])
+gauge('webguard_host_outages', 'Shared hosts whose circuit breaker is open or half-open',
+      callback=lambda: len(monitoring_engine.circuits.outages()))
+
 @app.route('/api/websites/<int:website_id>/check', methods=['POST'])
 def trigger_check(website_id):
-    """Manually trigger a monitoring check"""
+    """Manually trigger a monitoring check (pass ?async=1 to get a job id instead)"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('trigger_check') as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM websites WHERE website_id = ?', (website_id,))
             row = cursor.fetchone()
             
-            if not row:
-                return jsonify({'status': 'error', 'message': 'Website not found'}), 404
-            
-            website = dict(row)
-            results = monitoring_engine.check_website(
-                website_id,
-                website['url'],
-                check_defacement=website['defacement_detection_enabled'],
-                check_ssl=website['ssl_monitoring_enabled']
-            )
-
-            # Process results to trigger notifications
-            try:
-                scheduler._process_results(website_id, website, results)
-            except Exception as e:
-                logger.error(f"Error processing results for manual check: {str(e)}", exc_info=True)
-            
-            return jsonify({'status': 'success', 'data': results})
+        if not row:
+            return jsonify({'status': 'error', 'message': 'Website not found'}), 404
+        
+        website = dict(row)
+        
+        if request.args.get('async', '').lower() in ('1', 'true'):
+            job_id = check_runner.submit(website_id, website)
+            return jsonify({'status': 'accepted', 'data': {'job_id': job_id}}), 202
+        
+        # Concurrent callers share one running check; recent results come from cache
+        results, cached = check_runner.run(website_id, website)
+        return jsonify({'status': 'success', 'data': results, 'cached': cached})
     except Exception as e:
         logger.error(f"Error triggering check: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/checks/jobs/<job_id>', methods=['GET'])
+def get_check_job(job_id):
+    """Poll an async manual check (pass ?wait=<seconds> to long-poll for the result)"""
+    try:
+        wait = min(request.args.get('wait', 0, type=float), 30)
+        job = check_runner.get_job(job_id, wait=wait)
+        if not job:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        return jsonify({'status': 'success', 'data': job})
+    except Exception as e:
+        logger.error(f"Error getting check job: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/websites/<int:website_id>/defacement/false-positive', methods=['POST'])
 def mark_false_positive(website_id):
     """Mark defacement as false positive and update baseline"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('mark_false_positive') as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM websites WHERE website_id = ?', (website_id,))
             row = cursor.fetchone()
@@ -228,83 +290,231 @@ def mark_false_positive(website_id):
                 return jsonify({'status': 'error', 'message': 'Website not found'}), 404
             
             website = dict(row)
-            
-            # Get current content and create new baseline
-            import requests
-            from bs4 import BeautifulSoup
-            import hashlib
-            
-            response = requests.get(
-                website['url'],
-                timeout=30,
-                allow_redirects=True,
-                headers={'User-Agent': 'WebGuard/1.0'}
-            )
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                content = soup.get_text()
-                new_hash = hashlib.md5(content.encode()).hexdigest()
-                
-                # Update baseline
-                cursor.execute('''
-                    INSERT INTO defacement_baselines (website_id, content_hash, content_selector)
-                    VALUES (?, ?, ?)
-                ''', (website_id, new_hash, None))
-                
-                # Resolve all open defacement incidents
-                cursor.execute('''
-                    UPDATE incidents
-                    SET resolved_at = CURRENT_TIMESTAMP
-                    WHERE website_id = ? 
-                    AND incident_type = 'defacement'
-                    AND resolved_at IS NULL
-                ''', (website_id,))
-                
-                conn.commit()
-                
-                logger.info(f"Updated baseline for website {website_id} and resolved defacement incidents")
-                
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Baseline updated and defacement incidents resolved'
-                })
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Cannot fetch website content: HTTP {response.status_code}'
-                }), 400
-                
+        
+        # Get current content and create new baseline
+        try:
+            monitoring_engine.capture_baseline(website_id, website['url'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        # Extra pages are re-baselined too; one that can't be fetched keeps its old baseline
+        site = scheduler.sites.get(website_id)
+        origin = '{0.scheme}://{0.netloc}'.format(urlparse(website['url']))
+        for path in (site['paths'] if site else []):
+            try:
+                monitoring_engine.capture_baseline(website_id, origin + path, path=path)
+            except Exception as e:
+                logger.warning(f"Could not update baseline of {path} for website {website_id}: {str(e)}")
+        
+        # Resolve all open defacement incidents
+        monitoring_engine.incidents.resolve(website_id, 'defacement')
+        monitoring_engine.incidents.resolve(website_id, 'page_defacement')
+        check_runner.invalidate(website_id)
+        
+        logger.info(f"Updated baseline for website {website_id} and resolved defacement incidents")
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Baseline updated and defacement incidents resolved'
+        })
     except Exception as e:
         logger.error(f"Error marking false positive: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/websites/<int:website_id>/paths', methods=['GET'])
+def get_paths(website_id):
+    """List a website's extra pages with the latest result of each"""
+    try:
+        with db.get_connection('get_paths') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM website_paths WHERE website_id = ? ORDER BY path_id', (website_id,))
+            return jsonify({'status': 'success', 'data': [dict(row) for row in cursor.fetchall()]})
+    except Exception as e:
+        logger.error(f"Error getting paths: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/websites/<int:website_id>/paths', methods=['POST'])
+def add_path(website_id):
+    """Monitor another page on the website's origin, e.g. {"path": "/login"}"""
+    try:
+        path = (request.json or {}).get('path', '').strip()
+        if not path.startswith('/') or path.startswith('//'):
+            return jsonify({'status': 'error', 'message': 'Path must start with a single / (e.g. /login)'}), 400
+        
+        with db.get_connection('add_path') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT url FROM websites WHERE website_id = ?', (website_id,))
+            row = cursor.fetchone()
+            if not row:
+                return jsonify({'status': 'error', 'message': 'Website not found'}), 404
+            cursor.execute('SELECT path FROM website_paths WHERE website_id = ?', (website_id,))
+            existing = [path_row['path'] for path_row in cursor.fetchall()]
+            if path in existing:
+                return jsonify({'status': 'error', 'message': 'Path already monitored'}), 400
+            if len(existing) >= Config.MAX_PATHS_PER_WEBSITE:
+                return jsonify({'status': 'error', 'message': f'At most {Config.MAX_PATHS_PER_WEBSITE} paths per website'}), 400
+            cursor.execute('INSERT INTO website_paths (website_id, path) VALUES (?, ?)', (website_id, path))
+            path_id = cursor.lastrowid
+            conn.commit()
+        scheduler.sites.refresh(website_id)
+        check_runner.invalidate(website_id)
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Path added; it is checked with the website from the next check on',
+            'data': {'path_id': path_id, 'url': '{0.scheme}://{0.netloc}'.format(urlparse(row['url'])) + path}
+        }), 201
+    except Exception as e:
+        logger.error(f"Error adding path: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/websites/<int:website_id>/paths/<int:path_id>', methods=['DELETE'])
+def delete_path(website_id, path_id):
+    """Stop monitoring one of a website's extra pages"""
+    try:
+        with db.get_connection('delete_path') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT path FROM website_paths WHERE website_id = ? AND path_id = ?', (website_id, path_id))
+            row = cursor.fetchone()
+            if not row:
+                return jsonify({'status': 'error', 'message': 'Path not found'}), 404
+            cursor.execute('DELETE FROM website_paths WHERE path_id = ?', (path_id,))
+            conn.commit()
+        scheduler.sites.refresh(website_id)
+        monitoring_engine.baselines.delete_path(website_id, row['path'])
+        monitoring_engine.probes.forget((website_id, row['path']))
+        check_runner.invalidate(website_id)
+        
+        return jsonify({'status': 'success', 'message': 'Path deleted successfully'})
+    except Exception as e:
+        logger.error(f"Error deleting path: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/websites/<int:website_id>/checks', methods=['GET'])
 def get_checks(website_id):
-    """Get monitoring check history for a website"""
+    """Get monitoring check history for a website
+
+    Query params: limit, cursor (from a previous next_cursor), from/to (ISO, UTC),
+    check_type, and format=ndjson|csv to stream the full range as an export.
+    """
     try:
-        limit = request.args.get('limit', 100, type=int)
+        start = normalize_timestamp(request.args.get('from'))
+        end = normalize_timestamp(request.args.get('to'))
+        check_type = request.args.get('check_type')
+        export_format = request.args.get('format', 'json').lower()
         
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM monitoring_checks
-                WHERE website_id = ?
-                ORDER BY checked_at DESC
-                LIMIT ?
-            ''', (website_id, limit))
-            
-            checks = [dict(row) for row in cursor.fetchall()]
-            return jsonify({'status': 'success', 'data': checks})
+        if export_format in ('ndjson', 'csv'):
+            rows = check_history.stream(website_id, start, end, check_type)
+            if export_format == 'ndjson':
+                body = (json.dumps(row) + '\n' for row in rows)
+                mimetype = 'application/x-ndjson'
+            else:
+                body = _csv_lines(rows)
+                mimetype = 'text/csv'
+            return Response(
+                stream_with_context(body),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename=website_{website_id}_checks.{export_format}'}
+            )
+        
+        limit = request.args.get('limit', 100, type=int)
+        checks, next_cursor = check_history.page(
+            website_id, limit, request.args.get('cursor'), start, end, check_type
+        )
+        return jsonify({'status': 'success', 'data': checks, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting checks: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _csv_lines(rows):
+    """Render rows as CSV one line at a time"""
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+@app.route('/api/websites/<int:website_id>/analytics', methods=['GET'])
+def get_website_analytics(website_id):
+    """Get uptime %, latency percentiles, incident counts and MTTR for a website
+
+    Query params: from/to (ISO, UTC) or days (default 30). Windows are
+    resolved at hourly granularity.
+    """
+    try:
+        start_at, end_at = parse_window(
+            request.args.get('from'), request.args.get('to'), request.args.get('days', 30, type=int)
+        )
+        summary = monitoring_engine.analytics.site_summary(website_id, start_at, end_at)
+        return jsonify({'status': 'success', 'data': summary})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid time window: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error getting analytics: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/websites/<int:website_id>/snapshots', methods=['GET'])
+def get_snapshots(website_id):
+    """List distinct page versions captured for a website (newest first)"""
+    try:
+        return jsonify({'status': 'success', 'data': monitoring_engine.snapshots.versions(website_id)})
+    except Exception as e:
+        logger.error(f"Error getting snapshots: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/websites/<int:website_id>/snapshots/diff', methods=['GET'])
+def get_snapshot_diff(website_id):
+    """Unified diff between two page versions (query params: from, to; default baseline -> latest)"""
+    try:
+        diff = monitoring_engine.snapshots.diff(
+            website_id, request.args.get('from'), request.args.get('to'), request.args.get('context', 3, type=int)
+        )
+        return jsonify({'status': 'success', 'data': diff})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error diffing snapshots: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/websites/<int:website_id>/snapshots/<snapshot_hash>', methods=['GET'])
+def get_snapshot(website_id, snapshot_hash):
+    """Raw captured page body, served as plain text so it never renders"""
+    try:
+        versions = {version['snapshot_hash'] for version in monitoring_engine.snapshots.versions(website_id)}
+        body = monitoring_engine.snapshots.get(snapshot_hash) if snapshot_hash in versions else None
+        if body is None:
+            return jsonify({'status': 'error', 'message': 'Snapshot not found'}), 404
+        return Response(body, mimetype='text/plain', headers={'X-Content-Type-Options': 'nosniff'})
+    except Exception as e:
+        logger.error(f"Error getting snapshot: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+def get_fleet_analytics():
+    """Get analytics for all websites plus a fleet-wide aggregate"""
+    try:
+        start_at, end_at = parse_window(
+            request.args.get('from'), request.args.get('to'), request.args.get('days', 30, type=int)
+        )
+        return jsonify({'status': 'success', 'data': monitoring_engine.analytics.fleet_summary(start_at, end_at)})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid time window: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error getting fleet analytics: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/stats/overview', methods=['GET'])
 def get_overview_stats():
     """Get dashboard overview statistics"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_overview_stats') as conn:
             cursor = conn.cursor()
             
             # Total websites
@@ -341,10 +551,25 @@ def get_overview_stats():
         logger.error(f"Error getting stats: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus-style metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/outages', methods=['GET'])
+def get_outages():
+    """Get shared hosts currently treated as down, with the websites they serve"""
+    return jsonify({'status': 'success', 'data': monitoring_engine.circuits.outages()})
+
+@app.route('/api/stats/dns', methods=['GET'])
+def get_dns_stats():
+    """Get DNS cache statistics"""
+    return jsonify({'status': 'success', 'data': dns_cache.get_stats()})
+
 def get_website_status(website_id):
     """Get current status of a website"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_website_status') as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT status FROM monitoring_checks
@@ -370,7 +595,7 @@ def get_website_status(website_id):
 def get_ssl_info(website_id):
     """Get SSL certificate information"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_ssl_info') as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM ssl_certificates
@@ -390,7 +615,7 @@ def get_ssl_info(website_id):
 def get_defacement_status(website_id):
     """Get defacement status for a website"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection('get_defacement_status') as conn:
             cursor = conn.cursor()
             
             # Check if there's a recent defacement incident
@@ -422,14 +647,7 @@ def get_defacement_status(website_id):
                     }
             
             # Check if baseline exists (means defacement monitoring is active)
-            cursor.execute('''
-                SELECT COUNT(*) as count
-                FROM defacement_baselines
-                WHERE website_id = ?
-            ''', (website_id,))
-            
-            baseline = cursor.fetchone()
-            if baseline and baseline['count'] > 0:
+            if monitoring_engine.baselines.get(website_id):
                 # Baseline exists, no incidents = clean
                 return {
                     'status': 'clean',
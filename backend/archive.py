@@ -0,0 +1,332 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from database import Database, span_latency
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WGA1'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Column order in the file; each column is a packed array aligned to 8 bytes
+COLUMNS = ('check_id', 'offset', 'check_type', 'status', 'response_time', 'http_status_code', 'error_message',
+           'run_count', 'span', 'rt_sum', 'rt_min', 'rt_max')
+# Files written before spans were archived only have these
+LEGACY_COLUMNS = COLUMNS[:7]
+# Integer columns that may be NULL; stored with the column's maximum value as a sentinel
+NULLABLE_COLUMNS = ('response_time', 'rt_sum', 'rt_min', 'rt_max')
+
+def _smallest_typecode(max_value, signed=False):
+    """Pick the narrowest array typecode that holds values up to max_value in magnitude"""
+    for typecode in (('b', 'h', 'i', 'q') if signed else ('B', 'H', 'I', 'Q')):
+        limit = 256 ** array(typecode).itemsize
+        if max_value < (limit // 2 if signed else limit):
+            return typecode
+    raise ValueError(f"Value too large to archive: {max_value}")
+
+def _nullable_encode(values):
+    """Return (typecode, null sentinel, encoded values) for an integer column that may hold None"""
+    typecode = _smallest_typecode(max((value for value in values if value is not None), default=0) + 1)
+    null = 256 ** array(typecode).itemsize - 1
+    return typecode, null, [null if value is None else value for value in values]
+
+def _dictionary_encode(values):
+    """Return (dictionary, codes) where dictionary[0] is None"""
+    dictionary = [None]
+    index = {None: 0}
+    codes = []
+    for value in values:
+        code = index.get(value)
+        if code is None:
+            code = len(dictionary)
+            index[value] = code
+            dictionary.append(value)
+        codes.append(code)
+    return dictionary, codes
+
+class ArchiveDay:
+    """Memory-mapped view of one site-day archive file
+
+    Columns are exposed as memoryviews over the mapped file, so scans do not
+    copy data. Use as a context manager so the mapping is released.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:4]) != MAGIC:
+            raise ValueError(f"Not a WebGuard archive: {path}")
+        header_len = struct.unpack_from('<I', view, 4)[0]
+        self.header = json.loads(bytes(view[8:8 + header_len]))
+        self.count = self.header['count']
+        self.day_start = datetime.strptime(self.header['day'], '%Y-%m-%d')
+
+        self.columns = {}
+        self._views = [view]
+        position = self._align(8 + header_len)
+        for name in self.header.get('columns', LEGACY_COLUMNS):
+            typecode = self.header['typecodes'][name]
+            size = array(typecode).itemsize * self.count
+            raw = view[position:position + size]
+            self.columns[name] = raw.cast(typecode)
+            self._views.extend([raw, self.columns[name]])
+            position = self._align(position + size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._map.close()
+        self._file.close()
+
+    def check_ids(self):
+        return list(accumulate(self.columns['check_id'], initial=self.header['base_id']))[1:]
+
+    def offsets(self):
+        """Seconds since the start of the day for each row"""
+        return list(accumulate(self.columns['offset']))
+
+    def response_times(self):
+        """Response times in ms (None where the check had none)"""
+        return self._nullable('response_time')
+
+    def rows(self, website_id):
+        """Materialize rows in ascending (checked_at, check_id) order, shaped like monitoring_checks"""
+        dictionaries = self.header['dictionaries']
+        check_types = dictionaries['check_type']
+        statuses = dictionaries['status']
+        codes = dictionaries['http_status_code']
+        errors = dictionaries['error_message']
+        response_times = self.response_times()
+        if 'run_count' in self.columns:
+            run_counts = self.columns['run_count']
+            spans = self.columns['span']
+            rt_sums, rt_mins, rt_maxes = (self._nullable(name) for name in ('rt_sum', 'rt_min', 'rt_max'))
+        else:
+            run_counts = [1] * self.count
+            spans = [0] * self.count
+            rt_sums = rt_mins = rt_maxes = response_times
+
+        timestamps = {}
+        for i, (check_id, offset) in enumerate(zip(self.check_ids(), self.offsets())):
+            yield {
+                'check_id': check_id,
+                'website_id': website_id,
+                'check_type': check_types[self.columns['check_type'][i]],
+                'status': statuses[self.columns['status'][i]],
+                'response_time': response_times[i],
+                'http_status_code': codes[self.columns['http_status_code'][i]],
+                'error_message': errors[self.columns['error_message'][i]],
+                'checked_at': self._timestamp(timestamps, offset),
+                'run_count': run_counts[i],
+                'first_checked_at': self._timestamp(timestamps, offset - spans[i]),
+                'rt_sum': rt_sums[i],
+                'rt_min': rt_mins[i],
+                'rt_max': rt_maxes[i]
+            }
+
+    def _nullable(self, name):
+        null = self.header['nulls'][name] if 'nulls' in self.header else self.header['null_response_time']
+        return [None if value == null else value for value in self.columns[name]]
+
+    def _timestamp(self, cache, offset):
+        checked_at = cache.get(offset)
+        if checked_at is None:
+            checked_at = (self.day_start + timedelta(seconds=offset)).strftime(TIMESTAMP_FORMAT)
+            cache[offset] = checked_at
+        return checked_at
+
+    @staticmethod
+    def _align(position):
+        return (position + 7) // 8 * 8
+
+class CheckArchive:
+    """Cold storage for aged monitoring checks as compact per-site, per-day columnar files"""
+
+    def __init__(self, base_dir=None, db=None):
+        self.base_dir = base_dir or Config.ARCHIVE_PATH
+        self.db = db or Database()
+
+    def day_path(self, website_id, day):
+        return os.path.join(self.base_dir, str(website_id), f"{day}.wga")
+
+    def website_ids(self):
+        """Websites that have at least one archived day"""
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(int(name) for name in os.listdir(self.base_dir) if name.isdigit())
+
+    def days(self, website_id):
+        """Archived days for a site, oldest first"""
+        site_dir = os.path.join(self.base_dir, str(website_id))
+        if not os.path.isdir(site_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(site_dir) if name.endswith('.wga'))
+
+    def open_day(self, website_id, day):
+        return ArchiveDay(self.day_path(website_id, day))
+
+    def iter_rows(self, website_id, start=None, end=None, descending=True):
+        """Yield archived rows for a site within [start, end) ('YYYY-MM-DD HH:MM:SS' strings)"""
+        days = self.days(website_id)
+        if start:
+            days = [day for day in days if day >= start[:10]]
+        if end:
+            days = [day for day in days if day <= end[:10]]
+        if descending:
+            days.reverse()
+
+        for day in days:
+            with self.open_day(website_id, day) as archive_day:
+                rows = list(archive_day.rows(website_id))
+            if descending:
+                rows.reverse()
+            for row in rows:
+                if start and row['checked_at'] < start:
+                    continue
+                if end and row['checked_at'] >= end:
+                    continue
+                yield row
+
+    def write_day(self, website_id, day, rows):
+        """Write (or merge into) the archive file for one site-day
+
+        Merging is keyed by check_id, so rows archived by a run that died
+        before deleting them from the database are not written twice.
+        """
+        path = self.day_path(website_id, day)
+        rows = list(rows)
+        if os.path.exists(path):
+            incoming = {row['check_id'] for row in rows}
+            with self.open_day(website_id, day) as existing:
+                rows = [row for row in existing.rows(website_id) if row['check_id'] not in incoming] + rows
+        rows = sorted(rows, key=lambda row: (row['checked_at'], row['check_id']))
+        if not rows:
+            return 0
+
+        day_start = datetime.strptime(day, '%Y-%m-%d')
+        offsets = [int((datetime.strptime(row['checked_at'][:19], TIMESTAMP_FORMAT) - day_start).total_seconds()) for row in rows]
+        offset_deltas = [offsets[0]] + [b - a for a, b in zip(offsets, offsets[1:])]
+        base_id = rows[0]['check_id']
+        id_deltas = [0] + [b['check_id'] - a['check_id'] for a, b in zip(rows, rows[1:])]
+
+        # Rows written before spans existed have no first_checked_at and cover one check
+        first_offsets = [
+            int((datetime.strptime(row['first_checked_at'][:19], TIMESTAMP_FORMAT) - day_start).total_seconds())
+            if row['first_checked_at'] else offset
+            for row, offset in zip(rows, offsets)
+        ]
+        summaries = [span_latency(row) for row in rows]
+
+        dictionaries = {}
+        typecodes = {}
+        nulls = {}
+        encoded = {
+            'check_id': id_deltas,
+            'offset': offset_deltas,
+            'run_count': [summary[0] for summary in summaries],
+            'span': [max(offset - first, 0) for offset, first in zip(offsets, first_offsets)]
+        }
+        for name in ('check_type', 'status', 'http_status_code', 'error_message'):
+            dictionaries[name], encoded[name] = _dictionary_encode(row[name] for row in rows)
+        nullable = {
+            'response_time': [row['response_time'] for row in rows],
+            'rt_sum': [summary[1] for summary in summaries],
+            'rt_min': [summary[2] for summary in summaries],
+            'rt_max': [summary[3] for summary in summaries]
+        }
+        for name in NULLABLE_COLUMNS:
+            typecodes[name], nulls[name], encoded[name] = _nullable_encode(nullable[name])
+
+        for name in COLUMNS:
+            if name == 'check_id':
+                # Rows are ordered by time, so ids can occasionally step backwards
+                typecodes[name] = _smallest_typecode(max(abs(delta) for delta in id_deltas), signed=True)
+            elif name not in NULLABLE_COLUMNS:
+                typecodes[name] = _smallest_typecode(max(encoded[name]))
+
+        header = json.dumps({
+            'day': day,
+            'count': len(rows),
+            'base_id': base_id,
+            'columns': COLUMNS,
+            'nulls': nulls,
+            'typecodes': typecodes,
+            'dictionaries': dictionaries
+        }).encode()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            self._pad(f)
+            for name in COLUMNS:
+                f.write(array(typecodes[name], encoded[name]).tobytes())
+                self._pad(f)
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def archive_older_than(self, days=None):
+        """Move checks older than ``days`` days from the database into archive files"""
+        days = days if days is not None else Config.ARCHIVE_AFTER_DAYS
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d 00:00:00')
+        moved = 0
+
+        with self.db.get_connection('CheckArchive.archive_older_than') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT website_id, substr(checked_at, 1, 10) as day
+                FROM monitoring_checks
+                WHERE checked_at < ?
+                ORDER BY website_id, day
+            ''', (cutoff,))
+            site_days = cursor.fetchall()
+
+            for site_day in site_days:
+                website_id, day = site_day['website_id'], site_day['day']
+                cursor.execute('''
+                    SELECT * FROM monitoring_checks
+                    WHERE website_id = ? AND checked_at >= ? AND checked_at < ?
+                ''', (website_id, f"{day} 00:00:00", f"{day} 24:00:00"))
+                rows = [dict(row) for row in cursor.fetchall()]
+                if not rows:
+                    continue
+                try:
+                    self.write_day(website_id, day, rows)
+                except Exception as e:
+                    logger.error(f"Error archiving checks for website {website_id} on {day}: {str(e)}")
+                    continue
+                # Only delete once the file is safely on disk
+                cursor.executemany('DELETE FROM monitoring_checks WHERE check_id = ?',
+                                   [(row['check_id'],) for row in rows])
+                conn.commit()
+                moved += len(rows)
+
+        if moved:
+            logger.info(f"Archived {moved} checks across {len(site_days)} site-days")
+        return moved
+
+    def delete_site(self, website_id):
+        """Remove every archive file for a deleted website"""
+        for day in self.days(website_id):
+            os.remove(self.day_path(website_id, day))
+
+    @staticmethod
+    def _pad(f):
+        remainder = f.tell() % 8
+        if remainder:
+            f.write(b'\0' * (8 - remainder))
@@ -0,0 +1,156 @@
+import logging
+import threading
+from database import Database
+from config import Config
+from similarity import to_hex, from_hex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def _key(website_id, path):
+    return website_id if path is None else (website_id, path)
+
+class BaselineCache:
+    """Current defacement baseline per website, held in memory
+
+    All baselines are loaded with one query at startup, so each defacement
+    check is a dictionary lookup. Saving a baseline writes through to the
+    database and prunes superseded rows beyond ``Config.BASELINE_HISTORY``.
+    Extra pages of a website (``path``) keep baselines of their own.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self._baselines = {}  # website_id, or (website_id, path), -> baseline dict, or None when there is none
+        self._lock = threading.Lock()
+
+    def get(self, website_id, path=None):
+        """Return the current baseline for a website (or one of its paths), or None"""
+        key = _key(website_id, path)
+        baseline = self._baselines.get(key, _MISSING)
+        if baseline is _MISSING:
+            baseline = self._load(website_id, path)
+            with self._lock:
+                self._baselines.setdefault(key, baseline)
+        return baseline
+
+    def save(self, website_id, content_hash, content_selector=None, snapshot_hash=None,
+             text_simhash=None, dom_simhash=None, path=None):
+        """Store a new baseline, make it current and compact the page's older ones"""
+        with self.db.get_connection('BaselineCache.save') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO defacement_baselines
+                (website_id, content_hash, content_selector, snapshot_hash, text_simhash, dom_simhash, path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                website_id, content_hash, content_selector, snapshot_hash,
+                to_hex(text_simhash) if text_simhash is not None else None,
+                to_hex(dom_simhash) if dom_simhash is not None else None,
+                path
+            ))
+            baseline_id = cursor.lastrowid
+            self._prune(cursor, website_id, path)
+            cursor.execute('SELECT * FROM defacement_baselines WHERE baseline_id = ?', (baseline_id,))
+            baseline = self._to_baseline(cursor.fetchone())
+            conn.commit()
+
+        with self._lock:
+            self._baselines[_key(website_id, path)] = baseline
+        return baseline
+
+    def invalidate(self, website_id):
+        """Drop a website's entries, its paths' included, so the next lookup reloads them"""
+        with self._lock:
+            for key in [key for key in self._baselines if key == website_id or (isinstance(key, tuple) and key[0] == website_id)]:
+                del self._baselines[key]
+
+    def delete_path(self, website_id, path):
+        """Remove a path's baselines when it stops being monitored"""
+        with self.db.get_connection('BaselineCache.delete_path') as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM defacement_baselines WHERE website_id = ? AND path = ?', (website_id, path))
+            conn.commit()
+        with self._lock:
+            self._baselines.pop(_key(website_id, path), None)
+
+    def warm(self):
+        """Load the current baseline of every website in one query"""
+        try:
+            with self.db.get_connection('BaselineCache.warm') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM defacement_baselines b
+                    WHERE baseline_id = (
+                        SELECT baseline_id FROM defacement_baselines
+                        WHERE website_id = b.website_id AND path IS b.path
+                        ORDER BY captured_at DESC, baseline_id DESC
+                        LIMIT 1
+                    )
+                ''')
+                rows = cursor.fetchall()
+            with self._lock:
+                for row in rows:
+                    self._baselines[_key(row['website_id'], row['path'])] = self._to_baseline(row)
+            logger.info(f"Baseline cache warmed with {len(rows)} baselines")
+        except Exception as e:
+            logger.error(f"Error warming baseline cache: {str(e)}")
+
+    def compact(self):
+        """Delete superseded baselines for every page, keeping the newest ``BASELINE_HISTORY``"""
+        with self.db.get_connection('BaselineCache.compact') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM defacement_baselines
+                WHERE baseline_id IN (
+                    SELECT baseline_id FROM (
+                        SELECT baseline_id, ROW_NUMBER() OVER (
+                            PARTITION BY website_id, path ORDER BY captured_at DESC, baseline_id DESC
+                        ) as position
+                        FROM defacement_baselines
+                    ) WHERE position > ?
+                )
+            ''', (Config.BASELINE_HISTORY,))
+            removed = cursor.rowcount
+            conn.commit()
+        if removed:
+            logger.info(f"Compacted {removed} superseded defacement baselines")
+        return removed
+
+    def __len__(self):
+        return len(self._baselines)
+
+    def _load(self, website_id, path=None):
+        with self.db.get_connection('BaselineCache._load') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM defacement_baselines
+                WHERE website_id = ? AND path IS ?
+                ORDER BY captured_at DESC, baseline_id DESC
+                LIMIT 1
+            ''', (website_id, path))
+            row = cursor.fetchone()
+        return self._to_baseline(row) if row else None
+
+    def _prune(self, cursor, website_id, path=None):
+        cursor.execute('''
+            DELETE FROM defacement_baselines
+            WHERE website_id = ? AND path IS ? AND baseline_id NOT IN (
+                SELECT baseline_id FROM defacement_baselines
+                WHERE website_id = ? AND path IS ?
+                ORDER BY captured_at DESC, baseline_id DESC
+                LIMIT ?
+            )
+        ''', (website_id, path, website_id, path, Config.BASELINE_HISTORY))
+
+    def _to_baseline(self, row):
+        return {
+            'content_hash': row['content_hash'],
+            'content_selector': row['content_selector'],
+            'captured_at': row['captured_at'],
+            'snapshot_hash': row['snapshot_hash'],
+            'text_simhash': from_hex(row['text_simhash']),
+            'dom_simhash': from_hex(row['dom_simhash'])
+        }
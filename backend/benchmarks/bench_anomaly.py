@@ -0,0 +1,124 @@
+"""
+Benchmark for latency anomaly detection.
+
+Run (from the backend directory):
+    python benchmarks/bench_anomaly.py --checks 2000000 --sites 2000
+
+Fills a scratch database with synthetic uptime checks, then measures the
+per-check cost of the online detector and the time to seed every baseline
+from stored history, with the NumPy batch path and the pure-Python fallback.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench_anomaly.db'))
+
+import anomaly
+from anomaly import LatencyAnomalyDetector
+from database import Database
+
+
+def populate(db, checks, sites, seed):
+    """Insert ``checks`` uptime rows spread evenly over ``sites`` and the last few days"""
+    rng = random.Random(seed)
+    medians = [rng.uniform(30, 800) for _ in range(sites)]
+    start = datetime.utcnow() - timedelta(days=3)
+    step = timedelta(days=3) / max(checks // sites, 1)
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('INSERT INTO websites (url, display_name) VALUES (?, ?)',
+                           [(f"http://bench-{i}.test/", f"Bench {i}") for i in range(sites)])
+        batch = []
+        for i in range(checks):
+            site = i % sites
+            checked_at = (start + step * (i // sites)).strftime('%Y-%m-%d %H:%M:%S')
+            batch.append((site + 1, int(rng.lognormvariate(0, 0.3) * medians[site]), checked_at))
+            if len(batch) == 100_000:
+                cursor.executemany('''
+                    INSERT INTO monitoring_checks (website_id, check_type, status, response_time, checked_at)
+                    VALUES (?, 'uptime', 'success', ?, ?)
+                ''', batch)
+                batch = []
+        if batch:
+            cursor.executemany('''
+                INSERT INTO monitoring_checks (website_id, check_type, status, response_time, checked_at)
+                VALUES (?, 'uptime', 'success', ?, ?)
+            ''', batch)
+        conn.commit()
+
+
+def bench_online(iterations, sites):
+    detector = LatencyAnomalyDetector()
+    samples = [(i % sites, 100 + (i * 7919) % 50) for i in range(iterations)]
+    start = time.perf_counter()
+    for website_id, response_time in samples:
+        detector.observe(website_id, response_time)
+    elapsed = time.perf_counter() - start
+    print(f"online observe       {elapsed / iterations * 1e9:8.0f} ns/check")
+
+
+def bench_backfill(db, use_numpy):
+    anomaly.HAS_NUMPY = use_numpy
+    detector = LatencyAnomalyDetector()
+    start = time.perf_counter()
+    rows = detector.backfill(db)
+    elapsed = time.perf_counter() - start
+    label = 'numpy' if use_numpy else 'pure python'
+    print(f"backfill ({label:11}) {elapsed:8.2f} s for {rows} checks, {len(detector)} sites")
+    return detector
+
+
+def bench_batch_only(db, use_numpy):
+    """Time just the baseline computation, excluding the database read"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT website_id, response_time FROM monitoring_checks
+            WHERE check_type = 'uptime' AND response_time IS NOT NULL
+            ORDER BY website_id, checked_at, check_id
+        ''')
+        rows = cursor.fetchall()
+    website_ids = [row[0] for row in rows]
+    response_times = [row[1] for row in rows]
+
+    anomaly.HAS_NUMPY = use_numpy
+    start = time.perf_counter()
+    anomaly.batch_baselines(website_ids, response_times, 0.05)
+    elapsed = time.perf_counter() - start
+    label = 'numpy' if use_numpy else 'pure python'
+    print(f"batch ({label:11})    {elapsed:8.2f} s ({elapsed / len(rows) * 1e9:.0f} ns/check)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark latency anomaly detection')
+    parser.add_argument('--checks', type=int, default=1_000_000)
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    has_numpy = anomaly.HAS_NUMPY
+    db = Database()
+    start = time.perf_counter()
+    populate(db, args.checks, args.sites, args.seed)
+    print(f"populated {args.checks} checks for {args.sites} sites in {time.perf_counter() - start:.1f} s")
+
+    bench_online(min(args.checks, 1_000_000), args.sites)
+    if has_numpy:
+        bench_batch_only(db, True)
+    bench_batch_only(db, False)
+    numpy_detector = bench_backfill(db, True) if has_numpy else None
+    python_detector = bench_backfill(db, False)
+
+    if numpy_detector:
+        worst = max(
+            abs(numpy_detector._baselines[site].mean - python_detector._baselines[site].mean)
+            for site in python_detector._baselines
+        )
+        print(f"max |numpy - python| baseline mean difference: {worst:.2e} ms")
@@ -0,0 +1,120 @@
+"""
+Benchmark for the timer-heap scheduling core.
+
+Run (from the backend directory):
+    python benchmarks/bench_scheduler.py --sites 10000 100000 1000000 --hours 1
+    python benchmarks/bench_scheduler.py --sites 10000 --compare
+
+Registers N sites with intervals between 1 and 60 minutes and random
+phases, then drives the heap with a virtual clock for the given number of
+simulated hours, firing and rescheduling every due site exactly as
+CheckDispatcher does. Reports memory held by the schedule, registration
+time and CPU time per dispatch. --compare also measures the same number
+of per-site APScheduler interval jobs (memory job store, paused
+scheduler) for reference.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_heap import TimerHeap
+
+INTERVALS = (60, 120, 300, 600, 900, 1800, 3600)
+
+
+def build(sites, seed):
+    rng = random.Random(seed)
+    plan = []
+    for website_id in range(1, sites + 1):
+        interval = rng.choice(INTERVALS)
+        plan.append((website_id, interval, rng.uniform(0, interval)))
+    return plan
+
+
+def bench_heap(plan, hours):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    timers = TimerHeap()
+    intervals = {}
+    for website_id, interval, first_due in plan:
+        intervals[website_id] = interval
+        timers.schedule(website_id, first_due)
+    register = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Virtual clock: jump straight to the next due time instead of sleeping
+    end = hours * 3600
+    dispatched = 0
+    wakeups = 0
+    start = time.process_time()
+    now = timers.next_due()
+    while now is not None and now <= end:
+        wakeups += 1
+        for website_id, due in timers.pop_due(now):
+            timers.schedule(website_id, due + intervals[website_id])
+            dispatched += 1
+        now = timers.next_due()
+    cpu = time.process_time() - start
+    return {
+        'memory_mb': memory / 1e6,
+        'bytes_per_site': memory / len(plan),
+        'register_s': register,
+        'dispatched': dispatched,
+        'wakeups': wakeups,
+        'cpu_s': cpu,
+        'us_per_dispatch': cpu / max(dispatched, 1) * 1e6
+    }
+
+
+def bench_apscheduler(plan):
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    def noop(website_id):
+        pass
+
+    scheduler = BackgroundScheduler()
+    scheduler.start(paused=True)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for website_id, interval, _ in plan:
+        scheduler.add_job(noop, IntervalTrigger(seconds=interval), args=[website_id], id=f"website_{website_id}")
+    register = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    scheduler.shutdown(wait=False)
+    return {'memory_mb': memory / 1e6, 'bytes_per_site': memory / len(plan), 'register_s': register}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--hours', type=float, default=1.0, help='simulated time to run the virtual clock for')
+    parser.add_argument('--compare', action='store_true', help='also measure per-site APScheduler jobs')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for sites in args.sites:
+        plan = build(sites, args.seed)
+        result = bench_heap(plan, args.hours)
+        print(f"{sites:>9,} sites  timer heap: {result['memory_mb']:8.1f} MB ({result['bytes_per_site']:.0f} B/site), "
+              f"register {result['register_s']:.2f}s, {result['dispatched']:,} dispatches in {args.hours:g}h "
+              f"({result['wakeups']:,} wake-ups), {result['cpu_s']:.2f}s CPU, {result['us_per_dispatch']:.2f} us/dispatch")
+        if args.compare:
+            baseline = bench_apscheduler(plan)
+            print(f"{sites:>9,} sites  APScheduler: {baseline['memory_mb']:8.1f} MB ({baseline['bytes_per_site']:.0f} B/site), "
+                  f"register {baseline['register_s']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
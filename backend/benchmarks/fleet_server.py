@@ -0,0 +1,299 @@
+"""
+Simulated fleet of websites for load testing.
+
+Run standalone:
+    python benchmarks/fleet_server.py --sites 5000 --port 9000
+
+Every virtual site lives under /s/<site_id>/ on one asyncio server (plus an
+optional TLS listener). Each site has its own latency distribution, error
+rate, page size, optional slow-drip body and deface/flap schedules, all
+derived from a seed so runs are reproducible.
+"""
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import math
+import os
+import random
+import ssl
+import tempfile
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+# Share of the fleet given each behaviour by build_fleet()
+DEFAULT_MIX = {
+    'slow': 0.10,      # high-latency sites
+    'erroring': 0.05,  # random 5xx responses
+    'drip': 0.02,      # body trickles out in chunks
+    'deface': 0.01,    # periodically serves different content
+    'flap': 0.03       # periodically goes down
+}
+
+
+class SiteProfile:
+    """Behaviour of one virtual site"""
+
+    def __init__(self, site_id, latency_ms=40.0, latency_sigma=0.4, error_rate=0.0,
+                 page_size=4096, drip_chunks=0, drip_delay=0.0,
+                 deface_period=0, deface_duration=0, flap_period=0, flap_duration=0):
+        self.site_id = site_id
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.drip_chunks = drip_chunks
+        self.drip_delay = drip_delay
+        self.deface_period = deface_period
+        self.deface_duration = deface_duration
+        self.flap_period = flap_period
+        self.flap_duration = flap_duration
+        # Offset schedules per site so outages don't all line up
+        self.phase = (site_id * 7919) % 997
+
+    def latency(self, rng):
+        """Sample a response latency in seconds from a log-normal distribution"""
+        mu = math.log(self.latency_ms / 1000.0)
+        return rng.lognormvariate(mu, self.latency_sigma)
+
+    def is_down(self, now):
+        return self._in_window(now, self.flap_period, self.flap_duration)
+
+    def is_defaced(self, now):
+        return self._in_window(now, self.deface_period, self.deface_duration)
+
+    def _in_window(self, now, period, duration):
+        if not period:
+            return False
+        return (now + self.phase) % period < duration
+
+
+def build_fleet(count, seed=1, mix=None):
+    """Create ``count`` site profiles with a reproducible behaviour mix"""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    profiles = []
+    for site_id in range(1, count + 1):
+        profile = SiteProfile(site_id, page_size=rng.choice([1024, 4096, 16384, 65536]))
+        roll = rng.random()
+        threshold = 0.0
+        for behaviour, share in mix.items():
+            threshold += share
+            if roll < threshold:
+                _apply_behaviour(profile, behaviour, rng)
+                break
+        profiles.append(profile)
+    return profiles
+
+
+def _apply_behaviour(profile, behaviour, rng):
+    if behaviour == 'slow':
+        profile.latency_ms = rng.uniform(800, 3000)
+        profile.latency_sigma = 0.8
+    elif behaviour == 'erroring':
+        profile.error_rate = rng.uniform(0.05, 0.5)
+    elif behaviour == 'drip':
+        profile.drip_chunks = rng.randint(5, 20)
+        profile.drip_delay = rng.uniform(0.1, 0.5)
+    elif behaviour == 'deface':
+        profile.deface_period = rng.choice([300, 600, 1800])
+        profile.deface_duration = profile.deface_period // 5
+    elif behaviour == 'flap':
+        profile.flap_period = rng.choice([120, 300, 900])
+        profile.flap_duration = profile.flap_period // 4
+
+
+def render_page(profile, defaced):
+    """Build a deterministic page body of the profile's size"""
+    title = 'HACKED' if defaced else f'Site {profile.site_id}'
+    head = f"<html><head><title>{title}</title></head><body><h1>{title}</h1><p>".encode()
+    tail = b"</p></body></html>"
+    filler = max(profile.page_size - len(head) - len(tail), 0)
+    word = f"site{profile.site_id} ".encode()
+    return head + (word * (filler // len(word) + 1))[:filler] + tail
+
+
+def generate_self_signed_cert(directory):
+    """Write a self-signed certificate for localhost/127.0.0.1 and return (cert_path, key_path)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=45))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName('localhost'),
+            x509.IPAddress(ipaddress.ip_address('127.0.0.1'))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, 'fleet-cert.pem')
+    key_path = os.path.join(directory, 'fleet-key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+class FleetServer:
+    """asyncio HTTP/1.1 server answering for every virtual site"""
+
+    def __init__(self, profiles, host='127.0.0.1', port=0, tls_port=None, cert_dir=None, seed=1):
+        self.profiles = {profile.site_id: profile for profile in profiles}
+        self.host = host
+        self.port = port
+        self.tls_port = tls_port
+        self.cert_dir = cert_dir or tempfile.mkdtemp(prefix='webguard-fleet-')
+        self.cert_path = None
+        self.rng = random.Random(seed)
+        self.started_at = time.time()
+        self.requests = 0
+        self._pages = {}
+
+    async def start(self):
+        """Start listeners and return (http_port, tls_port)"""
+        server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = server.sockets[0].getsockname()[1]
+        self._servers = [server]
+
+        if self.tls_port is not None:
+            self.cert_path, key_path = generate_self_signed_cert(self.cert_dir)
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(self.cert_path, key_path)
+            tls_server = await asyncio.start_server(self._handle, self.host, self.tls_port, ssl=context, backlog=4096)
+            self.tls_port = tls_server.sockets[0].getsockname()[1]
+            self._servers.append(tls_server)
+        return self.port, self.tls_port
+
+    async def serve_forever(self):
+        """Serve until cancelled (call start() first)"""
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path = self._parse_request_line(request_line)
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    if header.lower().startswith(b'connection:') and b'close' in header.lower():
+                        keep_alive = False
+
+                self.requests += 1
+                await self._respond(writer, method, path, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _parse_request_line(self, line):
+        parts = line.decode('latin-1').split()
+        if len(parts) < 2:
+            return 'GET', '/'
+        return parts[0].upper(), parts[1]
+
+    async def _respond(self, writer, method, path, keep_alive):
+        profile = self._profile_for(path)
+        if profile is None:
+            await self._write(writer, 404, b'not found', method, keep_alive)
+            return
+
+        await asyncio.sleep(profile.latency(self.rng))
+        now = time.time() - self.started_at
+        if profile.is_down(now) or self.rng.random() < profile.error_rate:
+            await self._write(writer, 503, b'<html><body>Service Unavailable</body></html>', method, keep_alive)
+            return
+
+        defaced = profile.is_defaced(now)
+        key = (profile.site_id, defaced)
+        body = self._pages.get(key)
+        if body is None:
+            body = render_page(profile, defaced)
+            self._pages[key] = body
+        await self._write(writer, 200, body, method, keep_alive, profile)
+
+    def _profile_for(self, path):
+        parts = path.split('/')
+        if len(parts) >= 3 and parts[1] == 's' and parts[2].isdigit():
+            return self.profiles.get(int(parts[2]))
+        return None
+
+    async def _write(self, writer, status, body, method, keep_alive, profile=None):
+        reason = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}[status]
+        headers = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: text/html\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode()
+        writer.write(headers)
+        if method == 'HEAD':
+            await writer.drain()
+            return
+
+        if profile and profile.drip_chunks:
+            chunk_size = max(len(body) // profile.drip_chunks, 1)
+            for offset in range(0, len(body), chunk_size):
+                writer.write(body[offset:offset + chunk_size])
+                await writer.drain()
+                await asyncio.sleep(profile.drip_delay)
+        else:
+            writer.write(body)
+            await writer.drain()
+
+
+def run_in_process(sites, seed, tls, ready_queue):
+    """Entry point for multiprocessing: serve the fleet and report ports on ready_queue"""
+    async def main():
+        server = FleetServer(build_fleet(sites, seed), tls_port=0 if tls else None, seed=seed)
+        await server.start()
+        ready_queue.put((server.port, server.tls_port, server.cert_path))
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a simulated fleet of websites')
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--tls-port', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    async def main():
+        server = FleetServer(build_fleet(args.sites, args.seed), port=args.port,
+                             tls_port=args.tls_port, seed=args.seed)
+        port, tls_port = await server.start()
+        print(f"Serving {args.sites} sites on http://127.0.0.1:{port}/s/<id>/")
+        if tls_port:
+            print(f"TLS listener on https://127.0.0.1:{tls_port}/s/<id>/ (cert: {server.cert_path})")
+        await server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+"""
+End-to-end load test: MonitoringScheduler + MonitoringEngine against a
+simulated fleet of sites.
+
+Run (from the backend directory):
+    python benchmarks/load_test.py --sites 2000 --interval 30 --duration 120
+
+The fleet server runs in a separate process so only the monitor's own CPU
+and memory are measured. Adaptive intervals are off so every site is checked
+at --interval, and the circuit breaker keys each site separately, since they
+all share the fleet server's address. Reports checks/sec, schedule drift, CPU, RSS and
+database growth; pass --json for machine-readable output.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fleet_server import run_in_process
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def histogram_quantile(child, quantile):
+    """Approximate a quantile from a metrics histogram child"""
+    if not child.count:
+        return 0.0
+    target = quantile * child.count
+    cumulative = 0
+    for bound, count in zip(child.bounds, child.counts):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+
+def count_checks(db):
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(SUM(run_count), 0) as count FROM monitoring_checks WHERE check_type = 'uptime'")
+        return cursor.fetchone()['count']
+
+
+def run(args):
+    # Start the fleet first so its port is known before the monitor is configured
+    ready = multiprocessing.Queue()
+    fleet = multiprocessing.Process(
+        target=run_in_process, args=(args.sites, args.seed, args.tls_fraction > 0, ready), daemon=True
+    )
+    fleet.start()
+    http_port, tls_port, cert_path = ready.get(timeout=30)
+
+    workdir = tempfile.mkdtemp(prefix='webguard-load-')
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'load.db')
+    os.environ['TELEGRAM_BOT_TOKEN'] = ''
+    if cert_path:
+        # Trust the fleet's self-signed certificate for both requests and the SSL probe
+        os.environ['REQUESTS_CA_BUNDLE'] = cert_path
+        os.environ['SSL_CERT_FILE'] = cert_path
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from config import Config
+    Config.MIN_CHECK_INTERVAL = min(Config.MIN_CHECK_INTERVAL, args.interval)
+    # Every site runs at --interval, so expected_checks holds for any duration
+    Config.ADAPTIVE_INTERVALS_ENABLED = False
+    Config.SCHEDULER_WORKERS = args.workers
+    Config.TELEGRAM_BOT_TOKEN = ''
+
+    from database import Database
+    from metrics import SCHEDULER_LAG, SCHEDULER_MISSED
+    from scheduler import MonitoringScheduler
+
+    db = Database()
+    tls_sites = int(args.sites * args.tls_fraction)
+    rows = []
+    for site_id in range(1, args.sites + 1):
+        if site_id <= tls_sites:
+            url = f"https://127.0.0.1:{tls_port}/s/{site_id}/"
+        else:
+            url = f"http://127.0.0.1:{http_port}/s/{site_id}/"
+        rows.append((url, f"Fleet {site_id}", args.interval, 1, 1 if url.startswith('https://') else 0))
+    with db.get_connection() as conn:
+        conn.cursor().executemany('''
+            INSERT INTO websites (url, display_name, check_interval,
+                                defacement_detection_enabled, ssl_monitoring_enabled)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+    db_size_start = os.path.getsize(Config.DATABASE_PATH)
+    cpu_start = time.process_time()
+    rss_start = rss_bytes()
+    rss_peak = rss_start
+    start = time.monotonic()
+
+    scheduler = MonitoringScheduler()
+    # All fleet sites share one address and port; key the circuit breaker per site so a burst
+    # of failures on a few sites doesn't fail the whole fleet fast
+    host_key = scheduler.monitoring_engine._host_key
+    scheduler.monitoring_engine._host_key = lambda url: f"{host_key(url)}{urlparse(url).path}"
+    scheduler.start_all_monitoring()
+    setup_seconds = time.monotonic() - start
+
+    samples = []
+    while time.monotonic() - start < args.duration:
+        time.sleep(min(args.sample_every, args.duration))
+        rss_peak = max(rss_peak, rss_bytes())
+        samples.append({
+            'elapsed': round(time.monotonic() - start, 1),
+            'checks': count_checks(db),
+            'rss_mb': round(rss_bytes() / 1e6, 1)
+        })
+        if not args.json:
+            print(f"  t={samples[-1]['elapsed']:>6}s checks={samples[-1]['checks']:>8} rss={samples[-1]['rss_mb']}MB")
+
+    elapsed = time.monotonic() - start
+    cpu_seconds = time.process_time() - cpu_start
+    checks = count_checks(db)
+    scheduler.shutdown()
+    db_growth = os.path.getsize(Config.DATABASE_PATH) - db_size_start
+    expected = args.sites * max(int((elapsed - args.interval) // args.interval) + 1, 0) if elapsed >= args.interval else 0
+    lag = SCHEDULER_LAG._default
+    fleet.terminate()
+
+    return {
+        'sites': args.sites,
+        'interval': args.interval,
+        'workers': args.workers,
+        'duration_s': round(elapsed, 1),
+        'setup_s': round(setup_seconds, 2),
+        'checks': checks,
+        'checks_per_sec': round(checks / elapsed, 1),
+        'expected_checks': expected,
+        'completion_ratio': round(checks / expected, 3) if expected else None,
+        'lag_mean_s': round(lag.sum / lag.count, 3) if lag.count else 0.0,
+        'lag_p95_s': histogram_quantile(lag, 0.95),
+        'missed_runs': int(SCHEDULER_MISSED._default.value),
+        'cpu_s': round(cpu_seconds, 1),
+        'cpu_pct': round(cpu_seconds / elapsed * 100, 1),
+        'rss_start_mb': round(rss_start / 1e6, 1),
+        'rss_peak_mb': round(rss_peak / 1e6, 1),
+        'db_growth_bytes': db_growth,
+        'db_bytes_per_check': round(db_growth / checks, 1) if checks else None,
+        'samples': samples
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test WebGuard against a simulated fleet')
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=30, help='check interval per site (seconds)')
+    parser.add_argument('--duration', type=int, default=120, help='test length (seconds)')
+    parser.add_argument('--workers', type=int, default=50, help='scheduler worker threads')
+    parser.add_argument('--tls-fraction', type=float, default=0.1, help='share of sites served over TLS')
+    parser.add_argument('--sample-every', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            if key != 'samples':
+                print(f"{key:>20}: {value}")
@@ -0,0 +1,408 @@
+"""
+Virtual-clock simulation of scheduling and alerting.
+
+Run (from the backend directory):
+    python benchmarks/simulate.py
+    python benchmarks/simulate.py --scenario my_timeline.json --json
+
+Replays a scripted timeline of site behaviour through MonitoringScheduler,
+MonitoringEngine and NotificationService with a virtual clock and fake HTTP
+and Telegram clients, so days of monitoring run in seconds. Reports check
+and request counts, incidents and alerts, and how long each scripted fault
+took to be detected and alerted on.
+
+A scenario is JSON (durations are seconds or strings like "90s", "30m",
+"2h", "3d"):
+
+    {
+      "duration": "3d",
+      "fleet": {"sites": 20, "interval": 300, "sites_per_host": 5,
+                "latency_ms": 150, "defacement_every": 2},
+      "overrides": [{"site": 3, "interval": 60}],
+      "events": [
+        {"at": "2h", "site": 1, "kind": "down", "mode": "refused", "for": "30m"},
+        {"at": "20h", "host": "10.0.1.1", "kind": "down", "mode": "timeout", "for": "45m"}
+      ]
+    }
+
+Event kinds: "down" (mode "refused", "timeout", "unreachable" or
+"http_500"), "slow" (latency_ms), "deface" and "flap" (down/up every
+"period"). Sites are numbered from 1; site N is served from host
+10.0.<(N-1) // sites_per_host>.1.
+
+Each check runs at its due time and the clock is wound back after it, so
+checks overlap in virtual time as they would on a worker pool. Stored check,
+rollup, incident and notification times follow the virtual clock too.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SCENARIO = {
+    'duration': '3d',
+    'fleet': {'sites': 20, 'interval': 300, 'sites_per_host': 5, 'latency_ms': 150, 'defacement_every': 2},
+    'overrides': [],
+    'events': [
+        {'at': '2h', 'site': 1, 'kind': 'down', 'mode': 'refused', 'for': '30m'},
+        {'at': '6h', 'site': 2, 'kind': 'slow', 'latency_ms': 3000, 'for': '1h'},
+        {'at': '12h', 'site': 4, 'kind': 'deface', 'for': '2h'},
+        {'at': '20h', 'host': '10.0.1.1', 'kind': 'down', 'mode': 'timeout', 'for': '45m'},
+        {'at': '30h', 'site': 3, 'kind': 'flap', 'period': '4m', 'for': '2h'},
+        {'at': '48h', 'site': 5, 'kind': 'down', 'mode': 'http_500', 'for': '10m'}
+    ]
+}
+
+# Incident types that count as detecting each kind of fault
+DETECTED_BY = {
+    'down': {'downtime'},
+    'flap': {'downtime'},
+    'slow': {'performance_degradation', 'downtime'},
+    'deface': {'defacement'}
+}
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def seconds(value):
+    """Parse 90, "90s", "30m", "2h" or "3d" into seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([smhd]?)\s*', value)
+    if not match:
+        raise ValueError(f"Bad duration {value!r}")
+    return float(match.group(1)) * UNITS[match.group(2) or 's']
+
+
+def page(site_id, defaced=False):
+    if defaced:
+        return (f"<html><head><title>Hacked</title></head><body><h1>Owned by nobody</h1>"
+                f"<p>This site {site_id} has been defaced.</p></body></html>").encode()
+    paragraphs = ''.join(f"<p>Section {n} of site {site_id}: products, prices and opening hours.</p>" for n in range(12))
+    return (f"<html><head><title>Site {site_id}</title></head><body><h1>Welcome to site {site_id}</h1>"
+            f"<nav><a href='/'>Home</a><a href='/about'>About</a></nav>{paragraphs}</body></html>").encode()
+
+
+class FakeResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def close(self):
+        pass
+
+
+class FakeFleet:
+    """Scripted sites answering the engine's HTTP calls, advancing the virtual clock by each request's latency"""
+
+    def __init__(self, clock, scenario, start, seed):
+        import requests
+        self.exceptions = requests.exceptions
+        self.clock = clock
+        self.rng = random.Random(seed)
+        fleet = scenario['fleet']
+        per_host = fleet.get('sites_per_host', 1)
+        self.sites = {}
+        for site_id in range(1, fleet['sites'] + 1):
+            host = f"10.0.{(site_id - 1) // per_host}.1"
+            self.sites[site_id] = {
+                'url': f"http://{host}/site/{site_id}/",
+                'host': host,
+                'latency_ms': fleet.get('latency_ms', 150),
+                'faults': []
+            }
+        self.by_path = {f"/site/{site_id}/": site for site_id, site in self.sites.items()}
+        self.requests = {'head': 0, 'get': 0}
+        self.timeline = []  # (time, +1/-1, site ids, fault)
+        self.faults = []
+        for event in scenario.get('events', []):
+            self._add_event(event, start)
+        self.timeline.sort(key=lambda item: item[0])
+        self._next = 0
+
+    def _add_event(self, event, start):
+        site_ids = [event['site']] if 'site' in event else [
+            site_id for site_id, site in self.sites.items() if site['host'] == event['host']
+        ]
+        begin = start + seconds(event['at'])
+        end = begin + seconds(event.get('for', '1h'))
+        fault = {'kind': event['kind'], 'mode': event.get('mode', 'refused'), 'latency_ms': event.get('latency_ms')}
+        for site_id in site_ids:
+            self.faults.append({'site': site_id, 'kind': event['kind'], 'start': begin, 'end': end})
+        if event['kind'] == 'flap':
+            # Alternate down/up phases; the outage itself is what gets detected
+            period = seconds(event.get('period', '5m'))
+            fault = {'kind': 'down', 'mode': fault['mode'], 'latency_ms': None}
+            phase_start = begin
+            while phase_start < end:
+                self.timeline.append((phase_start, 1, site_ids, fault))
+                self.timeline.append((min(phase_start + period, end), -1, site_ids, fault))
+                phase_start += 2 * period
+        else:
+            self.timeline.append((begin, 1, site_ids, fault))
+            self.timeline.append((end, -1, site_ids, fault))
+
+    def next_event(self):
+        return self.timeline[self._next][0] if self._next < len(self.timeline) else None
+
+    def apply_events(self, now):
+        while self._next < len(self.timeline) and self.timeline[self._next][0] <= now:
+            _, change, site_ids, fault = self.timeline[self._next]
+            for site_id in site_ids:
+                faults = self.sites[site_id]['faults']
+                if change > 0:
+                    faults.append(fault)
+                elif fault in faults:
+                    faults.remove(fault)
+            self._next += 1
+
+    def head(self, url, timeout=None, **kwargs):
+        self.requests['head'] += 1
+        response = self._request(url, timeout)
+        response.content = b''
+        return response
+
+    def get(self, url, timeout=None, **kwargs):
+        self.requests['get'] += 1
+        return self._request(url, timeout)
+
+    def _request(self, url, timeout):
+        site_id = int(url.rstrip('/').rsplit('/', 1)[1])
+        site = self.sites[site_id]
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        latency = site['latency_ms'] * self.rng.lognormvariate(0, 0.25)
+        status, defaced = 200, False
+        for fault in site['faults']:
+            if fault['kind'] == 'down':
+                if fault['mode'] == 'refused':
+                    raise self.exceptions.ConnectionError('Connection refused')
+                if fault['mode'] == 'unreachable':
+                    self.clock.advance(connect_timeout)
+                    raise self.exceptions.ConnectTimeout('Connect timeout')
+                if fault['mode'] == 'timeout':
+                    self.clock.advance(read_timeout)
+                    raise self.exceptions.ReadTimeout('Read timeout')
+                status = 500
+            elif fault['kind'] == 'slow':
+                latency = fault['latency_ms'] * self.rng.lognormvariate(0, 0.1)
+            elif fault['kind'] == 'deface':
+                defaced = True
+        if latency / 1000 > read_timeout:
+            self.clock.advance(read_timeout)
+            raise self.exceptions.ReadTimeout('Read timeout')
+        self.clock.advance(latency / 1000)
+        return FakeResponse(status, page(site_id, defaced) if status == 200 else b'<h1>Internal Server Error</h1>')
+
+
+class FakeBot:
+    """Stands in for the Telegram bot and keeps every delivered message"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((self.clock.time(), text))
+        return type('Message', (), {'message_id': len(self.sent)})()
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run(scenario, seed=1):
+    workdir = tempfile.mkdtemp(prefix='webguard-sim-')
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'sim.db')
+    os.environ['TELEGRAM_BOT_TOKEN'] = ''
+    os.environ['ALERT_COALESCING_ENABLED'] = 'False'
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from config import Config
+    from clock import clock, VirtualClock
+    from database import Database
+    from scheduler import MonitoringScheduler
+
+    fleet_config = scenario['fleet']
+    intervals = [fleet_config.get('interval', 300)] + [o['interval'] for o in scenario.get('overrides', []) if 'interval' in o]
+    Config.MIN_CHECK_INTERVAL = min(Config.MIN_CHECK_INTERVAL, *intervals)
+
+    start = 1_800_000_000.0
+    virtual = VirtualClock(start)
+    clock.install(virtual)
+    fleet = FakeFleet(virtual, scenario, start, seed)
+
+    db = Database()
+    overrides = {o['site']: o for o in scenario.get('overrides', [])}
+    defacement_every = fleet_config.get('defacement_every', 1)
+    rows = []
+    for site_id, site in fleet.sites.items():
+        override = overrides.get(site_id, {})
+        defacement = override.get('defacement', defacement_every and site_id % defacement_every == 0)
+        rows.append((site['url'], f"Site {site_id}", override.get('interval', fleet_config.get('interval', 300)),
+                     1 if defacement else 0))
+    with db.get_connection() as conn:
+        conn.cursor().executemany('''
+            INSERT INTO websites (url, display_name, check_interval, defacement_detection_enabled, ssl_monitoring_enabled)
+            VALUES (?, ?, ?, ?, 0)
+        ''', rows)
+        conn.commit()
+
+    scheduler = MonitoringScheduler(background=False)
+    engine = scheduler.monitoring_engine
+    engine.http = fleet
+    notifications = scheduler.notification_service
+    bot = FakeBot(virtual)
+    notifications.bot = bot
+    notifications.chat_id = 'simulation'
+    notifications.coalescer = None
+
+    checks = []       # (time, website_id, uptime status)
+    transitions = []  # (time, website_id, incident_type, transition)
+    alerts = []       # (time, website_id, incident_type, delivered)
+
+    check_website = engine.check_website
+    def recorded_check(website_id, url, *args, **kwargs):
+        results = check_website(website_id, url, *args, **kwargs)
+        now = virtual.time()
+        checks.append((now, website_id, (results.get('uptime') or {}).get('status')))
+        for event in results.get('incidents', []):
+            transitions.append((now, website_id, event['incident_type'], event['transition']))
+        return results
+    engine.check_website = recorded_check
+
+    send_notification = notifications.send_notification
+    def recorded_notification(website_id, incident_type, *args, **kwargs):
+        delivered = send_notification(website_id, incident_type, *args, **kwargs)
+        alerts.append((virtual.time(), website_id, incident_type, delivered))
+        return delivered
+    notifications.send_notification = recorded_notification
+
+    run_check = scheduler.dispatcher.run_check
+    def rewinding_check(website_id):
+        # Checks run side by side in virtual time: undo the latency this one spent
+        dispatched_at = virtual.time()
+        try:
+            run_check(website_id)
+        finally:
+            virtual.set(dispatched_at)
+    scheduler.dispatcher.run_check = rewinding_check
+
+    scheduler.start_all_monitoring()
+    end = start + seconds(scenario.get('duration', '1d'))
+    wall_start = time.perf_counter()
+    while True:
+        candidates = [t for t in (scheduler.dispatcher.next_due(), fleet.next_event()) if t is not None]
+        if not candidates or min(candidates) > end:
+            break
+        now = min(candidates)
+        virtual.set(now)
+        fleet.apply_events(now)
+        due = scheduler.dispatcher.next_due()
+        if due is not None and due <= now:
+            scheduler.dispatcher.run_pending()
+    wall = time.perf_counter() - wall_start
+    clock.install(None)
+
+    return report(scenario, fleet, start, end, wall, checks, transitions, alerts, bot, scheduler)
+
+
+def report(scenario, fleet, start, end, wall, checks, transitions, alerts, bot, scheduler):
+    opened = [(t, site, kind) for t, site, kind, transition in transitions if transition == 'opened']
+    faults = []
+    explained = set()
+    for fault in sorted(fleet.faults, key=lambda f: (f['start'], f['site'])):
+        interval = scheduler._intervals.get(fault['site'], 300)
+        deadline = fault['end'] + 2 * interval
+        expected = DETECTED_BY[fault['kind']]
+        detection = next(((t, kind) for t, site, kind in opened
+                          if site == fault['site'] and kind in expected and fault['start'] <= t <= deadline), None)
+        alert = next((t for t, site, kind, delivered in alerts
+                      if delivered and site == fault['site'] and kind in expected and fault['start'] <= t <= deadline), None)
+        for t, site, kind in opened:
+            if site == fault['site'] and fault['start'] <= t <= deadline:
+                explained.add((t, site, kind))
+        faults.append({
+            'site': fault['site'],
+            'kind': fault['kind'],
+            'at_s': round(fault['start'] - start),
+            'lasted_s': round(fault['end'] - fault['start']),
+            'incident': detection[1] if detection else None,
+            'detected_after_s': round(detection[0] - fault['start'], 1) if detection else None,
+            'alerted_after_s': round(alert - fault['start'], 1) if alert is not None else None
+        })
+
+    delays = [f['detected_after_s'] for f in faults if f['detected_after_s'] is not None]
+    hours = (end - start) / 3600
+    incidents = {}
+    for _, _, kind in opened:
+        incidents[kind] = incidents.get(kind, 0) + 1
+    return {
+        'simulated_hours': round(hours, 1),
+        'wall_seconds': round(wall, 2),
+        'speedup': round((end - start) / wall) if wall else None,
+        'sites': len(fleet.sites),
+        'checks': len(checks),
+        'checks_per_site_hour': round(len(checks) / len(fleet.sites) / hours, 2),
+        'failed_checks': sum(1 for _, _, status in checks if status == 'failure'),
+        'requests': dict(fleet.requests),
+        'incidents_opened': incidents,
+        'alerts_sent': sum(1 for *_, delivered in alerts if delivered),
+        'alerts_suppressed': sum(1 for *_, delivered in alerts if not delivered),
+        'messages_delivered': len(bot.sent),
+        'unexplained_incidents': len([o for o in opened if o not in explained]),
+        'faults_detected': f"{len(delays)}/{len(faults)}",
+        'detection_delay_s': {
+            'mean': round(sum(delays) / len(delays), 1) if delays else None,
+            'p50': percentile(delays, 0.5),
+            'max': max(delays) if delays else None
+        },
+        'faults': faults
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate scheduling and alerting against a scripted timeline')
+    parser.add_argument('--scenario', help='JSON scenario file (default: a built-in three-day timeline)')
+    parser.add_argument('--duration', help='override the scenario duration, e.g. 7d')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    scenario = DEFAULT_SCENARIO
+    if args.scenario:
+        with open(args.scenario) as f:
+            scenario = json.load(f)
+    if args.duration:
+        scenario = dict(scenario, duration=args.duration)
+
+    result = run(scenario, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            if key != 'faults':
+                print(f"{key:>24}: {value}")
+        print()
+        print(f"{'site':>5} {'kind':>7} {'at':>8} {'lasted':>7} {'incident':>24} {'detected':>9} {'alerted':>8}")
+        for fault in result['faults']:
+            print(f"{fault['site']:>5} {fault['kind']:>7} {fault['at_s']:>7}s {fault['lasted_s']:>6}s "
+                  f"{fault['incident'] or '-':>24} {fault['detected_after_s'] if fault['detected_after_s'] is not None else '-':>8}s "
+                  f"{fault['alerted_after_s'] if fault['alerted_after_s'] is not None else '-':>7}s")
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ManualCheckRunner:
+    """Run on-demand checks with in-flight coalescing, a short result cache and async jobs"""
+
+    def __init__(self, check_fn, cache_ttl=None, max_workers=None, job_ttl=None):
+        self.check_fn = check_fn
+        self.cache_ttl = cache_ttl if cache_ttl is not None else Config.MANUAL_CHECK_CACHE_TTL
+        self.job_ttl = job_ttl if job_ttl is not None else Config.MANUAL_CHECK_JOB_TTL
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.MANUAL_CHECK_WORKERS,
+            thread_name_prefix='manual-check'
+        )
+        self._cache = {}      # website_id -> (finished_at, Future)
+        self._in_flight = {}  # website_id -> Future
+        self._jobs = {}       # job_id -> job dict
+        self._lock = threading.Lock()
+
+    def run(self, website_id, website, timeout=None):
+        """Run a check synchronously, sharing any running or recent result
+
+        Returns ``(results, cached)`` where ``cached`` tells whether the
+        result came from the cache or another caller's in-flight check.
+        """
+        future, shared = self._get_or_start(website_id, website)
+        return future.result(timeout=timeout), shared
+
+    def submit(self, website_id, website):
+        """Start (or join) a check in the background and return a job id to poll"""
+        future, shared = self._get_or_start(website_id, website)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_jobs()
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'website_id': website_id,
+                'future': future,
+                'shared': shared,
+                'created_at': time.time()
+            }
+        return job_id
+
+    def get_job(self, job_id, wait=0):
+        """Return job status, optionally blocking up to ``wait`` seconds for completion"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if not job:
+            return None
+
+        future = job['future']
+        if wait and not future.done():
+            try:
+                future.result(timeout=wait)
+            except FutureTimeoutError:
+                pass
+            except Exception:
+                pass
+
+        status = {
+            'job_id': job_id,
+            'website_id': job['website_id'],
+            'shared': job['shared'],
+            'status': 'running'
+        }
+        if future.done():
+            error = future.exception()
+            if error:
+                status['status'] = 'error'
+                status['message'] = str(error)
+            else:
+                status['status'] = 'completed'
+                status['data'] = future.result()
+        return status
+
+    def invalidate(self, website_id):
+        """Drop any cached result for a website"""
+        with self._lock:
+            self._cache.pop(website_id, None)
+
+    def shutdown(self):
+        """Stop accepting new checks"""
+        self.executor.shutdown(wait=False)
+
+    def _get_or_start(self, website_id, website):
+        """Return a future for the website's check and whether it was shared"""
+        with self._lock:
+            cached = self._cache.get(website_id)
+            if cached and time.time() - cached[0] < self.cache_ttl:
+                return cached[1], True
+
+            future = self._in_flight.get(website_id)
+            if future is not None:
+                return future, True
+
+            future = self.executor.submit(self.check_fn, website_id, website)
+            self._in_flight[website_id] = future
+
+        future.add_done_callback(lambda done: self._on_done(website_id, done))
+        return future, False
+
+    def _on_done(self, website_id, future):
+        """Move a finished check from in-flight into the result cache"""
+        with self._lock:
+            if self._in_flight.get(website_id) is future:
+                del self._in_flight[website_id]
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self._cache[website_id] = (time.time(), future)
+            else:
+                logger.error(f"Manual check failed for website {website_id}: {future.exception()}")
+
+    def _evict_jobs(self):
+        """Drop finished jobs older than the job TTL (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['created_at'] < cutoff and job['future'].done()
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
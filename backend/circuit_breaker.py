@@ -0,0 +1,125 @@
+import logging
+import threading
+from config import Config
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class HostCircuitBreaker:
+    """Per shared host (IP and port) circuit breakers for uptime checks
+
+    When ``quorum`` different sites on one host fail to connect within
+    ``window`` seconds, with no site on that host answering in between, the
+    host's circuit opens: checks of its sites fail fast instead of each
+    waiting out the full timeout. After ``open_seconds`` the circuit goes
+    half-open and lets one check at a time through. Any answer closes it;
+    failed trials from ``quorum`` different sites open it again.
+    """
+
+    def __init__(self, quorum=None, window=None, open_seconds=None):
+        self.quorum = quorum or Config.CIRCUIT_QUORUM
+        self.window = window or Config.CIRCUIT_WINDOW
+        self.open_seconds = open_seconds or Config.CIRCUIT_OPEN_SECONDS
+        self._circuits = {}  # host key -> state dict
+        self._lock = threading.Lock()
+
+    def allow(self, key, website_id, now=None):
+        """Whether a check may contact the host; False means fail fast"""
+        now = clock.monotonic() if now is None else now
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit['state'] == CLOSED:
+                return True
+            circuit['sites'].add(website_id)
+            if circuit['state'] == OPEN:
+                if now < circuit['retry_at']:
+                    circuit['fast_failed'] += 1
+                    return False
+                circuit['state'] = HALF_OPEN
+                circuit['trial_failures'] = set()
+                circuit['trial_started'] = None
+                logger.info(f"Circuit for shared host {key} half-open, probing for recovery")
+            # Half-open: one trial check in flight at a time (a lost trial expires after open_seconds)
+            if circuit['trial_started'] is not None and now - circuit['trial_started'] < self.open_seconds:
+                circuit['fast_failed'] += 1
+                return False
+            circuit['trial_started'] = now
+            return True
+
+    def record(self, key, website_id, reachable, now=None):
+        """Record whether a check reached the host; returns 'open' or 'closed' when that changes the state, else None"""
+        now = clock.monotonic() if now is None else now
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if reachable:
+                if circuit is None:
+                    return None
+                if circuit['state'] == CLOSED:
+                    # The host answered, so earlier failures were not a host-wide outage
+                    del self._circuits[key]
+                    return None
+                del self._circuits[key]
+                logger.info(f"Circuit for shared host {key} closed after {now - circuit['opened_at']:.0f}s, "
+                            f"{circuit['fast_failed']} checks failed fast")
+                return CLOSED
+
+            if circuit is None:
+                circuit = self._circuits[key] = {'state': CLOSED, 'failures': {}, 'sites': set()}
+            circuit['sites'].add(website_id)
+
+            if circuit['state'] == CLOSED:
+                failures = circuit['failures']
+                failures[website_id] = now
+                for site, failed_at in list(failures.items()):
+                    if now - failed_at > self.window:
+                        del failures[site]
+                if len(failures) < self.quorum:
+                    return None
+                circuit.update({
+                    'state': OPEN,
+                    'opened_at': now,
+                    'retry_at': now + self.open_seconds,
+                    'fast_failed': 0
+                })
+                logger.warning(f"Circuit for shared host {key} opened: {len(failures)} sites unreachable")
+                return OPEN
+
+            if circuit['state'] == HALF_OPEN:
+                circuit['trial_started'] = None
+                circuit['trial_failures'].add(website_id)
+                if len(circuit['trial_failures']) >= self.quorum:
+                    circuit['state'] = OPEN
+                    circuit['retry_at'] = now + self.open_seconds
+                    logger.info(f"Circuit for shared host {key} still failing, reopened")
+            return None
+
+    def get_state(self, key):
+        circuit = self._circuits.get(key)
+        return circuit['state'] if circuit else CLOSED
+
+    def outages(self, now=None):
+        """Hosts whose circuit is open or half-open, with the websites affected"""
+        now = clock.monotonic() if now is None else now
+        with self._lock:
+            return [
+                {
+                    'host': key,
+                    'state': circuit['state'],
+                    'open_for_seconds': int(now - circuit['opened_at']),
+                    'website_ids': sorted(circuit['sites']),
+                    'checks_failed_fast': circuit['fast_failed']
+                }
+                for key, circuit in self._circuits.items()
+                if circuit['state'] != CLOSED
+            ]
+
+    def forget(self, website_id):
+        with self._lock:
+            for circuit in self._circuits.values():
+                circuit['sites'].discard(website_id)
+                circuit.get('failures', {}).pop(website_id, None)
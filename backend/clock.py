@@ -0,0 +1,76 @@
+import time
+from datetime import datetime
+
+class SystemClock:
+    """The real wall and monotonic clocks"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def now(self):
+        return datetime.now()
+
+    def utcnow(self):
+        return datetime.utcnow()
+
+class VirtualClock:
+    """A clock that only moves when told to, for simulations
+
+    ``start`` is in epoch seconds. The monotonic reading is the same
+    virtual time, so it can go backwards if the caller rewinds it.
+    """
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+
+    def time(self):
+        return self._now
+
+    def monotonic(self):
+        return self._now
+
+    def now(self):
+        return datetime.fromtimestamp(self._now)
+
+    def utcnow(self):
+        return datetime.utcfromtimestamp(self._now)
+
+    def set(self, timestamp):
+        self._now = timestamp
+
+    def advance(self, seconds):
+        self._now += seconds
+
+class Clock:
+    """Process-wide time source for the monitoring, scheduling and alerting code
+
+    Reads go to the real clock unless a ``VirtualClock`` has been installed.
+    """
+
+    def __init__(self):
+        self._source = SystemClock()
+
+    def install(self, source=None):
+        """Route all reads to ``source``, or back to the real clock when None"""
+        self._source = source or SystemClock()
+
+    def time(self):
+        return self._source.time()
+
+    def monotonic(self):
+        return self._source.monotonic()
+
+    def now(self):
+        return self._source.now()
+
+    def utcnow(self):
+        return self._source.utcnow()
+
+    def timestamp(self):
+        """Current UTC time as 'YYYY-MM-DD HH:MM:SS', the form CURRENT_TIMESTAMP stores"""
+        return self.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+clock = Clock()
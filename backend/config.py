@@ -21,10 +21,107 @@ class Config:
     DEFAULT_CHECK_INTERVAL = int(os.getenv('DEFAULT_CHECK_INTERVAL', 300))  # 5 minutes
     CHECK_TIMEOUT = int(os.getenv('CHECK_TIMEOUT', 30))  # 30 seconds
     MIN_CHECK_INTERVAL = 60  # 1 minute minimum
+    SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 10))  # concurrent scheduled checks
+    MAX_PATHS_PER_WEBSITE = int(os.getenv('MAX_PATHS_PER_WEBSITE', 20))  # extra pages checked alongside a website's URL
+    SCHEDULE_PERSIST_INTERVAL = 60  # seconds between saves of next-run times for warm restarts
+    SCHEDULER_CATCHUP_RATE = float(os.getenv('SCHEDULER_CATCHUP_RATE', 5))  # overdue checks started per second after a restart
+    SITE_REGISTRY_SYNC_INTERVAL = float(os.getenv('SITE_REGISTRY_SYNC_INTERVAL', 5))  # seconds between checks for website changes made by other processes
+    # Adaptive intervals: back off stable sites, tighten while failing or recovering
+    ADAPTIVE_INTERVALS_ENABLED = os.getenv('ADAPTIVE_INTERVALS_ENABLED', 'True').lower() == 'true'
+    ADAPTIVE_FAST_INTERVAL = int(os.getenv('ADAPTIVE_FAST_INTERVAL', 30))  # seconds between checks while failing
+    ADAPTIVE_MAX_INTERVAL = int(os.getenv('ADAPTIVE_MAX_INTERVAL', 900))  # back-off ceiling for stable sites
+    ADAPTIVE_GROWTH = 2  # interval multiplier per back-off step
+    ADAPTIVE_STABLE_CHECKS = 10  # consecutive healthy checks per back-off step
+    ADAPTIVE_RECOVERY_CHECKS = 3  # healthy checks kept at the fast rate after a confirmed failure
+    ADAPTIVE_CONFIRM_FAILURES = int(os.getenv('ADAPTIVE_CONFIRM_FAILURES', 2))  # consecutive unhealthy checks before the fast rate
+    # Tiered probes: HEAD for routine uptime, a full GET only when the body is needed
+    PROBE_MODE = os.getenv('PROBE_MODE', 'tiered')  # 'tiered' or 'full' (GET every check)
+    PROBE_VERIFY_EVERY = int(os.getenv('PROBE_VERIFY_EVERY', 10))  # HEAD probes between verifying GETs
+    DEFACEMENT_CHECK_INTERVAL = int(os.getenv('DEFACEMENT_CHECK_INTERVAL', 900))  # seconds between defacement checks, 0 = every check
+    # Shared-host circuit breaker: fail fast for sites on a host that several sites cannot reach
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'True').lower() == 'true'
+    CIRCUIT_QUORUM = int(os.getenv('CIRCUIT_QUORUM', 3))  # distinct unreachable sites that open a host's circuit
+    CIRCUIT_WINDOW = 120  # seconds within which those failures must fall
+    CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', 60))  # fail-fast period before a recovery trial
+    # Adaptive timeouts: per-site budgets from the site's p99 response time, capped at CHECK_TIMEOUT
+    ADAPTIVE_TIMEOUTS_ENABLED = os.getenv('ADAPTIVE_TIMEOUTS_ENABLED', 'True').lower() == 'true'
+    TIMEOUT_P99_FACTOR = float(os.getenv('TIMEOUT_P99_FACTOR', 3.0))  # budget = p99 x factor
+    TIMEOUT_CONNECT_MIN = float(os.getenv('TIMEOUT_CONNECT_MIN', 3.0))  # seconds
+    TIMEOUT_READ_MIN = float(os.getenv('TIMEOUT_READ_MIN', 5.0))  # seconds
+    TIMEOUT_SAMPLE_SIZE = 200  # recent response times kept per site
+    TIMEOUT_WARMUP_CHECKS = 20  # samples before a site's budget is tightened
+    MANUAL_CHECK_CACHE_TTL = int(os.getenv('MANUAL_CHECK_CACHE_TTL', 10))  # seconds a manual check result is reused
+    MANUAL_CHECK_WORKERS = int(os.getenv('MANUAL_CHECK_WORKERS', 4))
+    MANUAL_CHECK_JOB_TTL = 300  # seconds finished async check jobs stay pollable
+    
+    # DNS cache (record TTLs are honored when dnspython is installed)
+    DNS_DEFAULT_TTL = int(os.getenv('DNS_DEFAULT_TTL', 60))
+    DNS_MIN_TTL = 5
+    DNS_MAX_TTL = 3600
+    DNS_NEGATIVE_TTL = int(os.getenv('DNS_NEGATIVE_TTL', 30))
     
     # SSL Certificate Warnings (days before expiry)
     SSL_WARNING_THRESHOLDS = [30, 14, 7, 0]  # 30 days, 14 days, 7 days, expired
+    SSL_PROBE_INTERVAL = int(os.getenv('SSL_PROBE_INTERVAL', 21600))  # seconds between certificate fetches, to spot renewals
+    SSL_EXPIRY_SWEEP_INTERVAL = 60  # seconds between looks at the expiry index for threshold crossings
+    
+    # Incident lifecycle (flap damping): consecutive results needed to open / resolve
+    INCIDENT_OPEN_AFTER = {
+        'downtime': int(os.getenv('DOWNTIME_OPEN_AFTER', 2)),
+        'defacement': 1,
+        'ssl_expiry': 1,
+        'performance_degradation': 3,
+        'page_downtime': int(os.getenv('DOWNTIME_OPEN_AFTER', 2)),
+        'page_defacement': 1
+    }
+    INCIDENT_CLOSE_AFTER = {
+        'downtime': int(os.getenv('DOWNTIME_CLOSE_AFTER', 2)),
+        'defacement': 1,
+        'ssl_expiry': 1,
+        'performance_degradation': 3,
+        'page_downtime': int(os.getenv('DOWNTIME_CLOSE_AFTER', 2)),
+        'page_defacement': 1
+    }
+    
+    # Response time anomaly detection (rolling per-site EWMA baselines)
+    ANOMALY_DETECTION_ENABLED = os.getenv('ANOMALY_DETECTION_ENABLED', 'True').lower() == 'true'
+    ANOMALY_ALPHA = float(os.getenv('ANOMALY_ALPHA', 0.05))  # weight of the newest sample
+    ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 4.0))  # standard deviations above the mean
+    ANOMALY_MIN_RATIO = 2.0  # and at least this many times the mean
+    ANOMALY_MIN_DELTA_MS = 200  # and at least this many ms above the mean
+    ANOMALY_WARMUP_CHECKS = 20  # samples before a baseline is trusted
+    ANOMALY_RELEARN_AFTER = 100  # consecutive anomalous checks before accepting the new latency
+    ANOMALY_BACKFILL_DAYS = 7  # history used to seed baselines at startup
+    
+    # Check storage: 'spans' folds consecutive identical outcomes into one row, 'rows' writes every check
+    CHECK_STORAGE_MODE = os.getenv('CHECK_STORAGE_MODE', 'spans')
+    
+    # Defacement baselines kept per website (older ones are compacted away)
+    BASELINE_HISTORY = int(os.getenv('BASELINE_HISTORY', 5))
+    
+    # Defacement similarity (SimHash bit distance from the baseline, out of 64)
+    DEFACEMENT_MIN_DISTANCE = int(os.getenv('DEFACEMENT_MIN_DISTANCE', 4))  # smaller changes are ignored
+    DEFACEMENT_HIGH_DISTANCE = int(os.getenv('DEFACEMENT_HIGH_DISTANCE', 12))
+    DEFACEMENT_CRITICAL_DISTANCE = int(os.getenv('DEFACEMENT_CRITICAL_DISTANCE', 24))
+    
+    # Page snapshots kept by defacement checks (compressed, deduplicated by hash)
+    SNAPSHOTS_ENABLED = os.getenv('SNAPSHOTS_ENABLED', 'True').lower() == 'true'
+    SNAPSHOT_MAX_BODY_BYTES = 2 * 1024 * 1024  # larger bodies are truncated before storing
+    SNAPSHOT_STORE_MAX_BYTES = int(os.getenv('SNAPSHOT_STORE_MAX_MB', 256)) * 1024 * 1024  # compressed size cap
+    SNAPSHOT_MAX_AGE_DAYS = int(os.getenv('SNAPSHOT_MAX_AGE_DAYS', 90))  # drop versions not seen for this long
+    
+    # Cold storage for aged checks (columnar per-site, per-day files)
+    ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'True').lower() == 'true'
+    ARCHIVE_PATH = os.getenv('ARCHIVE_PATH', 'data/archive')
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+    
+    # Metrics (/metrics endpoint)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
     
     # Notification
     NOTIFICATION_COOLDOWN = 300  # 5 minutes between duplicate notifications
+    ALERT_COALESCING_ENABLED = os.getenv('ALERT_COALESCING_ENABLED', 'True').lower() == 'true'
+    ALERT_COALESCE_WINDOW = int(os.getenv('ALERT_COALESCE_WINDOW', 60))  # seconds to collect alerts into a digest
+    ALERT_COALESCE_GROUP_BY = os.getenv('ALERT_COALESCE_GROUP_BY', 'ip')  # 'ip' or 'host'
+    ALERT_DIGEST_MAX_SITES = 50  # sites listed in a digest before truncating
 
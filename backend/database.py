@@ -1,8 +1,84 @@
 import sqlite3
 import os
+import time
 from datetime import datetime
 from contextlib import contextmanager
 from config import Config
+from metrics import DB_QUERIES, DB_DURATION
+
+def span_latency(row):
+    """Return (checks, rt_sum, rt_min, rt_max) for a monitoring_checks row (rt_* None without timings)
+
+    With change-only storage a row is a span of identical checks; rows written
+    before spans existed hold a single check and no latency summary.
+    """
+    count = row['run_count'] or 1
+    response_time = row['response_time']
+    if response_time is None:
+        return count, None, None, None
+    if row['rt_sum'] is None:
+        return count, response_time * count, response_time, response_time
+    return count, row['rt_sum'], row['rt_min'], row['rt_max']
+
+class _CountingCursor(sqlite3.Cursor):
+    """Cursor that counts and times statements for the metrics layer"""
+    
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            connection = self.connection
+            connection.query_count += 1
+            connection.query_time += time.perf_counter() - start
+    
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            connection = self.connection
+            connection.query_count += 1
+            connection.query_time += time.perf_counter() - start
+    
+    # Statements run lazily, so stepping through the results is query time too
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self.connection.query_time += time.perf_counter() - start
+    
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self.connection.query_time += time.perf_counter() - start
+
+class _InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements and commits report counts and time spent"""
+    
+    # Class defaults, shadowed per connection on first use (cheaper than an __init__)
+    query_count = 0
+    query_time = 0.0
+    
+    def cursor(self, factory=None):
+        return super().cursor(factory or _CountingCursor)
+    
+    # Route the shortcut methods through a counting cursor as well
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+    
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+    
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.query_time += time.perf_counter() - start
 
 class Database:
     def __init__(self, db_path=None):
@@ -18,7 +94,7 @@ class Database:
     
     def _init_database(self):
         """Initialize database schema"""
-        with self.get_connection() as conn:
+        with self.get_connection('Database._init_database') as conn:
             cursor = conn.cursor()
             
             # Websites table
@@ -47,9 +123,22 @@ class Database:
                     http_status_code INTEGER,
                     error_message TEXT,
                     checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    run_count INTEGER NOT NULL DEFAULT 1,
+                    first_checked_at TIMESTAMP,
+                    rt_sum INTEGER,
+                    rt_min INTEGER,
+                    rt_max INTEGER,
                     FOREIGN KEY (website_id) REFERENCES websites(website_id)
                 )
             ''')
+            # Span columns (change-only storage) for databases created before they existed
+            self._add_missing_columns(cursor, 'monitoring_checks', {
+                'run_count': 'INTEGER NOT NULL DEFAULT 1',
+                'first_checked_at': 'TIMESTAMP',
+                'rt_sum': 'INTEGER',
+                'rt_min': 'INTEGER',
+                'rt_max': 'INTEGER'
+            })
             
             # SSL certificates table
             cursor.execute('''
@@ -74,9 +163,48 @@ class Database:
                     content_hash TEXT NOT NULL,
                     content_selector TEXT,
                     captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    snapshot_hash TEXT,
+                    text_simhash TEXT,
+                    dom_simhash TEXT,
+                    path TEXT,
                     FOREIGN KEY (website_id) REFERENCES websites(website_id)
                 )
             ''')
+            self._add_missing_columns(cursor, 'defacement_baselines', {
+                'snapshot_hash': 'TEXT',
+                'text_simhash': 'TEXT',
+                'dom_simhash': 'TEXT',
+                'path': 'TEXT'  # NULL for the website's own URL, else one of its website_paths
+            })
+            
+            # Content snapshots (compressed page bodies, deduplicated by SHA-256)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS content_snapshots (
+                    snapshot_hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    truncated BOOLEAN DEFAULT 0,
+                    content BLOB NOT NULL,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Versions of each website's content seen by defacement checks
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS website_snapshots (
+                    website_id INTEGER NOT NULL,
+                    snapshot_hash TEXT NOT NULL,
+                    text_hash TEXT,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    seen_count INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (website_id, snapshot_hash),
+                    FOREIGN KEY (website_id) REFERENCES websites(website_id),
+                    FOREIGN KEY (snapshot_hash) REFERENCES content_snapshots(snapshot_hash)
+                )
+            ''')
             
             # Incidents table
             cursor.execute('''
@@ -88,9 +216,12 @@ class Database:
                     detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     resolved_at TIMESTAMP,
                     description TEXT,
+                    level INTEGER,
                     FOREIGN KEY (website_id) REFERENCES websites(website_id)
                 )
             ''')
+            # Escalation level, which SSL and page incidents count in their own units rather than by severity
+            self._add_missing_columns(cursor, 'incidents', {'level': 'INTEGER'})
             
             # Notifications table
             cursor.execute('''
@@ -100,31 +231,149 @@ class Database:
                     notification_channel TEXT NOT NULL,
                     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     delivery_status TEXT DEFAULT 'pending',
+                    notification_type TEXT,
                     FOREIGN KEY (incident_id) REFERENCES incidents(incident_id)
                 )
             ''')
+            # The alert's own type, e.g. 'downtime_resolved' against a downtime incident
+            self._add_missing_columns(cursor, 'notifications', {'notification_type': 'TEXT'})
+            
+            # Hourly uptime/latency rollups maintained on every uptime check (analytics)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS check_rollups (
+                    website_id INTEGER NOT NULL,
+                    bucket_start TIMESTAMP NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    warning INTEGER NOT NULL DEFAULT 0,
+                    failure INTEGER NOT NULL DEFAULT 0,
+                    rt_count INTEGER NOT NULL DEFAULT 0,
+                    rt_sum INTEGER NOT NULL DEFAULT 0,
+                    rt_min INTEGER,
+                    rt_max INTEGER,
+                    PRIMARY KEY (website_id, bucket_start)
+                )
+            ''')
             
+            # Hourly response time histograms (log-scale bins) for percentile estimates
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS latency_rollups (
+                    website_id INTEGER NOT NULL,
+                    bucket_start TIMESTAMP NOT NULL,
+                    bin INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (website_id, bucket_start, bin)
+                )
+            ''')
+            
+            # Scheduler state, so restarts keep each site's phase and back-off level
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_state (
+                    website_id INTEGER PRIMARY KEY,
+                    interval INTEGER NOT NULL,
+                    next_run_at TIMESTAMP NOT NULL,
+                    policy_state TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (website_id) REFERENCES websites(website_id)
+                )
+            ''')
+
+            # Extra pages on a website's origin, checked in the same job as the website's URL
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS website_paths (
+                    path_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    website_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    last_status TEXT,
+                    last_response_time INTEGER,
+                    last_http_status_code INTEGER,
+                    last_error_message TEXT,
+                    last_defacement_status TEXT,
+                    last_checked_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (website_id, path),
+                    FOREIGN KEY (website_id) REFERENCES websites(website_id)
+                )
+            ''')
+
+            # Change counter for the websites and website_paths tables, bumped by triggers on
+            # every change, so processes holding the site registry in memory can tell when to reload
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS websites_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO websites_version (id, version) VALUES (1, 0)')
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS websites_version_{event.lower()} AFTER {event} ON websites
+                    BEGIN
+                        UPDATE websites_version SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+            # Path results are rewritten on every check, so only adding or removing a path counts
+            for event in ('INSERT', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS website_paths_version_{event.lower()} AFTER {event} ON website_paths
+                    BEGIN
+                        UPDATE websites_version SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+
             # Create indexes
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_checks_website ON monitoring_checks(website_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_checks_time ON monitoring_checks(checked_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_checks_website_time ON monitoring_checks(website_id, checked_at, check_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_incidents_website ON incidents(website_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_incidents_time ON incidents(detected_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_incidents_website_type ON incidents(website_id, incident_type, detected_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_incident ON notifications(incident_id, sent_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_baselines_website ON defacement_baselines(website_id, captured_at, baseline_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_baselines_website_path ON defacement_baselines(website_id, path, captured_at, baseline_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_snapshots_seen ON content_snapshots(last_seen_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_website_snapshots_hash ON website_snapshots(snapshot_hash)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_check_rollups_time ON check_rollups(bucket_start)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_latency_rollups_time ON latency_rollups(bucket_start)')
             
             conn.commit()
     
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add columns that an older schema version of ``table`` lacks"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+    
     @contextmanager
-    def get_connection(self):
-        """Get database connection with proper cleanup"""
-        conn = sqlite3.connect(self.db_path)
+    def get_connection(self, site='other'):
+        """Get database connection with proper cleanup
+
+        ``site`` labels the connection's metrics; callers pass a static name,
+        conventionally their own qualified name.
+        """
+        if not Config.METRICS_ENABLED:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row  # Enable column access by name
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        
+        conn = sqlite3.connect(self.db_path, factory=_InstrumentedConnection)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         try:
             yield conn
         finally:
             conn.close()
+            DB_QUERIES.labels(site).inc(conn.query_count)
+            DB_DURATION.labels(site).observe(conn.query_time)
     
     def execute_query(self, query, params=()):
         """Execute a query and return results"""
-        with self.get_connection() as conn:
+        with self.get_connection('Database.execute_query') as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             conn.commit()
@@ -132,7 +381,7 @@ class Database:
     
     def execute_one(self, query, params=()):
         """Execute a query and return single result"""
-        with self.get_connection() as conn:
+        with self.get_connection('Database.execute_one') as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             conn.commit()
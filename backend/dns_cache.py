@@ -0,0 +1,191 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from config import Config
+
+try:
+    import dns.resolver
+    import dns.exception
+    HAS_DNSPYTHON = True
+except ImportError:
+    HAS_DNSPYTHON = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DNSCache:
+    """Process-wide DNS cache honoring record TTLs, with negative caching and stats
+
+    Record TTLs are read when dnspython is installed; otherwise answers from
+    the system resolver are kept for ``Config.DNS_DEFAULT_TTL`` seconds.
+    """
+
+    def __init__(self, default_ttl=None, min_ttl=None, max_ttl=None, negative_ttl=None):
+        self.default_ttl = default_ttl if default_ttl is not None else Config.DNS_DEFAULT_TTL
+        self.min_ttl = min_ttl if min_ttl is not None else Config.DNS_MIN_TTL
+        self.max_ttl = max_ttl if max_ttl is not None else Config.DNS_MAX_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else Config.DNS_NEGATIVE_TTL
+        self._entries = {}     # host -> {'addresses', 'expires_at', 'error'}
+        self._last_seen = {}   # host -> addresses from the previous resolution (change stats)
+        self._in_flight = {}   # host -> Event for single-flight resolution
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'errors': 0,
+            'ip_changes': 0
+        }
+
+    def resolve(self, host):
+        """Return the list of IP addresses for a host, raising socket.gaierror on failure"""
+        if self._is_ip(host):
+            return [host]
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry and entry['expires_at'] > time.time():
+                    if entry['error']:
+                        self.stats['negative_hits'] += 1
+                        raise socket.gaierror(socket.EAI_NONAME, entry['error'])
+                    self.stats['hits'] += 1
+                    return list(entry['addresses'])
+
+                # Single-flight: only one thread resolves a given host at a time
+                event = self._in_flight.get(host)
+                if event is None:
+                    event = threading.Event()
+                    self._in_flight[host] = event
+                    self.stats['misses'] += 1
+                    break
+            event.wait(timeout=Config.CHECK_TIMEOUT)
+
+        try:
+            addresses, ttl = self._lookup(host)
+            with self._lock:
+                self._entries[host] = {
+                    'addresses': addresses,
+                    'expires_at': time.time() + ttl,
+                    'error': None
+                }
+                self._track_change(host, addresses)
+            return list(addresses)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+                self._entries[host] = {
+                    'addresses': [],
+                    'expires_at': time.time() + self.negative_ttl,
+                    'error': getattr(e, 'strerror', None) or str(e)
+                }
+            if isinstance(e, socket.gaierror):
+                raise
+            raise socket.gaierror(socket.EAI_NONAME, str(e))
+        finally:
+            with self._lock:
+                self._in_flight.pop(host, None)
+            event.set()
+
+    async def resolve_async(self, host):
+        """Resolve a host from async code without blocking the event loop"""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry and entry['expires_at'] > time.time() and not entry['error']:
+                self.stats['hits'] += 1
+                return list(entry['addresses'])
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.resolve, host)
+
+    def create_connection(self, address, *args, connect=socket.create_connection, **kwargs):
+        """Open a connection to (host, port) using cached addresses, trying each in turn"""
+        host, port = address[0], address[1]
+        last_error = None
+        for ip in self.resolve(host):
+            try:
+                return connect((ip, port), *args, **kwargs)
+            except OSError as e:
+                last_error = e
+        raise last_error or OSError(f"No addresses to connect to for {host}")
+
+    def invalidate(self, host=None):
+        """Forget one host, or everything"""
+        with self._lock:
+            if host is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(host, None)
+
+    def get_stats(self):
+        """Return cache counters and size"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+            stats['hit_ratio'] = round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else 0.0
+            stats['ttl_source'] = 'dns' if HAS_DNSPYTHON else 'default'
+            return stats
+
+    def install(self):
+        """Route urllib3 (and therefore requests) connections through this cache"""
+        import urllib3.util.connection as urllib3_connection
+        original = getattr(urllib3_connection, '_webguard_original_create_connection', None)
+        if original is None:
+            original = urllib3_connection.create_connection
+            urllib3_connection._webguard_original_create_connection = original
+
+        def create_connection(address, *args, **kwargs):
+            return self.create_connection(address, *args, connect=original, **kwargs)
+
+        urllib3_connection.create_connection = create_connection
+
+    def _lookup(self, host):
+        """Resolve a host and return (addresses, ttl)"""
+        if HAS_DNSPYTHON:
+            addresses = []
+            ttls = []
+            for record_type in ('A', 'AAAA'):
+                try:
+                    answer = dns.resolver.resolve(host, record_type, lifetime=Config.CHECK_TIMEOUT)
+                    addresses.extend(rdata.to_text() for rdata in answer)
+                    ttls.append(answer.rrset.ttl)
+                except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                    continue
+                except dns.exception.DNSException:
+                    continue
+            if addresses:
+                return addresses, self._clamp(min(ttls))
+            # Fall through to the system resolver (hosts file, mDNS, ...)
+
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        addresses = []
+        for info in infos:
+            ip = info[4][0]
+            if ip not in addresses:
+                addresses.append(ip)
+        return addresses, self._clamp(self.default_ttl)
+
+    def _clamp(self, ttl):
+        return max(self.min_ttl, min(self.max_ttl, ttl))
+
+    def _track_change(self, host, addresses):
+        """Count resolutions that returned a different address set (caller holds the lock)"""
+        previous = self._last_seen.get(host)
+        if previous and set(previous) != set(addresses):
+            self.stats['ip_changes'] += 1
+            logger.warning(f"DNS for {host} changed from {previous} to {addresses}")
+        self._last_seen[host] = list(addresses)
+
+    @staticmethod
+    def _is_ip(host):
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+# Shared by every engine in the process
+dns_cache = DNSCache()
@@ -0,0 +1,125 @@
+import base64
+import heapq
+import logging
+from datetime import datetime, timezone
+from itertools import islice
+from database import Database
+from archive import CheckArchive
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(checked_at, check_id):
+    """Encode a (checked_at, check_id) keyset position as an opaque token"""
+    return base64.urlsafe_b64encode(f"{checked_at}|{check_id}".encode()).decode()
+
+def decode_cursor(token):
+    """Decode a cursor token into (checked_at, check_id); raises ValueError if malformed"""
+    try:
+        checked_at, check_id = base64.urlsafe_b64decode(token.encode()).decode().rsplit('|', 1)
+        return checked_at, int(check_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def normalize_timestamp(value):
+    """Convert an ISO timestamp to the 'YYYY-MM-DD HH:MM:SS' UTC form used by checked_at
+
+    Values without an offset are taken to be UTC already.
+    """
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _sort_key(row):
+    return (row['checked_at'], row['check_id'])
+
+class CheckHistory:
+    """Keyset-paginated and streamed reads of check history (newest first)
+
+    Rows live in monitoring_checks until they age into the archive tier;
+    reads merge both sources transparently.
+    """
+
+    def __init__(self, db=None, archive=None):
+        self.db = db or Database()
+        self.archive = archive or CheckArchive(db=self.db)
+
+    def page(self, website_id, limit=100, cursor=None, start=None, end=None, check_type=None):
+        """Return (rows, next_cursor) for one page ordered by (checked_at, check_id) descending"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        position = decode_cursor(cursor) if cursor else None
+        query, params = self._build_query(website_id, position, start, end, check_type)
+        with self.db.get_connection('CheckHistory.page') as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(query + ' LIMIT ?', params + [limit + 1])
+            recent = [dict(row) for row in db_cursor.fetchall()]
+
+        archived = self._archived_rows(website_id, position, start, end, check_type)
+        rows = list(islice(heapq.merge(recent, archived, key=_sort_key, reverse=True), limit + 1))
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last['checked_at'], last['check_id'])
+        return rows, next_cursor
+
+    def stream(self, website_id, start=None, end=None, check_type=None):
+        """Yield rows one at a time, reading in batches so memory stays flat"""
+        recent = self._stream_recent(website_id, start, end, check_type)
+        archived = self._archived_rows(website_id, None, start, end, check_type)
+        yield from heapq.merge(recent, archived, key=_sort_key, reverse=True)
+
+    def _stream_recent(self, website_id, start, end, check_type):
+        query, params = self._build_query(website_id, None, start, end, check_type)
+        with self.db.get_connection('CheckHistory._stream_recent') as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(query, params)
+            while True:
+                batch = db_cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(row)
+
+    def _archived_rows(self, website_id, position, start, end, check_type):
+        """Archived rows older than the cursor position, newest first"""
+        if position:
+            checked_at, check_id = position
+            end = min(end, checked_at + '~') if end else checked_at + '~'
+        for row in self.archive.iter_rows(website_id, start, end):
+            if position and _sort_key(row) >= position:
+                continue
+            if check_type and row['check_type'] != check_type:
+                continue
+            yield row
+
+    def _build_query(self, website_id, position, start, end, check_type):
+        conditions = ['website_id = ?']
+        params = [website_id]
+        if check_type:
+            conditions.append('check_type = ?')
+            params.append(check_type)
+        if start:
+            conditions.append('checked_at >= ?')
+            params.append(start)
+        if end:
+            conditions.append('checked_at < ?')
+            params.append(end)
+        if position:
+            checked_at, check_id = position
+            conditions.append('(checked_at < ? OR (checked_at = ? AND check_id < ?))')
+            params.extend([checked_at, checked_at, check_id])
+
+        query = f'''
+            SELECT * FROM monitoring_checks
+            WHERE {' AND '.join(conditions)}
+            ORDER BY checked_at DESC, check_id DESC
+        '''
+        return query, params
@@ -0,0 +1,163 @@
+import logging
+import threading
+from database import Database
+from config import Config
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+class IncidentEngine:
+    """Track the incident lifecycle (open -> ongoing -> resolved) per website and incident type"""
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self.open_after = Config.INCIDENT_OPEN_AFTER
+        self.close_after = Config.INCIDENT_CLOSE_AFTER
+        self._states = {}
+        self._lock = threading.Lock()
+        self._load_open_incidents()
+
+    def observe(self, website_id, incident_type, failed, severity='high', description=None, level=None):
+        """Feed one check outcome and return the resulting transition, if any
+
+        ``level`` orders failures for escalation and defaults to the severity rank.
+        """
+        key = (website_id, incident_type)
+        if level is None:
+            level = SEVERITY_RANK.get(severity, 0)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                if not failed:
+                    return None
+                state = {'failures': 0, 'successes': 0, 'incident_id': None, 'severity': None, 'level': 0}
+                self._states[key] = state
+
+            if failed:
+                state['failures'] += 1
+                state['successes'] = 0
+
+                # Flap damping: require N consecutive failures before opening
+                if state['incident_id'] is None:
+                    if state['failures'] < self.open_after.get(incident_type, 1):
+                        return None
+                    state['incident_id'] = self._create_incident(website_id, incident_type, severity, description, level)
+                    state['severity'] = severity
+                    state['level'] = level
+                    return self._transition('opened', website_id, incident_type, state, description)
+
+                if level > state['level']:
+                    state['severity'] = severity
+                    state['level'] = level
+                    self._update_severity(state['incident_id'], severity, description, level)
+                    return self._transition('escalated', website_id, incident_type, state, description)
+
+                return self._transition('ongoing', website_id, incident_type, state, description)
+
+            state['successes'] += 1
+            state['failures'] = 0
+
+            if state['incident_id'] is None:
+                # Failure streak ended before an incident was opened
+                del self._states[key]
+                return None
+
+            # Require M consecutive successes before closing
+            if state['successes'] < self.close_after.get(incident_type, 1):
+                return None
+
+            del self._states[key]
+            self._resolve_incidents(website_id, incident_type)
+            return self._transition('resolved', website_id, incident_type, state, description)
+
+    def resolve(self, website_id, incident_type):
+        """Resolve any open incident for a website and incident type immediately"""
+        with self._lock:
+            self._states.pop((website_id, incident_type), None)
+            self._resolve_incidents(website_id, incident_type)
+
+    def forget(self, website_id):
+        """Drop in-memory state for a deleted website"""
+        with self._lock:
+            for key in [key for key in self._states if key[0] == website_id]:
+                del self._states[key]
+
+    def get_open_incident(self, website_id, incident_type):
+        """Return the open incident id for a website and incident type, if any"""
+        state = self._states.get((website_id, incident_type))
+        return state['incident_id'] if state else None
+
+    def _transition(self, transition, website_id, incident_type, state, description):
+        return {
+            'transition': transition,
+            'website_id': website_id,
+            'incident_type': incident_type,
+            'incident_id': state['incident_id'],
+            'severity': state['severity'],
+            'description': description
+        }
+
+    def _load_open_incidents(self):
+        """Restore open incidents from the database so restarts don't re-open them"""
+        try:
+            with self.db.get_connection('IncidentEngine._load_open_incidents') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT incident_id, website_id, incident_type, severity, level
+                    FROM incidents
+                    WHERE resolved_at IS NULL
+                    ORDER BY detected_at ASC, incident_id ASC
+                ''')
+                for row in cursor.fetchall():
+                    self._states[(row['website_id'], row['incident_type'])] = {
+                        'failures': self.open_after.get(row['incident_type'], 1),
+                        'successes': 0,
+                        'incident_id': row['incident_id'],
+                        'severity': row['severity'],
+                        # Incidents stored before levels were recorded fall back to the severity rank
+                        'level': row['level'] if row['level'] is not None else SEVERITY_RANK.get(row['severity'], 0)
+                    }
+            logger.info(f"Incident engine restored {len(self._states)} open incidents")
+        except Exception as e:
+            logger.error(f"Error loading open incidents: {str(e)}")
+
+    def _create_incident(self, website_id, incident_type, severity, description, level):
+        """Create incident record"""
+        with self.db.get_connection('IncidentEngine._create_incident') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO incidents (website_id, incident_type, severity, description, level, detected_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (website_id, incident_type, severity, description, level, clock.timestamp()))
+            conn.commit()
+            return cursor.lastrowid
+
+    def _update_severity(self, incident_id, severity, description, level):
+        """Raise the severity of an open incident"""
+        try:
+            with self.db.get_connection('IncidentEngine._update_severity') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE incidents SET severity = ?, description = ?, level = ?
+                    WHERE incident_id = ?
+                ''', (severity, description, level, incident_id))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error updating incident {incident_id}: {str(e)}")
+
+    def _resolve_incidents(self, website_id, incident_type):
+        """Mark all open incidents of a type as resolved"""
+        try:
+            with self.db.get_connection('IncidentEngine._resolve_incidents') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE incidents
+                    SET resolved_at = ?
+                    WHERE website_id = ? AND incident_type = ? AND resolved_at IS NULL
+                ''', (clock.timestamp(), website_id, incident_type))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error resolving {incident_type} incident for website {website_id}: {str(e)}")
@@ -0,0 +1,277 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not Config.METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if not Config.METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the wrapped block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class _Metric:
+    """Base for labelled metric families; children are created once and cached"""
+
+    metric_type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child_for(())
+
+    def labels(self, *values):
+        """Return the child for a set of label values"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._child_for(values)
+        return child
+
+    def _child_for(self, values):
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._new_child()
+                self._children[values] = child
+            return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_text(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_format(child.value)}"
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        self.callback = callback
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def samples(self):
+        if self.callback is not None:
+            # Callback gauges are computed at scrape time and cost nothing on the hot path
+            try:
+                value = self.callback()
+            except Exception:
+                return
+            if isinstance(value, dict):
+                for label_values, sample in value.items():
+                    if not isinstance(label_values, tuple):
+                        label_values = (label_values,)
+                    yield f"{self.name}{self._label_text(label_values)} {_format(sample)}"
+            else:
+                yield f"{self.name} {_format(value)}"
+            return
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_format(child.value)}"
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+                count = child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self._label_text(values, ('le', _format(bound)))} {cumulative}"
+            yield f"{self.name}_bucket{self._label_text(values, ('le', '+Inf'))} {count}"
+            yield f"{self.name}_sum{self._label_text(values)} {_format(total)}"
+            yield f"{self.name}_count{self._label_text(values)} {count}"
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        """Return every metric in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+def gauge(name, help_text, labelnames=(), callback=None):
+    return REGISTRY.register(Gauge(name, help_text, labelnames, callback))
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+def _format(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Hot-path metrics shared across modules
+CHECK_DURATION = histogram(
+    'webguard_check_duration_seconds',
+    'Time spent in each phase of a website check',
+    ('phase',)
+)
+CHECK_RESULTS = counter(
+    'webguard_check_results_total',
+    'Completed checks by check type and status',
+    ('check_type', 'status')
+)
+PROBES = counter(
+    'webguard_probes_total',
+    'Uptime probe requests by method',
+    ('method',)
+)
+SCHEDULER_LAG = histogram(
+    'webguard_scheduler_lag_seconds',
+    'Delay between a website check\'s scheduled run time and its start',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+)
+SCHEDULER_MISSED = counter(
+    'webguard_scheduler_missed_total',
+    'Scheduled checks skipped because they ran too late or were still running'
+)
+CHECKS_IN_PROGRESS = gauge(
+    'webguard_checks_in_progress',
+    'Website checks currently running'
+)
+DB_QUERIES = counter(
+    'webguard_db_queries_total',
+    'SQL statements executed per call site',
+    ('site',)
+)
+DB_DURATION = histogram(
+    'webguard_db_query_seconds',
+    'Time spent executing SQL statements and commits per connection, by call site',
+    ('site',),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+NOTIFICATION_DURATION = histogram(
+    'webguard_notification_send_seconds',
+    'Time to deliver a notification',
+    ('channel', 'status')
+)
@@ -1,13 +1,26 @@
 import requests
 import hashlib
 import ssl
-import socket
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from database import Database
 from config import Config
+from incident_engine import IncidentEngine, SEVERITY_RANK
+from analytics import AnalyticsService
+from anomaly import LatencyAnomalyDetector
+from snapshots import SnapshotStore
+from similarity import fingerprint, hamming_distance, SIMHASH_BITS
+from baseline_cache import BaselineCache
+from probes import ProbePolicy, HEAD, HEADERS, FULL
+from circuit_breaker import HostCircuitBreaker
+from timeouts import AdaptiveTimeouts
+from ssl_expiry import SslExpiryIndex, days_until_expiry
+from dns_cache import dns_cache
+from clock import clock
+from metrics import CHECK_DURATION, CHECK_RESULTS, PROBES
+from urllib.parse import urlparse
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -17,57 +30,371 @@ class MonitoringEngine:
     def __init__(self):
         self.db = Database()
         self.timeout = Config.CHECK_TIMEOUT
+        self.http = requests  # anything with requests' get/head, e.g. a simulated fleet
+        self.incidents = IncidentEngine(self.db)
+        self.analytics = AnalyticsService(self.db)
+        self.latency = LatencyAnomalyDetector()
+        self.snapshots = SnapshotStore(self.db)
+        self.baselines = BaselineCache(self.db)
+        self.baselines.compact()
+        self.baselines.warm()
+        self.probes = ProbePolicy()
+        self.circuits = HostCircuitBreaker()
+        self.timeouts = AdaptiveTimeouts()
+        self.ssl_expiry = SslExpiryIndex(self.db)
+        if Config.ADAPTIVE_TIMEOUTS_ENABLED:
+            self.timeouts.backfill(self.db)
+        if Config.ANOMALY_DETECTION_ENABLED:
+            self.latency.backfill(self.db)
+        self._last_ips = {}  # website_id -> addresses seen on the previous check
+        # HTTP fetches and TLS probes share one process-wide DNS cache
+        dns_cache.install()
     
-    def check_website(self, website_id, url, check_defacement=True, check_ssl=True):
-        """Perform comprehensive website check"""
+    def check_website(self, website_id, url, check_defacement=True, check_ssl=True, paths=()):
+        """Perform comprehensive website check
+        
+        ``paths`` are extra pages on the site's origin, checked after the
+        site's own URL over the same keep-alive connection.
+        """
         results = {
             'uptime': None,
             'defacement': None,
-            'ssl': None
+            'ssl': None,
+            'incidents': []
         }
+        response = None
+        session = self._session() if paths else None
         
         try:
-            # Uptime check
-            uptime_result = self._check_uptime(url)
+            # Uptime check: in tiered mode a cheap probe unless the page body is needed
+            defacement_due = check_defacement and self.probes.defacement_due(website_id)
+            host_key = self._host_key(url) if Config.CIRCUIT_BREAKER_ENABLED else None
+            timeout = self.timeouts.budget(website_id) if Config.ADAPTIVE_TIMEOUTS_ENABLED else self.timeout
+            with CHECK_DURATION.labels('uptime').time():
+                if host_key and not self.circuits.allow(host_key, website_id):
+                    uptime_result = self._circuit_open_result(host_key)
+                elif Config.PROBE_MODE == 'tiered':
+                    uptime_result, response = self._tiered_probe(website_id, url, full=defacement_due, timeout=timeout, http=session)
+                else:
+                    uptime_result = self._check_uptime(url, timeout, http=session)
+            if Config.ADAPTIVE_TIMEOUTS_ENABLED and not uptime_result.get('circuit_open'):
+                self._track_timeouts(website_id, uptime_result, timeout)
             results['uptime'] = uptime_result
+            CHECK_RESULTS.labels('uptime', uptime_result['status']).inc()
+            if host_key and not uptime_result.get('circuit_open'):
+                # Only a failed connection says the host is down; read timeouts, TLS errors
+                # and error pages all mean something answered
+                unreachable = uptime_result.get('connect_error') or uptime_result.get('timeout') == 'connect'
+                self.circuits.record(host_key, website_id, not unreachable)
+            
+            self._track_resolution(website_id, url, uptime_result)
             
             # Store uptime check result
             self._store_check(website_id, 'uptime', uptime_result)
+            self._track_incident(
+                results, website_id, 'downtime',
+                uptime_result['status'] == 'failure', 'critical',
+                f"Website is offline. Error: {uptime_result.get('error_message', 'Unknown error')}"
+            )
+            if Config.ANOMALY_DETECTION_ENABLED and uptime_result['status'] == 'success':
+                self._track_latency(results, website_id, uptime_result)
             
             # Defacement check (only if website is online)
-            if check_defacement and uptime_result['status'] == 'success':
-                defacement_result = self._check_defacement(website_id, url)
+            if defacement_due and uptime_result['status'] == 'success':
+                with CHECK_DURATION.labels('defacement').time():
+                    defacement_result = self._check_defacement(website_id, url, response)
+                self.probes.defacement_checked(website_id)
                 results['defacement'] = defacement_result
+                CHECK_RESULTS.labels('defacement', defacement_result.get('status', 'unknown')).inc()
                 # Store defacement check result (whether incident or not)
-                if defacement_result.get('status') in ['defacement_detected', 'no_change', 'baseline_created']:
+                if defacement_result.get('status') in ['defacement_detected', 'no_change', 'minor_change', 'baseline_created']:
                     self._store_check(website_id, 'defacement', defacement_result)
+                description = "Potential website defacement detected. Content hash mismatch."
+                if defacement_result.get('similarity') is not None:
+                    description = (f"Potential website defacement detected. Content is "
+                                   f"{defacement_result['similarity']:.0%} similar to the baseline.")
+                if uptime_result.get('ip_changed'):
+                    # A DNS change alongside new content is a strong hijack signal
+                    defacement_result['ip_changed'] = True
+                    defacement_result['previous_ips'] = uptime_result['previous_ips']
+                    description += f" DNS changed from {', '.join(uptime_result['previous_ips'])} to {', '.join(uptime_result['resolved_ips'])}."
+                if defacement_result.get('status') in ['defacement_detected', 'no_change', 'minor_change']:
+                    self._track_incident(
+                        results, website_id, 'defacement',
+                        defacement_result['status'] == 'defacement_detected',
+                        defacement_result.get('severity', 'high'),
+                        description
+                    )
             
-            # SSL check (only for HTTPS)
-            if check_ssl and url.startswith('https://'):
-                ssl_result = self._check_ssl_certificate(url)
+            # SSL check (only for HTTPS, and pointless while the host is known to be unreachable).
+            # Threshold alerts come from the expiry index; the certificate is re-fetched only to spot renewals
+            if (check_ssl and url.startswith('https://') and not uptime_result.get('circuit_open')
+                    and self.ssl_expiry.probe_due(website_id)):
+                with CHECK_DURATION.labels('ssl').time():
+                    ssl_result = self._check_ssl_certificate(url, timeout)
                 results['ssl'] = ssl_result
+                CHECK_RESULTS.labels('ssl', 'success' if ssl_result else 'failure').inc()
                 if ssl_result:
                     self._store_ssl_certificate(website_id, ssl_result)
+                    self.ssl_expiry.track(website_id, ssl_result['valid_to'])
+                    self._track_ssl_incident(results, website_id, ssl_result)
+            
+            # Extra pages, only once the origin is known to answer at all
+            if paths and uptime_result.get('http_status_code') is not None:
+                if response is not None:
+                    response.close()
+                    response = None
+                self._check_paths(results, website_id, url, paths, defacement_due, timeout, session)
             
             return results
             
         except Exception as e:
             logger.error(f"Error checking website {url}: {str(e)}")
             return results
+        finally:
+            if response is not None:
+                response.close()
+            if session is not None:
+                session.close()
+    
+    def _session(self):
+        """A client whose connections stay open across requests, or None when self.http has no sessions"""
+        factory = getattr(self.http, 'Session', None)
+        return factory() if factory else None
+    
+    def _check_paths(self, results, website_id, url, paths, check_defacement, timeout, http=None):
+        """Check a site's extra pages and track one downtime and one defacement incident across them"""
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        pages = results['paths'] = {}
+        for path in paths:
+            page_url = origin + path
+            page = pages[path] = {'uptime': None, 'defacement': None}
+            response = None
+            try:
+                with CHECK_DURATION.labels('page').time():
+                    if Config.PROBE_MODE == 'tiered':
+                        page['uptime'], response = self._tiered_probe(
+                            (website_id, path), page_url, full=check_defacement, timeout=timeout, http=http
+                        )
+                    else:
+                        page['uptime'], response = self._probe(page_url, timeout=timeout, http=http)
+                CHECK_RESULTS.labels('page', page['uptime']['status']).inc()
+                if check_defacement and page['uptime']['status'] == 'success':
+                    page['defacement'] = self._check_defacement(website_id, page_url, response, path=path)
+            finally:
+                if response is not None:
+                    response.close()
+        
+        self._store_page_results(website_id, pages)
+        
+        down = [path for path, page in pages.items() if page['uptime']['status'] == 'failure']
+        self._track_incident(
+            results, website_id, 'page_downtime', bool(down), 'high',
+            f"Pages offline: {', '.join(down)}" if down else None,
+            level=len(down)
+        )
+        compared = {path: page['defacement'] for path, page in pages.items()
+                    if page['defacement'] and page['defacement'].get('status') in ['defacement_detected', 'no_change', 'minor_change']}
+        if compared:
+            defaced = [path for path, result in compared.items() if result['status'] == 'defacement_detected']
+            severity = max((compared[path].get('severity', 'high') for path in defaced),
+                           key=lambda severity: SEVERITY_RANK.get(severity, 0), default='high')
+            self._track_incident(
+                results, website_id, 'page_defacement', bool(defaced), severity,
+                f"Potential defacement of pages: {', '.join(defaced)}" if defaced else None,
+                level=len(defaced)
+            )
+    
+    def _store_page_results(self, website_id, pages):
+        """Keep the latest result of each extra page on its website_paths row"""
+        checked_at = clock.timestamp()
+        try:
+            with self.db.get_connection('MonitoringEngine._store_page_results') as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE website_paths SET
+                        last_status = ?,
+                        last_response_time = ?,
+                        last_http_status_code = ?,
+                        last_error_message = ?,
+                        last_defacement_status = COALESCE(?, last_defacement_status),
+                        last_checked_at = ?
+                    WHERE website_id = ? AND path = ?
+                ''', [
+                    (
+                        page['uptime']['status'],
+                        page['uptime'].get('response_time'),
+                        page['uptime'].get('http_status_code'),
+                        page['uptime'].get('error_message'),
+                        (page['defacement'] or {}).get('status'),
+                        checked_at,
+                        website_id,
+                        path
+                    )
+                    for path, page in pages.items()
+                ])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error storing page results for website {website_id}: {str(e)}")
+    
+    def _host_key(self, url):
+        """Circuit breaker key for the host serving a URL (address and port), or None"""
+        parsed = urlparse(url)
+        if not parsed.hostname:
+            return None
+        try:
+            addresses = dns_cache.resolve(parsed.hostname)
+        except Exception:
+            return None
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        # The smallest address keeps the key stable when the resolver rotates records
+        return f"{min(addresses)}:{port}"
+    
+    def _circuit_open_result(self, host_key):
+        """Failed uptime result for a check skipped because its host's circuit is open"""
+        return {
+            'status': 'failure',
+            'response_time': None,
+            'error_message': f'Shared host {host_key} is unreachable (checks paused by circuit breaker)',
+            'circuit_open': True,
+            'checked_at': clock.now().isoformat()
+        }
+    
+    def _track_resolution(self, website_id, url, result):
+        """Attach the site's resolved IPs to a check result and flag changes since the last check"""
+        host = urlparse(url).hostname
+        if not host:
+            return
+        try:
+            addresses = dns_cache.resolve(host)
+        except Exception:
+            return
+        
+        result['resolved_ips'] = addresses
+        previous = self._last_ips.get(website_id)
+        if previous and set(previous) != set(addresses):
+            result['ip_changed'] = True
+            result['previous_ips'] = previous
+            logger.warning(f"Website {website_id} now resolves to {addresses} (was {previous})")
+        self._last_ips[website_id] = addresses
+    
+    def _track_timeouts(self, website_id, result, timeout):
+        """Feed the site's timeout budget and tell a slow site apart from a timed-out one
+        
+        A read timeout under a budget tightened from the site's own history
+        is reported as a slow warning rather than downtime, and the next
+        check waits longer, once; if that check times out as well it is a
+        failure, as is a timeout at the full budget.
+        """
+        if result.get('response_time') is not None:
+            self.timeouts.observe(website_id, result['response_time'])
+        elif result.get('timeout') == 'read' and self.timeouts.read_timed_out(website_id, timeout[1]):
+            p99 = self.timeouts.p99(website_id)
+            result.update({
+                'status': 'warning',
+                'slow': True,
+                'error_message': f"No response within {timeout[1]:.1f}s (p99 is {p99}ms)"
+            })
+    
+    def _track_incident(self, results, website_id, incident_type, failed, severity, description, level=None):
+        """Feed a check outcome to the incident engine and collect any transition"""
+        try:
+            event = self.incidents.observe(website_id, incident_type, failed, severity, description, level)
+            if event:
+                results['incidents'].append(event)
+        except Exception as e:
+            logger.error(f"Error tracking {incident_type} incident for website {website_id}: {str(e)}")
+    
+    def _track_latency(self, results, website_id, uptime_result):
+        """Score the response time against the site's baseline and track degradation incidents"""
+        response_time = uptime_result['response_time']
+        anomalous, baseline = self.latency.observe(website_id, response_time)
+        description = None
+        if anomalous:
+            uptime_result['latency_anomaly'] = True
+            uptime_result['latency_baseline'] = baseline.to_dict()
+            description = (f"Response time {response_time}ms is far above the usual "
+                           f"{baseline.mean:.0f}ms (±{baseline.std:.0f}ms)")
+        self._track_incident(results, website_id, 'performance_degradation', anomalous, 'medium', description)
+    
+    def check_ssl_expiry(self, website_id, valid_to):
+        """Re-evaluate a site's SSL incident from its known expiry date, without contacting it"""
+        results = {'uptime': None, 'defacement': None, 'ssl': None, 'incidents': []}
+        self._track_ssl_incident(results, website_id, {'days_until_expiry': days_until_expiry(valid_to)})
+        return results
+    
+    def _track_ssl_incident(self, results, website_id, ssl_result):
+        """Open an SSL incident inside the warning window and escalate at each threshold"""
+        days_until_expiry = ssl_result.get('days_until_expiry', 999)
+        # Number of warning thresholds crossed so far (expired counts as one more)
+        level = sum(1 for threshold in Config.SSL_WARNING_THRESHOLDS if days_until_expiry <= threshold)
+        if days_until_expiry < 0:
+            level += 1
+        severity = 'critical' if days_until_expiry < 0 else 'high' if days_until_expiry <= 7 else 'medium'
+        message = f"SSL certificate expires in {days_until_expiry} days" if days_until_expiry >= 0 else "SSL certificate has expired"
+        self._track_incident(results, website_id, 'ssl_expiry', level > 0, severity, message, level)
     
-    def _check_uptime(self, url):
+    def _check_uptime(self, url, timeout=None, http=None):
         """Check website availability and response time"""
-        start_time = datetime.now()
+        result, response = self._probe(url, timeout=timeout, http=http)
+        if response is not None and http is not None:
+            response.close()  # hand the connection back to the session's pool
+        return result
+    
+    def _tiered_probe(self, website_id, url, full=False, timeout=None, http=None):
+        """Run the cheapest probe that settles the site's status; returns (result, response)
+        
+        The response is only returned for full probes, whose body the
+        defacement check can reuse; the caller must close it. Extra pages
+        pass ``(website_id, path)`` as ``website_id``.
+        """
+        method = self.probes.plan(website_id, full)
+        result, response = self._probe(url, method, timeout, http)
+        PROBES.labels(method).inc()
+        self.probes.record(website_id, method, result.get('http_status_code'))
+        if method == HEAD and response is not None and result['status'] != 'success':
+            # The server answered, but HEAD may be handled differently from GET: confirm
+            result, response = self._probe(url, HEADERS, timeout, http)
+            PROBES.labels(HEADERS).inc()
+            self.probes.record(website_id, HEADERS, result.get('http_status_code'))
+        if method != FULL and response is not None:
+            response.close()
+            response = None
+        return result, response
+    
+    def _probe(self, url, method=None, timeout=None, http=None):
+        """Request the page and classify the answer; returns (result, response or None)
+        
+        ``method`` is a probe tier from the probes module, or None for the
+        plain GET of full probe mode. Tiered GETs are streamed and timed to
+        the response headers, like HEAD, and their body is only downloaded
+        if the caller reads it. ``timeout`` is seconds or a (connect, read)
+        pair, defaulting to ``CHECK_TIMEOUT``. ``http`` overrides
+        ``self.http``, e.g. with a session shared by a site's pages.
+        """
+        start_time = clock.now()
+        timeout = timeout or self.timeout
+        http = http or self.http
         
         try:
-            response = requests.get(
-                url,
-                timeout=self.timeout,
-                allow_redirects=True,
-                headers={'User-Agent': 'WebGuard/1.0'}
-            )
+            if method == HEAD:
+                response = http.head(
+                    url,
+                    timeout=timeout,
+                    allow_redirects=True,
+                    headers={'User-Agent': 'WebGuard/1.0'}
+                )
+            else:
+                response = http.get(
+                    url,
+                    timeout=timeout,
+                    allow_redirects=True,
+                    headers={'User-Agent': 'WebGuard/1.0'},
+                    stream=method is not None
+                )
             
-            response_time = int((datetime.now() - start_time).total_seconds() * 1000)
+            response_time = int((clock.now() - start_time).total_seconds() * 1000)
             
             status_code = response.status_code
             
@@ -76,113 +403,199 @@ class MonitoringEngine:
             # 300-499: Warning (client errors, redirects - site responding but issues)
             # 500-599: Failure (server errors - site is down/offline)
             if 200 <= status_code < 300:
-                return {
+                result = {
                     'status': 'success',
                     'response_time': response_time,
                     'http_status_code': status_code,
-                    'checked_at': datetime.now().isoformat()
+                    'checked_at': clock.now().isoformat()
                 }
             elif 300 <= status_code < 500:
                 # Client errors (4xx) or redirects (3xx) - warning but not offline
-                return {
+                result = {
                     'status': 'warning',
                     'response_time': response_time,
                     'http_status_code': status_code,
                     'error_message': f'HTTP {status_code}',
-                    'checked_at': datetime.now().isoformat()
+                    'checked_at': clock.now().isoformat()
                 }
             else:
                 # Server errors (5xx) - considered offline
-                return {
+                result = {
                     'status': 'failure',
                     'response_time': response_time,
                     'http_status_code': status_code,
                     'error_message': f'HTTP {status_code} - Server Error',
-                    'checked_at': datetime.now().isoformat()
+                    'checked_at': clock.now().isoformat()
                 }
+            if method is not None:
+                result['probe'] = method
+            return result, response
                 
+        except requests.exceptions.ConnectTimeout:
+            return {
+                'status': 'failure',
+                'response_time': None,
+                'error_message': 'Connect timeout',
+                'timeout': 'connect',
+                'checked_at': clock.now().isoformat()
+            }, None
         except requests.exceptions.Timeout:
             return {
                 'status': 'failure',
                 'response_time': None,
                 'error_message': 'Request timeout',
-                'checked_at': datetime.now().isoformat()
-            }
+                'timeout': 'read',
+                'checked_at': clock.now().isoformat()
+            }, None
+        except requests.exceptions.SSLError as e:
+            return {
+                'status': 'failure',
+                'response_time': None,
+                'error_message': f'SSL error: {str(e)}',
+                'checked_at': clock.now().isoformat()
+            }, None
         except requests.exceptions.ConnectionError:
             return {
                 'status': 'failure',
                 'response_time': None,
                 'error_message': 'Connection error',
-                'checked_at': datetime.now().isoformat()
-            }
+                'connect_error': True,
+                'checked_at': clock.now().isoformat()
+            }, None
         except Exception as e:
             return {
                 'status': 'failure',
                 'response_time': None,
                 'error_message': str(e),
-                'checked_at': datetime.now().isoformat()
-            }
+                'checked_at': clock.now().isoformat()
+            }, None
     
-    def _check_defacement(self, website_id, url):
-        """Check for website defacement by comparing content hash"""
+    def capture_baseline(self, website_id, url, path=None):
+        """Fetch the page and make it the defacement baseline; raises ValueError if it can't be fetched
+        
+        With ``path``, ``url`` is that extra page's full URL and the baseline is the page's own.
+        """
+        response = self.http.get(
+            url,
+            timeout=self.timeout,
+            allow_redirects=True,
+            headers={'User-Agent': 'WebGuard/1.0'}
+        )
+        if response.status_code != 200:
+            raise ValueError(f'Cannot fetch website content: HTTP {response.status_code}')
+        page = self._fingerprint_page(website_id, response, snapshot=path is None)
+        self._store_baseline(website_id, page['hash'], snapshot_hash=page['snapshot_hash'],
+                             text_simhash=page['text_simhash'], dom_simhash=page['dom_simhash'], path=path)
+        return page
+    
+    def _check_defacement(self, website_id, url, response=None, path=None):
+        """Check for website defacement by comparing content against the baseline
+        
+        ``response`` is a GET already made by the uptime probe; without it the page is fetched here.
+        ``path`` names one of the site's extra pages, which have baselines of their own.
+        """
         try:
-            response = requests.get(
-                url,
-                timeout=self.timeout,
-                allow_redirects=True,
-                headers={'User-Agent': 'WebGuard/1.0'}
-            )
+            if response is None:
+                response = self.http.get(
+                    url,
+                    timeout=self.timeout,
+                    allow_redirects=True,
+                    headers={'User-Agent': 'WebGuard/1.0'}
+                )
             
             if response.status_code != 200:
                 return {'status': 'skipped', 'reason': f'HTTP {response.status_code}'}
             
             # Get current content
-            soup = BeautifulSoup(response.text, 'html.parser')
-            content = soup.get_text()
-            current_hash = hashlib.md5(content.encode()).hexdigest()
+            page = self._fingerprint_page(website_id, response, snapshot=path is None)
+            current_hash = page['hash']
+            snapshot_hash = page['snapshot_hash']
             
             # Get baseline
-            baseline = self._get_baseline(website_id)
+            baseline = self._get_baseline(website_id, path)
             
             if not baseline:
                 # First check - store baseline
-                self._store_baseline(website_id, current_hash)
-                return {'status': 'baseline_created', 'hash': current_hash}
+                self._store_baseline(website_id, current_hash, snapshot_hash=snapshot_hash,
+                                     text_simhash=page['text_simhash'], dom_simhash=page['dom_simhash'], path=path)
+                return {'status': 'baseline_created', 'hash': current_hash, 'snapshot_hash': snapshot_hash}
             
-            # Compare with baseline
-            if current_hash != baseline['content_hash']:
-                # Potential defacement detected
-                incident = self._create_incident(
-                    website_id,
-                    'defacement',
-                    'high',
-                    'Content hash mismatch detected'
-                )
+            if current_hash == baseline['content_hash']:
+                return {'status': 'no_change', 'hash': current_hash, 'snapshot_hash': snapshot_hash}
+            
+            # Content changed: score how far it moved from the baseline
+            distance = self._content_distance(page, baseline)
+            similarity = None if distance is None else round(1 - distance / SIMHASH_BITS, 3)
+            if distance is not None and distance < Config.DEFACEMENT_MIN_DISTANCE:
+                # Small edits (counters, timestamps, rotating news) are not defacement
                 return {
-                    'status': 'defacement_detected',
-                    'baseline_hash': baseline['content_hash'],
-                    'current_hash': current_hash,
-                    'incident': incident
+                    'status': 'minor_change',
+                    'hash': current_hash,
+                    'distance': distance,
+                    'similarity': similarity,
+                    'snapshot_hash': snapshot_hash
                 }
-            else:
-                # If previously defaced, resolve the incident when content matches baseline
-                self._resolve_defacement_incident(website_id)
-                return {'status': 'no_change', 'hash': current_hash}
+            
+            # Potential defacement detected (incident handled by the incident engine)
+            return {
+                'status': 'defacement_detected',
+                'baseline_hash': baseline['content_hash'],
+                'current_hash': current_hash,
+                'distance': distance,
+                'similarity': similarity,
+                'severity': self._defacement_severity(distance),
+                'baseline_snapshot_hash': baseline['snapshot_hash'],
+                'snapshot_hash': snapshot_hash
+            }
                 
         except Exception as e:
             logger.error(f"Error checking defacement for {url}: {str(e)}")
             return {'status': 'error', 'error_message': str(e)}
     
-    def _check_ssl_certificate(self, url):
+    def _fingerprint_page(self, website_id, response, snapshot=True):
+        """Exact hash, SimHash signatures and (unless ``snapshot`` is False) snapshot of a fetched page"""
+        soup = BeautifulSoup(response.text, 'html.parser')
+        content = soup.get_text()
+        current_hash = hashlib.md5(content.encode()).hexdigest()
+        text_simhash, dom_simhash = fingerprint(soup, content)
+        return {
+            'hash': current_hash,
+            'text_simhash': text_simhash,
+            'dom_simhash': dom_simhash,
+            'snapshot_hash': self._store_snapshot(website_id, response.content, current_hash) if snapshot else None
+        }
+    
+    def _content_distance(self, page, baseline):
+        """Bits differing between the page and baseline signatures (text or structure, whichever moved more)"""
+        if baseline['text_simhash'] is None or baseline['dom_simhash'] is None:
+            return None  # baseline predates similarity scoring
+        return max(
+            hamming_distance(page['text_simhash'], baseline['text_simhash']),
+            hamming_distance(page['dom_simhash'], baseline['dom_simhash'])
+        )
+    
+    def _defacement_severity(self, distance):
+        if distance is None:
+            return 'high'
+        if distance >= Config.DEFACEMENT_CRITICAL_DISTANCE:
+            return 'critical'
+        if distance >= Config.DEFACEMENT_HIGH_DISTANCE:
+            return 'high'
+        return 'medium'
+    
+    def _check_ssl_certificate(self, url, timeout=None):
         """Extract and analyze SSL certificate"""
         try:
-            hostname = url.replace('https://', '').split('/')[0].split(':')[0]
-            port = 443
+            parsed = urlparse(url)
+            hostname = parsed.hostname
+            port = parsed.port or 443
             
             # Create SSL context
             context = ssl.create_default_context()
             
-            with socket.create_connection((hostname, port), timeout=self.timeout) as sock:
+            connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout or self.timeout,) * 2
+            with dns_cache.create_connection((hostname, port), timeout=connect_timeout) as sock:
+                sock.settimeout(read_timeout)
                 with context.wrap_socket(sock, server_hostname=hostname) as ssock:
                     cert_der = ssock.getpeercert(binary_form=True)
                     cert = x509.load_der_x509_certificate(cert_der, default_backend())
@@ -194,7 +607,7 @@ class MonitoringEngine:
                     valid_to = cert.not_valid_after.date()
                     
                     # Calculate days until expiry
-                    days_until_expiry = (valid_to - datetime.now().date()).days
+                    days_until_expiry = (valid_to - clock.now().date()).days
                     
                     return {
                         'issuer': issuer,
@@ -202,54 +615,44 @@ class MonitoringEngine:
                         'valid_from': valid_from.isoformat(),
                         'valid_to': valid_to.isoformat(),
                         'days_until_expiry': days_until_expiry,
-                        'checked_at': datetime.now().isoformat()
+                        'checked_at': clock.now().isoformat()
                     }
                     
         except Exception as e:
             logger.error(f"Error checking SSL certificate for {url}: {str(e)}")
             return None
     
-    def _get_baseline(self, website_id):
+    def _get_baseline(self, website_id, path=None):
         """Get defacement baseline for website"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT content_hash, content_selector, captured_at
-                FROM defacement_baselines
-                WHERE website_id = ?
-                ORDER BY captured_at DESC
-                LIMIT 1
-            ''', (website_id,))
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'content_hash': row['content_hash'],
-                    'content_selector': row['content_selector'],
-                    'captured_at': row['captured_at']
-                }
-            return None
+        return self.baselines.get(website_id, path)
     
-    def _store_baseline(self, website_id, content_hash, content_selector=None):
+    def _store_baseline(self, website_id, content_hash, content_selector=None, snapshot_hash=None,
+                        text_simhash=None, dom_simhash=None, path=None):
         """Store defacement baseline"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO defacement_baselines (website_id, content_hash, content_selector)
-                VALUES (?, ?, ?)
-            ''', (website_id, content_hash, content_selector))
-            conn.commit()
+        self.baselines.save(website_id, content_hash, content_selector, snapshot_hash, text_simhash, dom_simhash, path)
+    
+    def _store_snapshot(self, website_id, body, text_hash):
+        """Keep the fetched page body for forensics; returns its snapshot hash or None"""
+        if not Config.SNAPSHOTS_ENABLED:
+            return None
+        try:
+            with CHECK_DURATION.labels('snapshot').time():
+                return self.snapshots.store(website_id, body, text_hash)
+        except Exception as e:
+            logger.error(f"Error storing snapshot for website {website_id}: {str(e)}")
+            return None
     
     def _store_check(self, website_id, check_type, result):
         """Store monitoring check result"""
-        with self.db.get_connection() as conn:
+        with CHECK_DURATION.labels('store').time(), self.db.get_connection('MonitoringEngine._store_check') as conn:
             cursor = conn.cursor()
             # For defacement checks, map status appropriately for database
             status = result.get('status', 'unknown')
             if check_type == 'defacement':
                 if status == 'defacement_detected':
                     db_status = 'failure'  # Mark as failure to indicate issue
-                elif status == 'no_change':
-                    db_status = 'success'  # No change = success
+                elif status in ('no_change', 'minor_change'):
+                    db_status = 'success'  # No change, or edits too small to be defacement = success
                 elif status == 'baseline_created':
                     db_status = 'success'  # Baseline created = success
                 else:
@@ -257,69 +660,86 @@ class MonitoringEngine:
             else:
                 db_status = status
             
-            cursor.execute('''
-                INSERT INTO monitoring_checks 
-                (website_id, check_type, status, response_time, http_status_code, error_message)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                website_id,
-                check_type,
-                db_status,
-                result.get('response_time'),
-                result.get('http_status_code'),
-                result.get('error_message')
-            ))
+            response_time = result.get('response_time')
+            http_status_code = result.get('http_status_code')
+            error_message = result.get('error_message')
+            checked_at = clock.timestamp()
+            extended = Config.CHECK_STORAGE_MODE == 'spans' and self._extend_span(
+                cursor, website_id, check_type, db_status, response_time, http_status_code, error_message, checked_at
+            )
+            if not extended:
+                cursor.execute('''
+                    INSERT INTO monitoring_checks 
+                    (website_id, check_type, status, response_time, http_status_code, error_message,
+                     checked_at, first_checked_at, rt_sum, rt_min, rt_max)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    website_id,
+                    check_type,
+                    db_status,
+                    response_time,
+                    http_status_code,
+                    error_message,
+                    checked_at,
+                    checked_at,
+                    response_time,
+                    response_time,
+                    response_time
+                ))
+            if check_type == 'uptime':
+                # Keep hourly analytics rollups current in the same transaction
+                self.analytics.record_check(cursor, website_id, db_status, result.get('response_time'), checked_at)
             conn.commit()
     
+    def _extend_span(self, cursor, website_id, check_type, status, response_time, http_status_code, error_message, checked_at):
+        """Fold a check into the site's latest row if the outcome is unchanged; returns True if it did
+        
+        A span row covers first_checked_at..checked_at with run_count checks and a
+        latency summary. Spans never cross an hour boundary so hourly rollups stay exact.
+        """
+        cursor.execute('''
+            UPDATE monitoring_checks SET
+                run_count = run_count + 1,
+                checked_at = ?,
+                response_time = ?,
+                rt_sum = rt_sum + ?,
+                rt_min = MIN(rt_min, ?),
+                rt_max = MAX(rt_max, ?)
+            WHERE check_id = (
+                SELECT check_id FROM monitoring_checks
+                WHERE website_id = ? AND check_type = ?
+                ORDER BY checked_at DESC, check_id DESC
+                LIMIT 1
+            )
+            AND status = ? AND http_status_code IS ? AND error_message IS ?
+            AND (response_time IS NULL) = (? IS NULL)
+            AND first_checked_at >= ?
+        ''', (
+            checked_at, response_time, response_time, response_time, response_time,
+            website_id, check_type,
+            status, http_status_code, error_message, response_time,
+            checked_at[:13] + ':00:00'
+        ))
+        return cursor.rowcount == 1
+    
     def _store_ssl_certificate(self, website_id, ssl_data):
         """Store SSL certificate information"""
-        with self.db.get_connection() as conn:
+        with self.db.get_connection('MonitoringEngine._store_ssl_certificate') as conn:
             cursor = conn.cursor()
             # Delete old certificate record
             cursor.execute('DELETE FROM ssl_certificates WHERE website_id = ?', (website_id,))
             # Insert new record
             cursor.execute('''
                 INSERT INTO ssl_certificates 
-                (website_id, issuer, subject, valid_from, valid_to, days_until_expiry)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (website_id, issuer, subject, valid_from, valid_to, days_until_expiry, last_checked)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (
                 website_id,
                 ssl_data['issuer'],
                 ssl_data['subject'],
                 ssl_data['valid_from'],
                 ssl_data['valid_to'],
-                ssl_data['days_until_expiry']
+                ssl_data['days_until_expiry'],
+                clock.timestamp()
             ))
             conn.commit()
-    
-    def _create_incident(self, website_id, incident_type, severity, description):
-        """Create incident record"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO incidents (website_id, incident_type, severity, description)
-                VALUES (?, ?, ?, ?)
-            ''', (website_id, incident_type, severity, description))
-            conn.commit()
-            return cursor.lastrowid
-
-    def _resolve_defacement_incident(self, website_id):
-        """Mark the latest defacement incident as resolved if one exists."""
-        try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE incidents
-                    SET resolved_at = ?
-                    WHERE incident_id = (
-                        SELECT incident_id
-                        FROM incidents
-                        WHERE website_id = ? AND incident_type = 'defacement' AND resolved_at IS NULL
-                        ORDER BY detected_at DESC
-                        LIMIT 1
-                    )
-                ''', (datetime.now().isoformat(), website_id))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Error resolving defacement incident for website {website_id}: {str(e)}")
-
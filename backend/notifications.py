@@ -1,10 +1,15 @@
 import logging
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 from telegram import Bot
 from telegram.error import TelegramError
 from database import Database
 from config import Config
+from alert_coalescer import AlertCoalescer
+from suppression_cache import SuppressionCache
+from metrics import NOTIFICATION_DURATION
+from clock import clock
+import time
 import threading
 
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +25,12 @@ class NotificationService:
         self._loop = None
         self._loop_thread = None
         self._lock = threading.Lock()
+        self.coalescer = None
+        self.suppression_cache = SuppressionCache(self.cooldown)
+        self.suppression_cache.warm(self.db)
+        
+        if Config.ALERT_COALESCING_ENABLED:
+            self.coalescer = AlertCoalescer(self._send_alert, self._send_digest)
         
         if self.bot_token:
             try:
@@ -51,7 +62,7 @@ class NotificationService:
         future = asyncio.run_coroutine_threadsafe(coro, self._loop)
         return future.result(timeout=10)  # 10 second timeout
     
-    def send_notification(self, website_id, incident_type, severity, message, website_url=None, website_name=None):
+    def send_notification(self, website_id, incident_type, severity, message, website_url=None, website_name=None, coalesce=True, incident_id=None):
         """Send notification via configured channels"""
         if not self.bot or not self.chat_id:
             logger.warning("Telegram not configured, skipping notification")
@@ -62,12 +73,42 @@ class NotificationService:
             logger.info(f"Notification suppressed due to cooldown for website {website_id}, incident {incident_type}")
             return False
         
+        alert = {
+            'website_id': website_id,
+            'incident_type': incident_type,
+            'severity': severity,
+            'message': message,
+            'website_url': website_url,
+            'website_name': website_name,
+            'incident_id': incident_id
+        }
+        
+        # Alerts sharing a host/IP within the coalescing window are merged into one digest
+        if coalesce and self.coalescer:
+            return self.coalescer.submit(alert)
+        return self._send_alert(alert)
+    
+    def flush_pending(self):
+        """Deliver any alerts still buffered by the coalescer"""
+        if self.coalescer:
+            self.coalescer.flush_all()
+    
+    def _send_alert(self, alert):
+        """Send a single alert message"""
+        formatted_message = self._format_message(
+            alert['incident_type'], alert['severity'], alert['message'],
+            alert['website_url'], alert['website_name']
+        )
+        return self._deliver(formatted_message, [alert])
+    
+    def _send_digest(self, group_key, alerts):
+        """Send one digest message covering several coalesced alerts"""
+        return self._deliver(self._format_digest(group_key, alerts), alerts)
+    
+    def _deliver(self, formatted_message, alerts):
+        """Deliver a formatted message to Telegram and record it for each alert"""
+        start = time.perf_counter()
         try:
-            # Format message
-            formatted_message = self._format_message(
-                incident_type, severity, message, website_url, website_name
-            )
-            
             logger.debug(f"Sending Telegram message to chat_id: {self.chat_id}")
             
             # Send via Telegram - python-telegram-bot v20+ requires async/await
@@ -88,15 +129,20 @@ class NotificationService:
                     ))
                     logger.debug(f"Telegram message sent (plain), message_id: {result.message_id if result else 'None'}")
             
+            NOTIFICATION_DURATION.labels('telegram', 'sent').observe(time.perf_counter() - start)
+            
             # Record notification
-            self._record_notification(website_id, incident_type, 'telegram', 'sent')
+            for alert in alerts:
+                self._record_notification(alert['website_id'], alert['incident_type'], 'telegram', 'sent', alert.get('incident_id'))
             
-            logger.info(f"Notification sent successfully for website {website_id}: {incident_type}")
+            logger.info(f"Notification sent successfully for websites {[alert['website_id'] for alert in alerts]}: {alerts[0]['incident_type']}")
             return True
             
         except TelegramError as e:
             logger.error(f"Telegram API error: {str(e)}")
-            self._record_notification(website_id, incident_type, 'telegram', 'failed')
+            NOTIFICATION_DURATION.labels('telegram', 'failed').observe(time.perf_counter() - start)
+            for alert in alerts:
+                self._record_notification(alert['website_id'], alert['incident_type'], 'telegram', 'failed', alert.get('incident_id'))
             return False
         except Exception as e:
             logger.error(f"Unexpected error sending notification: {str(e)}", exc_info=True)
@@ -108,13 +154,16 @@ class NotificationService:
             'downtime': '🔴',
             'defacement': '⚠️',
             'ssl_expiry': '🔒',
+            'performance_degradation': '🐢',
+            'page_downtime': '🔴',
+            'page_defacement': '⚠️',
             'critical': '🚨',
             'high': '⚠️',
             'medium': '⚡',
             'low': 'ℹ️'
         }
         
-        incident_emoji = emoji_map.get(incident_type, '📢')
+        incident_emoji = '✅' if incident_type.endswith('_resolved') else emoji_map.get(incident_type, '📢')
         severity_emoji = emoji_map.get(severity, '')
         
         formatted = f"{incident_emoji} <b>WebGuard Alert</b>\n\n"
@@ -130,49 +179,69 @@ class NotificationService:
             formatted += f"<b>URL:</b> {website_url}\n"
         
         formatted += f"\n<b>Details:</b>\n{message}\n\n"
-        formatted += f"<i>Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i>"
+        formatted += f"<i>Time: {clock.now().strftime('%Y-%m-%d %H:%M:%S')}</i>"
+        
+        return formatted
+    
+    def _format_digest(self, group_key, alerts):
+        """Format a digest message for coalesced alerts"""
+        incident_type = alerts[0]['incident_type']
+        target = group_key.split(':', 1)[1]
+        emoji_map = {
+            'downtime': '🔴',
+            'defacement': '⚠️',
+            'ssl_expiry': '🔒',
+            'performance_degradation': '🐢',
+            'page_downtime': '🔴',
+            'page_defacement': '⚠️'
+        }
+        
+        formatted = f"{emoji_map.get(incident_type, '📢')} <b>WebGuard Alert Digest</b>\n\n"
+        formatted += f"<b>Type:</b> {incident_type.replace('_', ' ').title()}\n"
+        formatted += f"<b>Shared host:</b> {target}\n"
+        formatted += f"<b>Affected websites:</b> {len(alerts)}\n\n"
+        
+        for alert in alerts[:Config.ALERT_DIGEST_MAX_SITES]:
+            name = alert['website_name'] or alert['website_url'] or f"Website {alert['website_id']}"
+            formatted += f"• <b>{name}</b> ({alert['severity']}): {alert['message']}\n"
+        if len(alerts) > Config.ALERT_DIGEST_MAX_SITES:
+            formatted += f"... and {len(alerts) - Config.ALERT_DIGEST_MAX_SITES} more\n"
+        
+        formatted += f"\n<i>Time: {clock.now().strftime('%Y-%m-%d %H:%M:%S')}</i>"
         
         return formatted
     
     def _should_suppress_notification(self, website_id, incident_type):
         """Check if notification should be suppressed due to cooldown"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cutoff_time = datetime.now() - timedelta(seconds=self.cooldown)
-            
-            cursor.execute('''
-                SELECT COUNT(*) as count
-                FROM notifications n
-                JOIN incidents i ON n.incident_id = i.incident_id
-                WHERE i.website_id = ? 
-                AND i.incident_type = ?
-                AND n.sent_at > ?
-            ''', (website_id, incident_type, cutoff_time.isoformat()))
-            
-            result = cursor.fetchone()
-            return result['count'] > 0 if result else False
+        return self.suppression_cache.is_suppressed(website_id, incident_type)
     
-    def _record_notification(self, website_id, incident_type, channel, status):
+    def _record_notification(self, website_id, incident_type, channel, status, incident_id=None):
         """Record notification in database"""
+        # Write through to the cooldown cache first so suppression never waits on the DB
+        if status == 'sent':
+            self.suppression_cache.record(website_id, incident_type)
+        
         try:
-            with self.db.get_connection() as conn:
+            with self.db.get_connection('NotificationService._record_notification') as conn:
                 cursor = conn.cursor()
-                # Get most recent incident for this website and type
-                cursor.execute('''
-                    SELECT incident_id
-                    FROM incidents
-                    WHERE website_id = ? AND incident_type = ?
-                    ORDER BY detected_at DESC
-                    LIMIT 1
-                ''', (website_id, incident_type))
+                if incident_id is None:
+                    # Fall back to the most recent incident for this website and type
+                    cursor.execute('''
+                        SELECT incident_id
+                        FROM incidents
+                        WHERE website_id = ? AND incident_type = ?
+                        ORDER BY detected_at DESC
+                        LIMIT 1
+                    ''', (website_id, incident_type))
+                    
+                    incident = cursor.fetchone()
+                    incident_id = incident['incident_id'] if incident else None
                 
-                incident = cursor.fetchone()
-                if incident:
+                if incident_id is not None:
                     cursor.execute('''
-                        INSERT INTO notifications (incident_id, notification_channel, delivery_status)
-                        VALUES (?, ?, ?)
-                    ''', (incident['incident_id'], channel, status))
+                        INSERT INTO notifications (incident_id, notification_channel, delivery_status, notification_type, sent_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (incident_id, channel, status, incident_type, clock.timestamp()))
                     conn.commit()
         except Exception as e:
             logger.error(f"Error recording notification: {str(e)}")
-
@@ -0,0 +1,98 @@
+import logging
+import threading
+from config import Config
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Probe methods, cheapest first
+HEAD = 'head'        # HEAD request: status line and headers only
+HEADERS = 'headers'  # GET whose body is never read, for sites that mishandle HEAD
+FULL = 'full'        # GET with the body, needed for defacement checks and verification
+
+# HEAD answers that mean "not supported here" rather than "site is broken"
+HEAD_UNSUPPORTED_CODES = (405, 501)
+
+class ProbePolicy:
+    """Choose how each site's uptime is probed in tiered mode
+
+    Routine checks use HEAD. A full GET runs when the defacement check is
+    due or every ``verify_every`` HEAD probes, and the site falls back to a
+    body-less GET for good once HEAD turns out to disagree with GET (405/501
+    on HEAD, or HEAD reporting success while GET does not).
+    """
+
+    def __init__(self, verify_every=None, defacement_interval=None):
+        self.verify_every = verify_every or Config.PROBE_VERIFY_EVERY
+        self.defacement_interval = Config.DEFACEMENT_CHECK_INTERVAL if defacement_interval is None else defacement_interval
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def defacement_due(self, website_id, now=None):
+        """Whether the site's next defacement check should run now"""
+        last = self._state(website_id)['last_defacement']
+        now = clock.monotonic() if now is None else now
+        return last is None or now - last >= self.defacement_interval
+
+    def defacement_checked(self, website_id, now=None):
+        with self._lock:
+            self._state(website_id)['last_defacement'] = clock.monotonic() if now is None else now
+
+    def plan(self, website_id, full=False):
+        """Probe method for the next uptime check (``full`` forces a body GET)"""
+        state = self._state(website_id)
+        if full:
+            return FULL
+        if not state['head_supported']:
+            return HEADERS
+        if state['head_probes'] >= self.verify_every:
+            return FULL
+        return HEAD
+
+    def record(self, website_id, method, status_code):
+        """Note a probe's outcome (status_code is None when the request itself failed)"""
+        with self._lock:
+            state = self._state(website_id)
+            if method == HEAD:
+                state['head_probes'] += 1
+                state['last_head_ok'] = status_code is not None and 200 <= status_code < 300
+                if status_code in HEAD_UNSUPPORTED_CODES:
+                    self._disable_head(website_id, state, f"HEAD answered {status_code}")
+                return
+            if method == FULL:
+                state['head_probes'] = 0
+            # Compare a GET only with the HEAD probe right before it
+            head_ok, state['last_head_ok'] = state['last_head_ok'], None
+            if status_code is not None and state['head_supported'] and head_ok is not None:
+                if (200 <= status_code < 300) != head_ok:
+                    self._disable_head(website_id, state, f"HEAD and GET disagree (GET answered {status_code})")
+
+    def get_state(self, website_id):
+        state = self._states.get(website_id)
+        return dict(state) if state else None
+
+    def forget(self, website_id):
+        """Drop a site's state, or one page's when given a (website_id, path) key"""
+        with self._lock:
+            if isinstance(website_id, tuple):
+                self._states.pop(website_id, None)
+                return
+            for key in [key for key in self._states if key == website_id or (isinstance(key, tuple) and key[0] == website_id)]:
+                del self._states[key]
+
+    def _state(self, website_id):
+        state = self._states.get(website_id)
+        if state is None:
+            state = self._states.setdefault(website_id, {
+                'head_supported': True,
+                'head_probes': 0,
+                'last_head_ok': None,
+                'last_defacement': None
+            })
+        return state
+
+    def _disable_head(self, website_id, state, reason):
+        state['head_supported'] = False
+        state['last_head_ok'] = None
+        logger.info(f"Website {website_id}: {reason}, probing with GET from now on")
@@ -0,0 +1,93 @@
+import json
+import logging
+import math
+from datetime import datetime, timedelta
+from database import Database
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class ScheduleStore:
+    """Persisted interval, next run time and back-off state of every scheduled website
+
+    Times are naive UTC datetimes, stored like CURRENT_TIMESTAMP.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+
+    def load(self):
+        """Return {website_id: {'interval', 'next_run_at', 'policy_state'}}"""
+        with self.db.get_connection('ScheduleStore.load') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT website_id, interval, next_run_at, policy_state FROM schedule_state')
+            rows = cursor.fetchall()
+        return {
+            row['website_id']: {
+                'interval': row['interval'],
+                'next_run_at': datetime.strptime(row['next_run_at'], TIME_FORMAT),
+                'policy_state': json.loads(row['policy_state']) if row['policy_state'] else None
+            }
+            for row in rows
+        }
+
+    def save_many(self, entries):
+        """Upsert (website_id, interval, next_run_at, policy_state) tuples"""
+        rows = [
+            (website_id, interval, next_run_at.strftime(TIME_FORMAT), json.dumps(policy_state) if policy_state else None)
+            for website_id, interval, next_run_at, policy_state in entries
+        ]
+        if not rows:
+            return
+        with self.db.get_connection('ScheduleStore.save_many') as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO schedule_state (website_id, interval, next_run_at, policy_state, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(website_id) DO UPDATE SET
+                    interval = excluded.interval,
+                    next_run_at = excluded.next_run_at,
+                    policy_state = excluded.policy_state,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', rows)
+            conn.commit()
+
+    def delete(self, website_id):
+        with self.db.get_connection('ScheduleStore.delete') as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM schedule_state WHERE website_id = ?', (website_id,))
+            conn.commit()
+
+def plan_restore(entries, now, rate=None):
+    """First run time for each restored site: {website_id: (interval, next_run_at)} -> {website_id: run_at}
+
+    Sites that are not yet due keep their stored time, and with it their
+    phase. Overdue sites are queued most-overdue first and started at most
+    ``rate`` per second, unless their next slot on the original grid
+    comes up before their turn in the queue.
+    """
+    rate = rate or Config.SCHEDULER_CATCHUP_RATE
+    plan = {}
+    overdue = []
+    for website_id, (interval, next_run_at) in entries.items():
+        if next_run_at > now:
+            plan[website_id] = next_run_at
+        else:
+            overdue.append((next_run_at, website_id, interval))
+
+    queued = 0
+    for next_run_at, website_id, interval in sorted(overdue):
+        missed = math.floor((now - next_run_at).total_seconds() / interval) + 1
+        on_grid = next_run_at + timedelta(seconds=missed * interval)
+        turn = now + timedelta(seconds=queued / rate)
+        if on_grid <= turn:
+            plan[website_id] = on_grid
+        else:
+            plan[website_id] = turn
+            queued += 1
+    if queued:
+        logger.info(f"{queued} websites missed checks while the scheduler was down, catching up over {queued / rate:.0f}s")
+    return plan
@@ -3,19 +3,77 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from database import Database
 from monitoring import MonitoringEngine
+from archive import CheckArchive
+from adaptive_interval import AdaptiveIntervalPolicy, is_healthy
+from schedule_store import ScheduleStore, plan_restore
+from site_registry import SiteRegistry
+from timer_heap import CheckDispatcher
+from clock import clock
 from notifications import NotificationService
 from config import Config
+from metrics import SCHEDULER_LAG, SCHEDULER_MISSED, CHECKS_IN_PROGRESS, gauge
+from datetime import datetime, timezone
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MonitoringScheduler:
-    def __init__(self):
+    def __init__(self, background=True):
+        """``background=False`` leaves every thread stopped, for callers driving ``dispatcher.run_pending()`` themselves"""
         self.db = Database()
         self.monitoring_engine = MonitoringEngine()
         self.notification_service = NotificationService()
+        self.interval_policy = AdaptiveIntervalPolicy()
+        self.schedule_store = ScheduleStore(self.db)
+        self.sites = SiteRegistry(self.db)
+        # Website checks run from a timer heap; APScheduler only keeps the housekeeping jobs
+        self.dispatcher = CheckDispatcher(
+            self._check_website_job,
+            Config.SCHEDULER_WORKERS,
+            on_lag=lambda lag: SCHEDULER_LAG.observe(max(lag, 0)),
+            on_missed=SCHEDULER_MISSED.inc
+        )
+        self._intervals = self.dispatcher.intervals  # website_id -> interval the site is currently checked at
         self.scheduler = BackgroundScheduler()
-        self.scheduler.start()
+        if background:
+            self.dispatcher.start()
+            self.scheduler.start()
+        if Config.ARCHIVE_ENABLED:
+            # Move aged checks into the columnar archive once a day
+            self.archive = CheckArchive(db=self.db)
+            self.scheduler.add_job(
+                func=self._archive_job,
+                trigger=IntervalTrigger(hours=24),
+                id='archive_checks',
+                next_run_time=datetime.now(),
+                replace_existing=True
+            )
+        if Config.SNAPSHOTS_ENABLED:
+            # Age out old page snapshots even when no new versions arrive
+            self.scheduler.add_job(
+                func=self._snapshot_eviction_job,
+                trigger=IntervalTrigger(hours=24),
+                id='evict_snapshots',
+                replace_existing=True
+            )
+        # SSL expiry warnings fire when a certificate crosses a threshold, independent of probing
+        self.scheduler.add_job(
+            func=self._ssl_expiry_job,
+            trigger=IntervalTrigger(seconds=Config.SSL_EXPIRY_SWEEP_INTERVAL),
+            id='ssl_expiry_alerts',
+            replace_existing=True
+        )
+        # Save next-run times so a restart resumes each site's schedule instead of starting over
+        self.scheduler.add_job(
+            func=self._persist_schedule,
+            trigger=IntervalTrigger(seconds=Config.SCHEDULE_PERSIST_INTERVAL),
+            id='persist_schedule',
+            replace_existing=True
+        )
+        gauge('webguard_scheduler_jobs', 'Website check jobs registered with the scheduler',
+              callback=lambda: len(self.dispatcher))
+        gauge('webguard_scheduled_checks_per_second', 'Fleet-wide check rate implied by current intervals',
+              callback=lambda: sum(1.0 / interval for interval in list(self._intervals.values())))
         logger.info("Monitoring scheduler initialized")
     
     def start_monitoring(self, website_id):
@@ -32,28 +90,56 @@ class MonitoringScheduler:
         interval = max(website['check_interval'], Config.MIN_CHECK_INTERVAL)
         
         # Add job to scheduler
-        job_id = f"website_{website_id}"
-        self.scheduler.add_job(
-            func=self._check_website_job,
-            trigger=IntervalTrigger(seconds=interval),
-            id=job_id,
-            args=[website_id],
-            replace_existing=True
-        )
+        self._add_job(website_id, interval)
+        self.interval_policy.forget(website_id)
+        self._persist_schedule(website_id)
         
         logger.info(f"Started monitoring website {website_id} with interval {interval}s")
     
+    def _add_job(self, website_id, interval, run_at=None):
+        """Register a site's checks; run_at (naive UTC) is its first run, by default one interval from now"""
+        first_due = run_at.replace(tzinfo=timezone.utc).timestamp() if run_at is not None else None
+        self.dispatcher.add(website_id, interval, first_due)
+    
     def stop_monitoring(self, website_id):
         """Stop monitoring a website"""
-        job_id = f"website_{website_id}"
         try:
-            self.scheduler.remove_job(job_id)
+            self.dispatcher.remove(website_id)
+            self.interval_policy.forget(website_id)
+            self.schedule_store.delete(website_id)
             logger.info(f"Stopped monitoring website {website_id}")
         except Exception as e:
             logger.error(f"Error stopping monitoring for website {website_id}: {str(e)}")
     
+    def _archive_job(self):
+        """Job function to archive aged checks"""
+        try:
+            self.archive.archive_older_than()
+        except Exception as e:
+            logger.error(f"Error archiving checks: {str(e)}")
+    
+    def _snapshot_eviction_job(self):
+        """Job function to evict expired page snapshots"""
+        try:
+            self.monitoring_engine.snapshots.evict()
+        except Exception as e:
+            logger.error(f"Error evicting snapshots: {str(e)}")
+    
+    def _ssl_expiry_job(self):
+        """Job function to raise SSL incidents for certificates that crossed a warning threshold"""
+        for website_id, valid_to in self.monitoring_engine.ssl_expiry.pop_due():
+            try:
+                website = self._get_website(website_id)
+                if not website or not website['monitoring_enabled'] or not website['ssl_monitoring_enabled']:
+                    continue
+                results = self.monitoring_engine.check_ssl_expiry(website_id, valid_to)
+                self._process_results(website_id, website, results)
+            except Exception as e:
+                logger.error(f"Error evaluating SSL expiry for website {website_id}: {str(e)}")
+    
     def _check_website_job(self, website_id):
         """Job function to check a website"""
+        CHECKS_IN_PROGRESS.inc()
         try:
             website = self._get_website(website_id)
             if not website or not website['monitoring_enabled']:
@@ -66,94 +152,131 @@ class MonitoringScheduler:
                 website_id,
                 website['url'],
                 check_defacement=website['defacement_detection_enabled'],
-                check_ssl=website['ssl_monitoring_enabled']
+                check_ssl=website['ssl_monitoring_enabled'],
+                paths=website.get('paths', ())
             )
             
             # Process results and send notifications
             self._process_results(website_id, website, results)
             
+            if Config.ADAPTIVE_INTERVALS_ENABLED:
+                self._adapt_interval(website_id, website, results)
+            
         except Exception as e:
             logger.error(f"Error in monitoring job for website {website_id}: {str(e)}")
+        finally:
+            CHECKS_IN_PROGRESS.dec()
+    
+    def _adapt_interval(self, website_id, website, results):
+        """Reschedule the site's job if its health calls for a different interval"""
+        base_interval = max(website['check_interval'], Config.MIN_CHECK_INTERVAL)
+        interval = self.interval_policy.next_interval(website_id, base_interval, is_healthy(results))
+        if interval == self._intervals.get(website_id):
+            return
+        try:
+            if self.dispatcher.reschedule(website_id, interval):
+                logger.info(f"Website {website_id} now checked every {interval}s")
+        except Exception as e:
+            logger.error(f"Error rescheduling website {website_id}: {str(e)}")
     
     def _process_results(self, website_id, website, results):
-        """Process monitoring results and trigger notifications"""
-        # Check uptime results
-        if results.get('uptime'):
-            uptime = results['uptime']
-            if uptime['status'] == 'failure':
-                self.notification_service.send_notification(
-                    website_id=website_id,
-                    incident_type='downtime',
-                    severity='critical',
-                    message=f"Website is offline. Error: {uptime.get('error_message', 'Unknown error')}",
-                    website_url=website['url'],
-                    website_name=website.get('display_name')
-                )
-        
-        # Check defacement results
+        """Process monitoring results and trigger notifications on incident transitions"""
         if results.get('defacement'):
-            defacement = results['defacement']
-            logger.info(f"Defacement check result: {defacement.get('status')}")
-            if defacement.get('status') == 'defacement_detected':
-                logger.info(f"Defacement detected for website {website_id}, sending notification")
+            logger.info(f"Defacement check result: {results['defacement'].get('status')}")
+        
+        for event in results.get('incidents', []):
+            incident_type = event['incident_type']
+            transition = event['transition']
+            
+            if transition in ('opened', 'escalated'):
+                logger.info(f"{incident_type} incident {transition} for website {website_id}, sending notification")
                 result = self.notification_service.send_notification(
                     website_id=website_id,
-                    incident_type='defacement',
-                    severity='high',
-                    message="Potential website defacement detected. Content hash mismatch.",
+                    incident_type=incident_type,
+                    severity=event['severity'],
+                    message=event['description'],
                     website_url=website['url'],
-                    website_name=website.get('display_name')
+                    website_name=website.get('display_name'),
+                    incident_id=event['incident_id']
                 )
-                if result:
-                    logger.info(f"Notification sent successfully for website {website_id}")
-                else:
+                if not result:
                     logger.warning(f"Notification failed or was suppressed for website {website_id}")
-            else:
-                logger.debug(f"No defacement detected (status: {defacement.get('status')})")
-        
-        # Check SSL results
-        if results.get('ssl'):
-            ssl_data = results['ssl']
-            days_until_expiry = ssl_data.get('days_until_expiry', 999)
-            
-            # Check if within warning thresholds
-            if days_until_expiry in Config.SSL_WARNING_THRESHOLDS or days_until_expiry < 0:
-                severity = 'critical' if days_until_expiry < 0 else 'high' if days_until_expiry <= 7 else 'medium'
-                message = f"SSL certificate expires in {days_until_expiry} days" if days_until_expiry >= 0 else "SSL certificate has expired"
-                
+            elif transition == 'resolved':
+                logger.info(f"{incident_type} incident resolved for website {website_id}")
                 self.notification_service.send_notification(
                     website_id=website_id,
-                    incident_type='ssl_expiry',
-                    severity=severity,
-                    message=message,
+                    incident_type=f"{incident_type}_resolved",
+                    severity='low',
+                    message=f"{incident_type.replace('_', ' ').title()} incident has been resolved.",
                     website_url=website['url'],
-                    website_name=website.get('display_name')
+                    website_name=website.get('display_name'),
+                    incident_id=event['incident_id']
                 )
     
     def _get_website(self, website_id):
-        """Get website from database"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM websites WHERE website_id = ?', (website_id,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
+        """Get website from the in-memory site registry"""
+        return self.sites.get(website_id)
     
     def start_all_monitoring(self):
-        """Start monitoring all enabled websites"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT website_id FROM websites WHERE monitoring_enabled = 1')
-            websites = cursor.fetchall()
-            
-            for website in websites:
-                self.start_monitoring(website['website_id'])
+        """Start monitoring all enabled websites, resuming saved schedules where there are any"""
+        websites = [website for website in self.sites.all() if website['monitoring_enabled']]
+        
+        try:
+            saved = self.schedule_store.load()
+        except Exception as e:
+            logger.error(f"Error loading saved schedule: {str(e)}")
+            saved = {}
+        
+        restored = {}
+        for website in websites:
+            website_id = website['website_id']
+            state = saved.pop(website_id, None)
+            if state is None:
+                self.start_monitoring(website_id)
+                continue
+            restored[website_id] = state
+            if state['policy_state']:
+                self.interval_policy.restore(website_id, state['policy_state'])
         
-        logger.info(f"Started monitoring {len(websites)} websites")
+        plan = plan_restore(
+            {website_id: (state['interval'], state['next_run_at']) for website_id, state in restored.items()},
+            clock.utcnow()
+        )
+        for website_id, run_at in plan.items():
+            self._add_job(website_id, restored[website_id]['interval'], run_at)
+        
+        # Saved entries of websites deleted or disabled while the scheduler was down
+        for website_id in saved:
+            self.schedule_store.delete(website_id)
+        
+        logger.info(f"Started monitoring {len(websites)} websites ({len(restored)} resumed from saved schedule)")
+    
+    def _persist_schedule(self, website_id=None):
+        """Save the interval, next run time and back-off state of one website's job, or of all of them"""
+        try:
+            website_ids = [website_id] if website_id is not None else list(self._intervals)
+            entries = []
+            for website_id in website_ids:
+                interval = self._intervals.get(website_id)
+                next_run = self.dispatcher.next_run_time(website_id)
+                if interval is None or next_run is None:
+                    continue
+                entries.append((
+                    website_id,
+                    interval,
+                    datetime.fromtimestamp(next_run, timezone.utc).replace(tzinfo=None),
+                    self.interval_policy.get_state(website_id)
+                ))
+            self.schedule_store.save_many(entries)
+        except Exception as e:
+            logger.error(f"Error saving schedule: {str(e)}")
     
     def shutdown(self):
         """Shutdown scheduler"""
-        self.scheduler.shutdown()
+        self._persist_schedule()
+        self.dispatcher.shutdown()
+        if self.scheduler.running:
+            self.scheduler.shutdown()
+        self.notification_service.flush_pending()
         logger.info("Monitoring scheduler shut down")
 
@@ -0,0 +1,75 @@
+import hashlib
+import re
+from collections import Counter
+
+SIMHASH_BITS = 64
+_TOKEN_RE = re.compile(r'\w+')
+# Title/heading text counts this many times as much as body text
+PROMINENT_TAGS = ('title', 'h1', 'h2', 'h3')
+PROMINENT_WEIGHT = 25
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+
+def simhash(features):
+    """64-bit SimHash of a weighted feature multiset ({feature: weight})
+
+    Weights are accumulated per (byte position, byte value) and only then
+    spread over bits, so the cost is ~8 additions per feature rather than 64.
+    """
+    if not features:
+        return 0
+    by_byte = [Counter() for _ in range(SIMHASH_BITS // 8)]
+    total = 0
+    for feature, weight in features.items():
+        value = _feature_hash(feature)
+        total += weight
+        for position in range(SIMHASH_BITS // 8):
+            by_byte[position][(value >> (8 * position)) & 0xFF] += weight
+
+    fingerprint = 0
+    for position, counts in enumerate(by_byte):
+        for bit in range(8):
+            # Weight of features with this bit set, against those without it
+            ones = sum(weight for byte, weight in counts.items() if byte >> bit & 1)
+            if 2 * ones > total:
+                fingerprint |= 1 << (8 * position + bit)
+    return fingerprint
+
+def text_features(text, shingle_size=3):
+    """Overlapping word shingles of the page's visible text"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < shingle_size:
+        return Counter([' '.join(tokens)]) if tokens else Counter()
+    return Counter(' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1))
+
+def heading_features(soup):
+    """Shingles of the title and headings, which defacements tend to replace first"""
+    features = Counter()
+    for tag in soup.find_all(PROMINENT_TAGS):
+        for feature, weight in text_features(tag.get_text(), shingle_size=2).items():
+            features['heading:' + feature] += weight * PROMINENT_WEIGHT
+    return features
+
+def dom_features(soup):
+    """Tag paths (grandparent > parent > tag) describing the page structure"""
+    features = Counter()
+    for tag in soup.find_all(True):
+        parent = tag.parent
+        grandparent = parent.parent if parent is not None else None
+        features[f"{getattr(grandparent, 'name', '')}>{getattr(parent, 'name', '')}>{tag.name}"] += 1
+    return features
+
+def fingerprint(soup, text=None):
+    """Return (text_simhash, dom_simhash) for a parsed page"""
+    text = soup.get_text() if text is None else text
+    return simhash(text_features(text) + heading_features(soup)), simhash(dom_features(soup))
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def to_hex(value):
+    return f"{value:016x}"
+
+def from_hex(value):
+    return int(value, 16) if value else None
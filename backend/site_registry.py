@@ -0,0 +1,103 @@
+import logging
+import threading
+from database import Database
+from config import Config
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SiteRegistry:
+    """In-memory copy of the websites table, so scheduled checks need no query to find their site
+
+    Loaded once and kept current by the writers in this process calling
+    ``refresh`` or ``remove``. Triggers bump ``websites_version`` on every
+    write to the table, so at most every ``sync_interval`` seconds a single
+    one-row read tells whether another process (or a manual edit) changed
+    it, and only then is the table reloaded. Each website dict also
+    carries ``paths``, its extra pages from website_paths. Returned rows
+    are shared; treat them as read-only.
+    """
+
+    def __init__(self, db=None, sync_interval=None):
+        self.db = db or Database()
+        self.sync_interval = Config.SITE_REGISTRY_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.version = None
+        self._sites = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Reload every website"""
+        with self.db.get_connection('SiteRegistry.load') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT version FROM websites_version WHERE id = 1')
+            version = cursor.fetchone()['version']
+            cursor.execute('SELECT * FROM websites')
+            sites = {row['website_id']: dict(row, paths=[]) for row in cursor.fetchall()}
+            cursor.execute('SELECT website_id, path FROM website_paths ORDER BY path_id')
+            for row in cursor.fetchall():
+                if row['website_id'] in sites:
+                    sites[row['website_id']]['paths'].append(row['path'])
+        with self._lock:
+            self._sites = sites
+            self.version = version
+            self._synced_at = clock.monotonic()
+        logger.info(f"Loaded {len(sites)} websites into the site registry (version {version})")
+
+    def get(self, website_id):
+        self._sync()
+        return self._sites.get(website_id)
+
+    def all(self):
+        self._sync()
+        return list(self._sites.values())
+
+    def refresh(self, website_id):
+        """Re-read one website after this process inserted or updated it or its paths"""
+        with self.db.get_connection('SiteRegistry.refresh') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT version FROM websites_version WHERE id = 1')
+            version = cursor.fetchone()['version']
+            cursor.execute('SELECT * FROM websites WHERE website_id = ?', (website_id,))
+            row = cursor.fetchone()
+            cursor.execute('SELECT path FROM website_paths WHERE website_id = ? ORDER BY path_id', (website_id,))
+            paths = [path_row['path'] for path_row in cursor.fetchall()]
+        with self._lock:
+            if row:
+                self._sites[website_id] = dict(row, paths=paths)
+            else:
+                self._sites.pop(website_id, None)
+            self._adopt(version)
+
+    def remove(self, website_id):
+        """Drop a website this process deleted"""
+        with self.db.get_connection('SiteRegistry.remove') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT version FROM websites_version WHERE id = 1')
+            version = cursor.fetchone()['version']
+        with self._lock:
+            self._sites.pop(website_id, None)
+            self._adopt(version)
+
+    def _adopt(self, version):
+        # Only our own write happened since the last sync; anything more is left for _sync to reload
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+    def _sync(self):
+        now = clock.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        try:
+            with self.db.get_connection('SiteRegistry._sync') as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT version FROM websites_version WHERE id = 1')
+                version = cursor.fetchone()['version']
+            if version != self.version:
+                logger.info(f"Websites changed elsewhere (version {self.version} -> {version}), reloading site registry")
+                self.load()
+        except Exception as e:
+            logger.error(f"Error syncing site registry: {str(e)}")
@@ -0,0 +1,218 @@
+import difflib
+import hashlib
+import logging
+import threading
+import zlib
+from datetime import datetime, timedelta
+from database import Database
+from config import Config
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def compress(data):
+    """Return (codec, compressed bytes) using zstd when available, zlib otherwise"""
+    if HAS_ZSTD:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'zlib', zlib.compress(data, 9)
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if not HAS_ZSTD:
+            raise RuntimeError('Snapshot is zstd-compressed but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    return data
+
+class SnapshotStore:
+    """Content-addressed store of page bodies seen by defacement checks
+
+    Bodies are keyed by SHA-256, so a page that has not changed costs one
+    hash and a timestamp update per check. Each distinct version is
+    compressed once. Versions not seen for ``SNAPSHOT_MAX_AGE_DAYS`` are
+    dropped, and the least recently seen ones go first when the store
+    exceeds ``SNAPSHOT_STORE_MAX_BYTES``. Baseline snapshots are never
+    evicted.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self._last_hash = {}  # website_id -> hash of the last stored body
+        self._lock = threading.Lock()
+
+    def store(self, website_id, body, text_hash=None):
+        """Record a page body observed for a website and return its snapshot hash"""
+        truncated = len(body) > Config.SNAPSHOT_MAX_BODY_BYTES
+        if truncated:
+            body = body[:Config.SNAPSHOT_MAX_BODY_BYTES]
+        snapshot_hash = hashlib.sha256(body).hexdigest()
+
+        with self.db.get_connection('SnapshotStore.store') as conn:
+            cursor = conn.cursor()
+            if self._last_hash.get(website_id) == snapshot_hash:
+                # Unchanged page: just mark the version as seen again
+                cursor.execute('''
+                    UPDATE website_snapshots
+                    SET last_seen_at = CURRENT_TIMESTAMP, seen_count = seen_count + 1
+                    WHERE website_id = ? AND snapshot_hash = ?
+                ''', (website_id, snapshot_hash))
+                if cursor.rowcount:
+                    cursor.execute('UPDATE content_snapshots SET last_seen_at = CURRENT_TIMESTAMP WHERE snapshot_hash = ?',
+                                   (snapshot_hash,))
+                    conn.commit()
+                    return snapshot_hash
+
+            cursor.execute('SELECT 1 FROM content_snapshots WHERE snapshot_hash = ?', (snapshot_hash,))
+            is_new = cursor.fetchone() is None
+            if is_new:
+                codec, data = compress(body)
+                cursor.execute('''
+                    INSERT INTO content_snapshots (snapshot_hash, codec, size, stored_size, truncated, content)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (snapshot_hash, codec, len(body), len(data), truncated, data))
+            else:
+                cursor.execute('UPDATE content_snapshots SET last_seen_at = CURRENT_TIMESTAMP WHERE snapshot_hash = ?',
+                               (snapshot_hash,))
+            cursor.execute('''
+                INSERT INTO website_snapshots (website_id, snapshot_hash, text_hash)
+                VALUES (?, ?, ?)
+                ON CONFLICT(website_id, snapshot_hash) DO UPDATE SET
+                    last_seen_at = CURRENT_TIMESTAMP,
+                    seen_count = seen_count + 1
+            ''', (website_id, snapshot_hash, text_hash))
+            conn.commit()
+
+        with self._lock:
+            self._last_hash[website_id] = snapshot_hash
+        if is_new:
+            self.evict()
+        return snapshot_hash
+
+    def get(self, snapshot_hash):
+        """Return the decompressed body for a snapshot hash, or None"""
+        with self.db.get_connection('SnapshotStore.get') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT codec, content FROM content_snapshots WHERE snapshot_hash = ?', (snapshot_hash,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return decompress(row['codec'], row['content'])
+
+    def versions(self, website_id):
+        """Distinct versions observed for a website, newest first"""
+        with self.db.get_connection('SnapshotStore.versions') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ws.snapshot_hash, ws.text_hash, ws.first_seen_at, ws.last_seen_at, ws.seen_count,
+                       cs.size, cs.stored_size, cs.codec, cs.truncated,
+                       EXISTS(SELECT 1 FROM defacement_baselines db
+                              WHERE db.website_id = ws.website_id AND db.path IS NULL
+                                AND db.snapshot_hash = ws.snapshot_hash) as is_baseline
+                FROM website_snapshots ws
+                JOIN content_snapshots cs ON cs.snapshot_hash = ws.snapshot_hash
+                WHERE ws.website_id = ?
+                ORDER BY ws.last_seen_at DESC, ws.first_seen_at DESC, ws.rowid DESC
+            ''', (website_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def baseline_hash(self, website_id):
+        """Snapshot hash of the website's current defacement baseline, if it has one"""
+        with self.db.get_connection('SnapshotStore.baseline_hash') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT snapshot_hash FROM defacement_baselines
+                WHERE website_id = ? AND path IS NULL AND snapshot_hash IS NOT NULL
+                ORDER BY captured_at DESC, baseline_id DESC
+                LIMIT 1
+            ''', (website_id,))
+            row = cursor.fetchone()
+            return row['snapshot_hash'] if row else None
+
+    def diff(self, website_id, from_hash=None, to_hash=None, context=3):
+        """Unified diff between two versions (defaults: baseline -> latest); raises ValueError if missing"""
+        if not from_hash:
+            from_hash = self.baseline_hash(website_id)
+        if not to_hash:
+            versions = self.versions(website_id)
+            to_hash = versions[0]['snapshot_hash'] if versions else None
+        if not from_hash or not to_hash:
+            raise ValueError('No snapshots to compare')
+
+        known = {version['snapshot_hash'] for version in self.versions(website_id)}
+        for snapshot_hash in (from_hash, to_hash):
+            if snapshot_hash not in known:
+                raise ValueError(f"Unknown snapshot {snapshot_hash}")
+
+        before = self.get(from_hash).decode('utf-8', errors='replace').splitlines()
+        after = self.get(to_hash).decode('utf-8', errors='replace').splitlines()
+        return {
+            'from': from_hash,
+            'to': to_hash,
+            'diff': '\n'.join(difflib.unified_diff(before, after, from_hash[:12], to_hash[:12], lineterm='', n=context))
+        }
+
+    def evict(self):
+        """Drop versions past the age limit, then the least recently seen until under the size cap"""
+        cutoff = (datetime.utcnow() - timedelta(days=Config.SNAPSHOT_MAX_AGE_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        with self.db.get_connection('SnapshotStore.evict') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM website_snapshots
+                WHERE last_seen_at < ?
+                AND snapshot_hash NOT IN (SELECT snapshot_hash FROM defacement_baselines WHERE snapshot_hash IS NOT NULL)
+            ''', (cutoff,))
+            expired = cursor.rowcount
+            cursor.execute('''
+                DELETE FROM content_snapshots
+                WHERE snapshot_hash NOT IN (SELECT snapshot_hash FROM website_snapshots)
+                AND snapshot_hash NOT IN (SELECT snapshot_hash FROM defacement_baselines WHERE snapshot_hash IS NOT NULL)
+            ''')
+
+            cursor.execute('SELECT COALESCE(SUM(stored_size), 0) as total FROM content_snapshots')
+            total = cursor.fetchone()['total']
+            evicted = 0
+            if total > Config.SNAPSHOT_STORE_MAX_BYTES:
+                cursor.execute('''
+                    SELECT snapshot_hash, stored_size FROM content_snapshots
+                    WHERE snapshot_hash NOT IN (SELECT snapshot_hash FROM defacement_baselines WHERE snapshot_hash IS NOT NULL)
+                    ORDER BY last_seen_at, snapshot_hash
+                ''')
+                victims = []
+                for row in cursor.fetchall():
+                    if total <= Config.SNAPSHOT_STORE_MAX_BYTES:
+                        break
+                    victims.append((row['snapshot_hash'],))
+                    total -= row['stored_size']
+                cursor.executemany('DELETE FROM website_snapshots WHERE snapshot_hash = ?', victims)
+                cursor.executemany('DELETE FROM content_snapshots WHERE snapshot_hash = ?', victims)
+                evicted = len(victims)
+            conn.commit()
+
+        if evicted or expired:
+            with self._lock:
+                self._last_hash.clear()
+            logger.info(f"Evicted {evicted} snapshots over the size cap and {expired} expired versions")
+
+    def delete_site(self, website_id):
+        """Forget a deleted website's versions (shared bodies stay while other sites reference them)"""
+        with self.db.get_connection('SnapshotStore.delete_site') as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM website_snapshots WHERE website_id = ?', (website_id,))
+            cursor.execute('''
+                DELETE FROM content_snapshots
+                WHERE snapshot_hash NOT IN (SELECT snapshot_hash FROM website_snapshots)
+                AND snapshot_hash NOT IN (
+                    SELECT snapshot_hash FROM defacement_baselines
+                    WHERE snapshot_hash IS NOT NULL AND website_id != ?
+                )
+            ''', (website_id,))
+            conn.commit()
+        with self._lock:
+            self._last_hash.pop(website_id, None)
@@ -0,0 +1,118 @@
+import logging
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from database import Database
+from config import Config
+from timer_heap import TimerHeap
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def days_until_expiry(valid_to, today=None):
+    return (valid_to - (today or clock.now().date())).days
+
+def next_crossing(valid_to, today, thresholds=None):
+    """First day after ``today`` on which a certificate crosses a warning threshold or expires, or None"""
+    thresholds = Config.SSL_WARNING_THRESHOLDS if thresholds is None else thresholds
+    days = [valid_to - timedelta(days=threshold) for threshold in thresholds] + [valid_to + timedelta(days=1)]
+    upcoming = [day for day in days if day > today]
+    return min(upcoming) if upcoming else None
+
+class SslExpiryIndex:
+    """Known certificate expiry dates, indexed by when each next crosses a warning threshold
+
+    ``days_until_expiry`` only changes at local midnight, so the moment a
+    certificate reaches each of ``SSL_WARNING_THRESHOLDS`` (and the day it
+    expires) is known from ``valid_to`` alone. A ``TimerHeap`` holds one
+    entry per site, due at its next crossing; ``pop_due`` hands out the
+    sites whose level changed. Probing is only needed to notice renewals,
+    every ``probe_interval`` seconds.
+    """
+
+    def __init__(self, db=None, probe_interval=None):
+        self.db = db or Database()
+        self.probe_interval = Config.SSL_PROBE_INTERVAL if probe_interval is None else probe_interval
+        self._valid_to = {}   # website_id -> date
+        self._probed_at = {}  # website_id -> epoch seconds of the last successful probe
+        self._timers = TimerHeap()
+        self._lock = threading.Lock()
+        self._load()
+
+    def probe_due(self, website_id, now=None):
+        """Whether the site's certificate should be fetched again on this check"""
+        probed_at = self._probed_at.get(website_id)
+        now = clock.time() if now is None else now
+        return probed_at is None or now - probed_at >= self.probe_interval
+
+    def track(self, website_id, valid_to, now=None):
+        """Record a freshly probed certificate's expiry date (a ``date`` or ISO string)"""
+        if isinstance(valid_to, str):
+            valid_to = date.fromisoformat(valid_to)
+        now = clock.time() if now is None else now
+        with self._lock:
+            self._probed_at[website_id] = now
+            if self._valid_to.get(website_id) != valid_to:
+                self._valid_to[website_id] = valid_to
+                self._schedule(website_id, datetime.fromtimestamp(now).date())
+
+    def get(self, website_id):
+        return self._valid_to.get(website_id)
+
+    def next_due(self):
+        with self._lock:
+            return self._timers.next_due()
+
+    def pop_due(self, now=None):
+        """Return [(website_id, valid_to)] for sites that crossed a threshold by ``now``, rescheduling each"""
+        now = clock.time() if now is None else now
+        today = datetime.fromtimestamp(now).date()
+        with self._lock:
+            fired = []
+            for website_id, _ in self._timers.pop_due(now):
+                fired.append((website_id, self._valid_to[website_id]))
+                self._schedule(website_id, today)
+            return fired
+
+    def forget(self, website_id):
+        with self._lock:
+            self._valid_to.pop(website_id, None)
+            self._probed_at.pop(website_id, None)
+            self._timers.cancel(website_id)
+
+    def __len__(self):
+        return len(self._valid_to)
+
+    def _schedule(self, website_id, today):
+        crossing = next_crossing(self._valid_to[website_id], today)
+        if crossing is None:
+            self._timers.cancel(website_id)
+        else:
+            # Local midnight, matching how days_until_expiry is computed
+            self._timers.schedule(website_id, datetime.combine(crossing, time()).timestamp())
+
+    def _load(self):
+        """Build the index from stored certificates so restarts neither re-probe everything nor miss a crossing"""
+        try:
+            with self.db.get_connection('SslExpiryIndex._load') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT c.website_id, c.valid_to, c.last_checked
+                    FROM ssl_certificates c
+                    JOIN websites w ON w.website_id = c.website_id
+                    WHERE w.ssl_monitoring_enabled = 1 AND c.valid_to IS NOT NULL
+                ''')
+                rows = cursor.fetchall()
+            now = clock.time()
+            for row in rows:
+                website_id = row['website_id']
+                self._valid_to[website_id] = date.fromisoformat(row['valid_to'])
+                if row['last_checked']:
+                    # last_checked is UTC
+                    checked = datetime.strptime(row['last_checked'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                    self._probed_at[website_id] = checked.timestamp()
+                # Due at once, to catch up on crossings that happened while we were down
+                self._timers.schedule(website_id, now)
+            logger.info(f"Indexed expiry dates of {len(rows)} SSL certificates")
+        except Exception as e:
+            logger.error(f"Error loading SSL certificate expiry dates: {str(e)}")
@@ -0,0 +1,80 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from config import Config
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SuppressionCache:
+    """In-memory notification cooldown tracker keyed by (website_id, incident_type)"""
+
+    SWEEP_EVERY = 256  # writes between sweeps of expired entries
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else Config.NOTIFICATION_COOLDOWN
+        self._last_sent = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def is_suppressed(self, website_id, incident_type):
+        """Return True while the (website, incident type) pair is still cooling down"""
+        key = (website_id, incident_type)
+        with self._lock:
+            sent_at = self._last_sent.get(key)
+            if sent_at is None:
+                return False
+            if clock.time() - sent_at >= self.ttl:
+                del self._last_sent[key]
+                return False
+            return True
+
+    def record(self, website_id, incident_type, sent_at=None):
+        """Start (or restart) the cooldown for a pair"""
+        with self._lock:
+            self._last_sent[(website_id, incident_type)] = sent_at if sent_at is not None else clock.time()
+            self._writes += 1
+            if self._writes % self.SWEEP_EVERY == 0:
+                self._evict_expired()
+
+    def warm(self, db):
+        """Load notifications still inside the cooldown window from the database
+
+        Cooldowns are keyed by the notification's own type, so a recent
+        'downtime_resolved' message does not hold back the next downtime
+        alert. Rows recorded before the type was stored are skipped.
+        """
+        # sent_at is stored as UTC
+        now_utc = clock.utcnow()
+        try:
+            with db.get_connection('SuppressionCache.warm') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT i.website_id, n.notification_type, MAX(n.sent_at) as last_sent
+                    FROM notifications n
+                    JOIN incidents i ON n.incident_id = i.incident_id
+                    WHERE n.delivery_status = 'sent'
+                    AND n.notification_type IS NOT NULL
+                    AND n.sent_at > ?
+                    GROUP BY i.website_id, n.notification_type
+                ''', ((now_utc - timedelta(seconds=self.ttl)).strftime('%Y-%m-%d %H:%M:%S'),))
+                rows = cursor.fetchall()
+
+            for row in rows:
+                age = (now_utc - datetime.fromisoformat(row['last_sent'])).total_seconds()
+                self.record(row['website_id'], row['notification_type'], clock.time() - max(age, 0))
+
+            logger.info(f"Suppression cache warmed with {len(rows)} active cooldowns")
+        except Exception as e:
+            logger.error(f"Error warming suppression cache: {str(e)}")
+
+    def __len__(self):
+        return len(self._last_sent)
+
+    def _evict_expired(self):
+        """Drop entries whose cooldown has elapsed (caller holds the lock)"""
+        cutoff = clock.time() - self.ttl
+        expired = [key for key, sent_at in self._last_sent.items() if sent_at <= cutoff]
+        for key in expired:
+            del self._last_sent[key]
@@ -0,0 +1,124 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from database import Database
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AdaptiveTimeouts:
+    """Per-site (connect, read) timeouts derived from each site's recent response times
+
+    Both budgets are the site's p99 response time times ``factor``, clamped
+    to ``[connect_min, maximum]`` and ``[read_min, maximum]``. Sites with
+    fewer than ``warmup`` samples get ``maximum`` for both. A read timeout
+    below ``maximum`` multiplies the site's next read budget by ``factor``
+    once, so a site that got slower is given room before it is declared
+    down. If the extended budget times out too, the site is down: its budget
+    drops back to the p99-based value, and it is not extended again until
+    the site answers.
+    """
+
+    def __init__(self, factor=None, connect_min=None, read_min=None, maximum=None, sample_size=None, warmup=None):
+        self.factor = factor or Config.TIMEOUT_P99_FACTOR
+        self.connect_min = connect_min or Config.TIMEOUT_CONNECT_MIN
+        self.read_min = read_min or Config.TIMEOUT_READ_MIN
+        self.maximum = maximum or Config.CHECK_TIMEOUT
+        self.sample_size = sample_size or Config.TIMEOUT_SAMPLE_SIZE
+        self.warmup = warmup or Config.TIMEOUT_WARMUP_CHECKS
+        self._samples = {}     # website_id -> deque of recent response times (ms)
+        self._p99 = {}         # website_id -> p99 of those samples (ms)
+        self._extended = {}    # website_id -> read budget raised after a read timeout (s)
+        self._exhausted = set()  # sites whose extended budget also timed out, until they answer again
+        self._lock = threading.Lock()
+
+    def budget(self, website_id):
+        """Return (connect_timeout, read_timeout) in seconds for the site's next check"""
+        p99 = self._p99.get(website_id)
+        if p99 is None:
+            return self.maximum, self.maximum
+        scaled = p99 * self.factor / 1000
+        connect = min(max(scaled, self.connect_min), self.maximum)
+        read = min(max(scaled, self.read_min, self._extended.get(website_id, 0)), self.maximum)
+        return connect, read
+
+    def observe(self, website_id, response_time):
+        """Add a completed check's response time (ms) to the site's distribution"""
+        with self._lock:
+            samples = self._samples.get(website_id)
+            if samples is None:
+                samples = self._samples[website_id] = deque(maxlen=self.sample_size)
+            samples.append(response_time)
+            self._extended.pop(website_id, None)
+            self._exhausted.discard(website_id)
+            if len(samples) >= self.warmup:
+                self._p99[website_id] = self._percentile(samples, 0.99)
+
+    def read_timed_out(self, website_id, read_timeout):
+        """Note a read timeout; returns True if the site only looks slow and gets one longer budget
+
+        False means it is down: the timeout was at the maximum, or under a
+        budget that had already been extended.
+        """
+        with self._lock:
+            if self._extended.pop(website_id, None) is not None:
+                self._exhausted.add(website_id)
+                return False
+            if website_id in self._exhausted or read_timeout >= self.maximum:
+                return False
+            self._extended[website_id] = min(read_timeout * self.factor, self.maximum)
+        return True
+
+    def p99(self, website_id):
+        return self._p99.get(website_id)
+
+    def forget(self, website_id):
+        with self._lock:
+            self._samples.pop(website_id, None)
+            self._p99.pop(website_id, None)
+            self._extended.pop(website_id, None)
+            self._exhausted.discard(website_id)
+
+    def backfill(self, db=None, days=None):
+        """Seed each site's distribution from its most recent answered uptime checks
+
+        A span of identical checks contributes its slowest response time once.
+        """
+        db = db or Database()
+        days = days if days is not None else Config.ANOMALY_BACKFILL_DAYS
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            with db.get_connection('AdaptiveTimeouts.backfill') as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute('''
+                    SELECT website_id, response_time FROM (
+                        SELECT website_id, COALESCE(rt_max, response_time) as response_time, checked_at, check_id,
+                               ROW_NUMBER() OVER (PARTITION BY website_id ORDER BY checked_at DESC, check_id DESC) as position
+                        FROM monitoring_checks
+                        WHERE check_type = 'uptime' AND response_time IS NOT NULL AND checked_at >= ?
+                    ) WHERE position <= ?
+                    ORDER BY website_id, checked_at, check_id
+                ''', (since, self.sample_size))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error loading response time history: {str(e)}")
+            return 0
+
+        with self._lock:
+            for website_id, response_time in rows:
+                samples = self._samples.get(website_id)
+                if samples is None:
+                    samples = self._samples[website_id] = deque(maxlen=self.sample_size)
+                samples.append(response_time)
+            for website_id, samples in self._samples.items():
+                if len(samples) >= self.warmup:
+                    self._p99[website_id] = self._percentile(samples, 0.99)
+        logger.info(f"Seeded check timeouts for {len(self._p99)} websites from {len(rows)} checks")
+        return len(rows)
+
+    def _percentile(self, samples, q):
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
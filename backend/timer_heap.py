@@ -0,0 +1,185 @@
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from clock import clock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TimerHeap:
+    """Min-heap of due times keyed by website id
+
+    Each site costs one ``(due, key)`` heap tuple plus one dict slot.
+    Rescheduling and cancelling leave the old tuple in place and it is
+    skipped when it surfaces; the heap is rebuilt once stale tuples
+    outnumber live ones. Times are plain floats, so the heap works the same
+    with the wall clock or a virtual one.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # key -> current due time; heap tuples that disagree are stale
+
+    def schedule(self, key, due):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def cancel(self, key):
+        return self._due.pop(key, None) is not None
+
+    def due(self, key):
+        return self._due.get(key)
+
+    def next_due(self):
+        """Earliest due time, or None when nothing is scheduled"""
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """Remove and return [(key, due)] for every entry due at or before ``now``, earliest first"""
+        heap, current = self._heap, self._due
+        fired = []
+        while heap and heap[0][0] <= now:
+            due, key = heapq.heappop(heap)
+            if current.get(key) == due:
+                del current[key]
+                fired.append((key, due))
+        return fired
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def _compact(self):
+        self._heap = [(due, key) for key, due in self._due.items()]
+        heapq.heapify(self._heap)
+
+class CheckDispatcher:
+    """Run each registered site's check every ``interval`` seconds on a worker pool
+
+    One thread sleeps until the earliest due time in a ``TimerHeap`` and
+    hands due sites to the pool. Runs are fixed-rate: the next run is due
+    one interval after the previous due time, not after the check
+    finished. A site whose previous check is still running when it comes
+    due again skips that run, as do runs that are more than one interval
+    late.
+    """
+
+    def __init__(self, run_check, workers, on_lag=None, on_missed=None):
+        self.run_check = run_check
+        self.on_lag = on_lag
+        self.on_missed = on_missed
+        self.intervals = {}  # website_id -> seconds between runs
+        self._timers = TimerHeap()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='check')
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='check-dispatcher', daemon=True)
+        self._thread.start()
+
+    def add(self, website_id, interval, first_due=None):
+        """Register or replace a site; its first run is ``first_due`` (epoch seconds), default one interval from now"""
+        with self._cond:
+            self.intervals[website_id] = interval
+            self._timers.schedule(website_id, first_due if first_due is not None else clock.time() + interval)
+            self._cond.notify()
+
+    def remove(self, website_id):
+        """Unregister a site; a check already running is allowed to finish"""
+        with self._cond:
+            self.intervals.pop(website_id, None)
+            return self._timers.cancel(website_id)
+
+    def reschedule(self, website_id, interval):
+        """Change a registered site's interval, with the next run one new interval from now"""
+        with self._cond:
+            if website_id not in self.intervals:
+                return False
+            self.intervals[website_id] = interval
+            self._timers.schedule(website_id, clock.time() + interval)
+            self._cond.notify()
+            return True
+
+    def next_run_time(self, website_id):
+        return self._timers.due(website_id)
+
+    def next_due(self):
+        with self._cond:
+            return self._timers.next_due()
+
+    def run_pending(self):
+        """Run the checks due now in the calling thread and return how many ran
+
+        For driving the dispatcher from a virtual clock instead of start().
+        """
+        with self._cond:
+            now = clock.time()
+            claimed = [website_id for website_id, due in self._timers.pop_due(now) if self._claim(website_id, due, now)]
+        for website_id in claimed:
+            self._run(website_id)
+        return len(claimed)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopped:
+                next_due = self._timers.next_due()
+                now = clock.time()
+                if next_due is None or next_due > now:
+                    self._cond.wait(None if next_due is None else next_due - now)
+                    continue
+                for website_id, due in self._timers.pop_due(now):
+                    if self._claim(website_id, due, now):
+                        self._executor.submit(self._run, website_id)
+
+    def _claim(self, website_id, due, now):
+        """Schedule a fired site's next run; returns True if this run should go ahead"""
+        interval = self.intervals[website_id]
+        # Fixed rate; skip ahead over runs that are already a whole interval late
+        next_due = due + interval
+        if next_due <= now:
+            skipped = int((now - due) // interval)
+            next_due = due + (skipped + 1) * interval
+            if self.on_missed:
+                for _ in range(skipped):
+                    self.on_missed()
+        self._timers.schedule(website_id, next_due)
+
+        if website_id in self._running:
+            if self.on_missed:
+                self.on_missed()
+            return False
+        if self.on_lag:
+            self.on_lag(now - due)
+        self._running.add(website_id)
+        return True
+
+    def _run(self, website_id):
+        try:
+            self.run_check(website_id)
+        except Exception as e:
+            logger.error(f"Unhandled error in check for website {website_id}: {str(e)}", exc_info=True)
+        finally:
+            with self._cond:
+                self._running.discard(website_id)